@@ -0,0 +1,145 @@
+"""
+Registry of the AI backends a game can be played against
+
+Each backend is imported and built the first time a game asks for it, so the
+server starts without loading the OpenAI client (or needing an API key) and a
+deployment that only serves engine games never pays for it. Whether a backend
+could be built is checked without importing anything: importlib.util.find_spec
+for its modules and a look at the environment variables it needs.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from importlib.util import find_spec
+
+from move_generator import legal_moves, move_to_san
+
+logger = logging.getLogger(__name__)
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend's modules or configuration are missing"""
+
+
+class RandomBackend:
+    """Plays a uniformly random legal move; the floor every backend should beat"""
+
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+
+    def get_move(self, board, last_move=None, move_history=None, conversation_history=None, on_fallback=None):
+        moves = legal_moves(board)
+        return move_to_san(board, self.rng.choice(moves), moves) if moves else None
+
+    async def get_move_async(self, board, last_move=None, move_history=None, conversation_history=None,
+                             on_fallback=None):
+        return self.get_move(board)
+
+
+class BookBackend:
+    """Plays weighted book moves, then a short engine search once the game leaves the book"""
+
+    def __init__(self, book, engine):
+        self.book = book
+        self.engine = engine
+
+    def get_move(self, board, last_move=None, move_history=None, conversation_history=None, on_fallback=None):
+        return self.book.get_move(board) or self.engine.get_move(board)
+
+    async def get_move_async(self, board, last_move=None, move_history=None, conversation_history=None,
+                             on_fallback=None):
+        return self.book.get_move(board) or await self.engine.get_move_async(board)
+
+
+class BackendRegistry:
+    """AI backends by name, each built by its factory on first use and then shared"""
+
+    def __init__(self):
+        self._factories = {}
+        self._requirements = {}
+        self._backends = {}
+        self._lock = threading.Lock()
+        self.init_seconds = {}
+
+    def register(self, name, factory, modules=(), env=()):
+        """Add a backend; modules and env are what it needs installed and set to be built"""
+        self._factories[name] = factory
+        self._requirements[name] = (tuple(modules), tuple(env))
+
+    def __contains__(self, name):
+        return name in self._factories
+
+    def names(self):
+        return list(self._factories)
+
+    def missing(self, name):
+        """The modules and environment variables a backend needs that are not there"""
+        modules, env = self._requirements[name]
+        missing = [module for module in modules if find_spec(module) is None]
+        missing.extend(variable for variable in env if not os.getenv(variable))
+        return missing
+
+    def available(self, name):
+        return name in self._factories and not self.missing(name)
+
+    def loaded(self, name):
+        """The backend if it has been built, without building it"""
+        return self._backends.get(name)
+
+    def get(self, name):
+        """Return the backend, importing and building it on first use"""
+        backend = self._backends.get(name)
+        if backend is not None:
+            return backend
+        with self._lock:
+            backend = self._backends.get(name)
+            if backend is None:
+                missing = self.missing(name)
+                if missing:
+                    raise BackendUnavailable(f"AI backend {name} needs {', '.join(missing)}")
+                start = time.perf_counter()
+                backend = self._factories[name]()
+                self.init_seconds[name] = time.perf_counter() - start
+                self._backends[name] = backend
+                logger.info("Loaded AI backend %s in %.3fs", name, self.init_seconds[name])
+        return backend
+
+    def stats(self):
+        """Return availability and first-use load time per backend"""
+        stats = {}
+        for name in self._factories:
+            missing = self.missing(name)
+            stats[name] = {
+                'available': not missing,
+                'missing': missing,
+                'loaded': name in self._backends,
+                'init_seconds': self.init_seconds.get(name)
+            }
+        return stats
+
+
+def _llm_backend():
+    from simple_chess_ai import SimpleChessAI
+    return SimpleChessAI()
+
+
+def _engine_backend():
+    from chess_engine import chess_engine
+    return chess_engine
+
+
+def _book_backend():
+    from chess_engine import ChessEngine
+    from opening_book import OpeningBook
+    return BookBackend(OpeningBook(), ChessEngine(float(os.getenv("BOOK_ENGINE_TIME_LIMIT", "0.02"))))
+
+
+# Backends selectable per game; the local engine also serves as the fallback
+backends = BackendRegistry()
+backends.register('llm', _llm_backend, modules=('openai',), env=('OPENAI_API_KEY',))
+backends.register('engine', _engine_backend)
+backends.register('book', _book_backend)
+backends.register('random', lambda: RandomBackend())
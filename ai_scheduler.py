@@ -0,0 +1,321 @@
+"""
+Clock-aware scheduling of AI turns across games
+
+Every AI turn waits for one of a fixed number of slots before it runs. A
+game can carry a chess clock (bullet, blitz, rapid or classical); the AI's
+share of what is left on its clock becomes the turn's deadline, and waiting
+turns are granted slots earliest deadline first. Two rules keep that fair:
+
+    aging        a turn never ranks behind turns queued SCHEDULER_MAX_WAIT
+                 seconds after it, so quick games cannot starve slow ones
+    long turns   turns with more than SCHEDULER_LONG_BUDGET seconds to think
+                 hold at most SCHEDULER_LONG_SHARE of the slots, so a few
+                 long-thinking games cannot crowd out the rest
+
+The backend is picked when the slot is granted: the game's own, or the next
+cheaper one (llm -> engine -> book) when the turn has less time left than
+that backend usually takes, or when SCHEDULER_DEGRADE_DEPTH turns are still
+waiting behind it.
+
+Speculative work (pondering) has its own SCHEDULER_SPECULATIVE_SLOTS and is
+skipped whenever a real turn is waiting, so it never delays one.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import AI_DEADLINE_MISSES, AI_DEGRADED, STAGE_SECONDS
+
+# Base seconds and increment per move of each time control
+TIME_CONTROLS = {
+    'bullet': (60, 0),
+    'blitz': (180, 2),
+    'rapid': (600, 5),
+    'classical': (1800, 20),
+}
+
+# The backend a turn falls back to when it cannot afford its own
+CHEAPER_BACKEND = {'llm': 'engine', 'engine': 'book'}
+
+# Seconds per move assumed for each backend until its calls have been timed
+EXPECTED_SECONDS = {'llm': 1.0, 'engine': 0.1, 'book': 0.03, 'random': 0.001}
+
+# A turn's budget is an even share of the clock over this many moves, plus most of the increment
+MOVES_TO_GO = 30
+MIN_BUDGET = 0.05
+
+
+def new_clock(time_control):
+    """A full clock for a time control, or None for an untimed game; raises KeyError for unknown names"""
+    if not time_control or time_control == 'untimed':
+        return None
+    base, increment = TIME_CONTROLS[time_control]
+    # Wall time, so a clock stored by one worker process reads right in another
+    return {'control': time_control, 'base': base, 'increment': increment, 'white': float(base),
+            'black': float(base), 'running_since': time.time()}
+
+
+def press_clock(clock, player):
+    """Stop player's clock after their move: charge the time taken, add the increment, start the other side"""
+    if clock is None:
+        return
+    now = time.time()
+    clock[player] += clock['increment'] - (now - clock['running_since'])
+    clock['running_since'] = now
+
+
+def time_left(clock, player):
+    """Seconds left on the clock of the player to move"""
+    return clock[player] - (time.time() - clock['running_since'])
+
+
+def clock_view(clock):
+    """The clock as sent to clients: seconds left per side as of the last move"""
+    if clock is None:
+        return None
+    return {'control': clock['control'], 'increment': clock['increment'],
+            'white': round(clock['white'], 1), 'black': round(clock['black'], 1)}
+
+
+class AITurn:
+    """One AI move waiting for, or holding, a scheduler slot"""
+
+    __slots__ = ('game_id', 'backend', 'time_control', 'budget', 'queued', 'deadline', 'started', 'degraded')
+
+    def __init__(self, game_id, backend, time_control, budget):
+        self.game_id = game_id
+        self.backend = backend  # Replaced by a cheaper one if the turn is degraded
+        self.time_control = time_control
+        self.budget = budget
+        self.queued = time.monotonic()
+        self.deadline = self.queued + budget
+        self.started = None
+        self.degraded = None  # 'clock' or 'queue' once a cheaper backend was picked
+
+
+class AIScheduler:
+    """Grants AI turns a fixed number of slots, earliest deadline first, and picks the backend each can afford"""
+
+    def __init__(self, slots=None, max_wait=None, long_budget=None, long_share=None, degrade_depth=None,
+                 untimed_budget=None, speculative_slots=None):
+        if slots is None:
+            slots = int(os.getenv("SCHEDULER_SLOTS", os.getenv("AI_WORKERS", "32")))
+        if max_wait is None:
+            max_wait = float(os.getenv("SCHEDULER_MAX_WAIT", "2"))
+        if long_budget is None:
+            long_budget = float(os.getenv("SCHEDULER_LONG_BUDGET", "10"))
+        if long_share is None:
+            long_share = float(os.getenv("SCHEDULER_LONG_SHARE", "0.5"))
+        if degrade_depth is None:
+            degrade_depth = int(os.getenv("SCHEDULER_DEGRADE_DEPTH", str(slots)))
+        if untimed_budget is None:
+            untimed_budget = float(os.getenv("SCHEDULER_UNTIMED_BUDGET", "8"))
+        if speculative_slots is None:
+            speculative_slots = int(os.getenv("SCHEDULER_SPECULATIVE_SLOTS", str(max(1, slots // 4))))
+        self.slots = slots
+        self.max_wait = max_wait
+        self.long_budget = long_budget
+        self.long_slots = max(1, int(slots * long_share))
+        self.degrade_depth = degrade_depth
+        self.untimed_budget = untimed_budget
+        self.speculative_slots = speculative_slots
+        self.expected_seconds = dict(EXPECTED_SECONDS)
+
+        self._queue = []  # (rank, sequence, turn, grant) heap
+        self._sequence = itertools.count()
+        self._running = 0
+        self._running_long = 0
+        self._speculating = 0
+        self._waits = deque(maxlen=1000)
+        self._lock = threading.Lock()
+
+        self.granted = 0
+        self.finished = 0
+        self.max_queued = 0
+        self.deadline_misses = 0
+        self.degraded = {'clock': 0, 'queue': 0}
+        self.backend_turns = {}
+        self.speculations = 0
+        self.speculations_skipped = 0
+
+    def turn(self, game_id, backend, clock, player='black'):
+        """Describe a game's coming AI turn, with its budget taken from the player's clock"""
+        if clock is None:
+            return AITurn(game_id, backend, 'untimed', self.untimed_budget)
+        left = time_left(clock, player)
+        budget = min(left / MOVES_TO_GO + clock['increment'] * 0.8, left * 0.5)
+        return AITurn(game_id, backend, clock['control'], max(budget, MIN_BUDGET))
+
+    def depth(self):
+        """Turns waiting for a slot"""
+        with self._lock:
+            return len(self._queue)
+
+    def _is_long(self, turn):
+        return turn.budget > self.long_budget
+
+    def _enqueue(self, turn, grant):
+        """Queue a turn; grant(turn) is called, from whichever thread frees the slot, once it may run"""
+        # Aging: a turn's rank is never later than it would be for a turn queued max_wait seconds after it
+        rank = min(turn.deadline, turn.queued + self.max_wait)
+        with self._lock:
+            heapq.heappush(self._queue, (rank, next(self._sequence), turn, grant))
+            self.max_queued = max(self.max_queued, len(self._queue))
+        self._dispatch()
+
+    def _dispatch(self):
+        """Grant free slots to the best-ranked waiting turns"""
+        granted = []
+        with self._lock:
+            skipped = []
+            while self._queue and self._running < self.slots:
+                entry = heapq.heappop(self._queue)
+                turn = entry[2]
+                if self._is_long(turn) and self._running_long >= self.long_slots:
+                    skipped.append(entry)
+                    continue
+                self._running += 1
+                self._running_long += self._is_long(turn)
+                self._start_locked(turn)
+                granted.append(entry)
+            for entry in skipped:
+                heapq.heappush(self._queue, entry)
+        for _, _, turn, grant in granted:
+            STAGE_SECONDS.observe(turn.started - turn.queued, 'ai_queue')
+            if turn.degraded:
+                AI_DEGRADED.inc(turn.degraded)
+            grant(turn)
+
+    def _start_locked(self, turn):
+        """Mark a turn as running and pick the backend it can afford"""
+        now = time.monotonic()
+        turn.started = now
+        self.granted += 1
+        self._waits.append(now - turn.queued)
+
+        backend = turn.backend
+        reason = None
+        if len(self._queue) >= self.degrade_depth and backend in CHEAPER_BACKEND:
+            backend = CHEAPER_BACKEND[backend]
+            reason = 'queue'
+        left = turn.deadline - now
+        while backend in CHEAPER_BACKEND and self.expected_seconds.get(backend, 0.0) > left:
+            backend = CHEAPER_BACKEND[backend]
+            reason = reason or 'clock'
+        if reason:
+            turn.backend = backend
+            turn.degraded = reason
+            self.degraded[reason] += 1
+
+    def finish(self, turn):
+        """Give back a turn's slot once its move is ready, counting a deadline miss if it is late"""
+        missed = time.monotonic() > turn.deadline
+        with self._lock:
+            self._running -= 1
+            self._running_long -= self._is_long(turn)
+            self.finished += 1
+            self.deadline_misses += missed
+            self.backend_turns[turn.backend] = self.backend_turns.get(turn.backend, 0) + 1
+        if missed:
+            AI_DEADLINE_MISSES.inc(turn.time_control)
+        self._dispatch()
+
+    def observe(self, backend, seconds):
+        """Fold a backend call's duration into the estimate that decides when turns degrade"""
+        with self._lock:
+            previous = self.expected_seconds.get(backend)
+            self.expected_seconds[backend] = seconds if previous is None else previous + 0.2 * (seconds - previous)
+
+    def submit(self, turn, executor, run):
+        """Run run(turn) on the executor once the turn is granted a slot, then give the slot back"""
+        self._enqueue(turn, lambda granted: executor.submit(self._run, granted, run))
+
+    def _run(self, turn, run):
+        try:
+            run(turn)
+        finally:
+            self.finish(turn)
+
+    @contextmanager
+    def slot(self, turn):
+        """Block until the turn is granted a slot and hold it for the with block"""
+        granted = threading.Event()
+        self._enqueue(turn, lambda _: granted.set())
+        granted.wait()
+        try:
+            yield turn
+        finally:
+            self.finish(turn)
+
+    @asynccontextmanager
+    async def slot_async(self, turn):
+        """Await a slot for the turn without blocking the event loop and hold it for the async with block"""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        self._enqueue(turn, lambda _: loop.call_soon_threadsafe(self._deliver, granted, turn))
+        try:
+            await granted
+        except asyncio.CancelledError:
+            if granted.done() and not granted.cancelled():
+                self.finish(turn)
+            raise
+        try:
+            yield turn
+        finally:
+            self.finish(turn)
+
+    @contextmanager
+    def speculative_slot(self):
+        """Hold a speculative slot for the with block; yields False, holding nothing, when real turns need the capacity"""
+        with self._lock:
+            granted = (not self._queue and self._running < self.slots
+                       and self._speculating < self.speculative_slots)
+            if granted:
+                self._speculating += 1
+                self.speculations += 1
+            else:
+                self.speculations_skipped += 1
+        try:
+            yield granted
+        finally:
+            if granted:
+                with self._lock:
+                    self._speculating -= 1
+
+    def _deliver(self, future, turn):
+        # A waiter cancelled before its turn came up hands the slot straight back
+        if future.cancelled():
+            self.finish(turn)
+        else:
+            future.set_result(turn)
+
+    def stats(self):
+        """Return queue depth, wait percentiles, degradation and deadline-miss counters"""
+        with self._lock:
+            waits = sorted(self._waits)
+            return {
+                'slots': self.slots,
+                'long_slots': self.long_slots,
+                'running': self._running,
+                'running_long': self._running_long,
+                'queued': len(self._queue),
+                'max_queued': self.max_queued,
+                'granted': self.granted,
+                'finished': self.finished,
+                'deadline_misses': self.deadline_misses,
+                'degraded': dict(self.degraded),
+                'backend_turns': dict(self.backend_turns),
+                'speculative_slots': self.speculative_slots,
+                'speculating': self._speculating,
+                'speculations': self.speculations,
+                'speculations_skipped': self.speculations_skipped,
+                'queue_wait_p50': waits[len(waits) // 2] if waits else None,
+                'queue_wait_p95': waits[int(len(waits) * 0.95)] if waits else None,
+                'expected_seconds': {name: round(seconds, 4) for name, seconds in self.expected_seconds.items()}
+            }
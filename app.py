@@ -1,260 +1,554 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
 import json
+import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from simple_chess_ai import chess_ai
+from ai_backends import backends
+from ai_scheduler import TIME_CONTROLS, AIScheduler, clock_view, new_clock, press_clock
+from chess_engine import chess_engine
+from chess_board import WHITE, move_squares, piece_glyph, square_coords, square_index
+from move_generator import find_move, in_check, legal_moves, move_to_san, parse_san
+from game_store import GameStore, game_from_snapshot, new_game
+from game_log import GameLog, parse_uci
+from game_events import GameEvents, format_sse
+from shared_games import SharedGameEvents, SharedGames
+from pgn import game_to_pgn
+from ponder import Ponderer
+from opening_book import OpeningBook
+from endgame_tables import EndgameTables
+from metrics import AI_MOVES, FALLBACKS, INVALID_AI_MOVES, METRICS_ENABLED, REGISTRY, stage
 
 load_dotenv()
 
+# Per-move detail is logged at DEBUG; set LOG_LEVEL=DEBUG to see it
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['ETag'])
 
-# Global variables for game state
-game_state = {
-    'board': None,
-    'current_player': 'white',
-    'game_history': [],
-    'conversation_history': []  # Track the conversation between AI and human
-}
+# With SHARED_GAMES_PATH set, several worker processes serve the same games
+# from one SQLite file (see shared_games.py and start_game.py --production)
+shared_games = SharedGames()
 
-# AutoGen functions removed - using simple AI only
+# AI progress and replies are pushed to the browser per game over SSE
+events = SharedGameEvents(shared_games) if shared_games.enabled else GameEvents()
 
-def get_chess_board():
-    """Return the initial chess board setup"""
-    return [
-        ['♜','♞','♝','♛','♚','♝','♞','♜'],
-        ['♟','♟','♟','♟','♟','♟','♟','♟'],
-        [None,None,None,None,None,None,None,None],
-        [None,None,None,None,None,None,None,None],
-        [None,None,None,None,None,None,None,None],
-        [None,None,None,None,None,None,None,None],
-        ['♙','♙','♙','♙','♙','♙','♙','♙'],
-        ['♖','♘','♗','♕','♔','♗','♘','♖']
-    ]
-
-def convert_move_to_algebraic(from_pos, to_pos, piece, captured=None):
-    """Convert board coordinates to algebraic notation"""
-    files = 'abcdefgh'
-    ranks = '87654321'
-    
-    from_file = files[from_pos['col']]
-    from_rank = ranks[from_pos['row']]
-    to_file = files[to_pos['col']]
-    to_rank = ranks[to_pos['row']]
-    
-    # Basic move notation
-    move = f"{from_file}{from_rank}{to_file}{to_rank}"
+# Book moves and endgame table moves are played without asking any AI backend
+opening_book = OpeningBook()
+endgame_tables = EndgameTables()
+
+# Every move is appended to a per-game log so games survive restarts; the
+# shared store is durable itself, and one log file per game cannot take
+# appends from several processes, so the log is off when games are shared
+if shared_games.enabled and os.getenv("GAME_LOG_DIR"):
+    logger.warning("GAME_LOG_DIR is ignored while SHARED_GAMES_PATH is set: games are kept in the shared store")
+game_log = GameLog(enabled=not shared_games.enabled)
+
+def forget_game(game_id):
+    """Release the event channel and speculative work of a game that was dropped"""
+    events.discard(game_id)
+    ponderer.cancel(game_id)
+
+def restore_game(game_id):
+    """Rebuild a game that is not in memory from its latest snapshot and log tail, or return None"""
+    logged = game_log.load(game_id)
+    if logged is None:
+        return None
+    snapshot, start, tail = logged
+    if snapshot is not None:
+        game_state = game_from_snapshot(game_id, snapshot)
+    else:
+        game_state = new_game(game_id, start['backend'], start['version'], new_clock(start.get('time_control')))
     
-    # Add capture symbol if piece was captured
-    if captured:
-        move += f"x{captured}"
+    board = game_state['board']
+    for record in tail:
+        if record['type'] == 'undo':
+            take_back(game_state, logged=False)
+        elif record['type'] == 'redo':
+            replay_taken_back(game_state, logged=False)
+        else:
+            from_sq, to_sq, promotion = parse_uci(record['move'])
+            move = find_move(board, from_sq, to_sq, promotion)
+            if move is None:
+                logger.error("Game %s log has an illegal move %s at version %s", game_id, record['move'],
+                             record['version'])
+                break
+            if record['player'] == 'white':
+                game_state['redo_stack'].clear()
+            apply_move(game_state, move, record['player'], logged=False)
+    game_state['current_player'] = player_to_act(board)
+    logger.info("Restored game %s at version %s", game_id, game_state['version'])
+    return game_state
+
+def resume_game(game_state):
+    """Finish the AI's turn for a game restored between the human move and the AI reply"""
+    if game_state['current_player'] == 'black' and legal_moves(game_state['board']):
+        schedule_ai_move(game_state, ai_context(game_state))
+
+# Games keyed by game ID, so every browser session plays its own board; games
+# that are not in memory are restored from the game log (or the shared store) on first access,
+# and idle ones are swept out of memory even when no new games arrive
+games = GameStore(on_remove=forget_game, loader=restore_game, on_restore=resume_game,
+                  shared=shared_games if shared_games.enabled else None)
+games.start_sweeper(float(os.getenv("GAME_SWEEP_INTERVAL", "60")))
+
+# AI turns wait for one of the scheduler's slots, earliest clock deadline
+# first, and are then computed off the request thread once the human move is
+# acknowledged; the pool has a thread per slot, so a granted turn never queues
+scheduler = AIScheduler()
+ai_workers = ThreadPoolExecutor(max_workers=scheduler.slots, thread_name_prefix='ai-move')
+
+# Precomputes AI replies to the human's likely moves while they think, in the
+# scheduler's speculative slots so it never holds up a real AI turn
+ponderer = Ponderer(scheduler=scheduler)
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+
+# Backend for games that do not name one; falls back to the engine when it cannot be loaded
+DEFAULT_AI_BACKEND = os.getenv("AI_BACKEND", "llm")
+
+# Time control for games that do not name one: bullet, blitz, rapid, classical or untimed
+DEFAULT_TIME_CONTROL = os.getenv("TIME_CONTROL", "untimed")
+
+def default_backend():
+    """The backend new games use unless they ask for one"""
+    return DEFAULT_AI_BACKEND if backends.available(DEFAULT_AI_BACKEND) else 'engine'
+
+def llm_stats(read):
+    """Read counters from the LLM backend, or return {} while no game has loaded it"""
+    llm = backends.loaded('llm')
+    return read(llm) if llm is not None else {}
+
+def llm_circuit_open():
+    llm = backends.loaded('llm')
+    return int(llm is not None and llm.guard.breaker.state != 'closed')
+
+REGISTRY.gauge('chess_active_games', "Games held in memory", lambda: len(games))
+REGISTRY.gauge('chess_llm_circuit_open', "1 while the LLM circuit breaker is refusing calls", llm_circuit_open)
+REGISTRY.gauge('chess_ai_queue_depth', "AI turns waiting for a scheduler slot", scheduler.depth)
+
+# AutoGen functions removed - using simple AI only
+
+def apply_move(game_state, move, player, moves=None, logged=True):
+    """Apply a legal move to a game's board and record it in the move histories and game log"""
+    board = game_state['board']
+    san = move_to_san(board, move, moves)
+    piece = board.squares[move.from_sq]
+    touched = move_squares(move, board.side)
+    undo = board.make_move(move)
+    game_state['move_stack'].append((move, undo))
+    with stage('coordinates'):
+        record = {
+            'from': square_coords(move.from_sq),
+            'to': square_coords(move.to_sq),
+            'piece': piece_glyph(piece),
+            'captured': piece_glyph(undo[0]),
+            'player': player,
+            'san': san,
+            # Final contents of every square the move touched, so clients can patch their board
+            'changes': [dict(square_coords(sq), piece=piece_glyph(board.squares[sq])) for sq in touched]
+        }
+    game_state['game_history'].append(record)
+    game_state['san_history'].append(san)
+    game_state['version'] += 1
+    if logged:
+        game_log.record_move(game_state, move, player)
+    return record
+
+def take_back(game_state, logged=True):
+    """Unmake plies until White is to move again, normally the AI reply and the human move before it
     
-    return move
+    Each ply is popped off the move stack and unmade in O(1); returns the number of plies taken back.
+    """
+    board = game_state['board']
+    plies = 0
+    while game_state['move_stack']:
+        move, undo = game_state['move_stack'].pop()
+        board.unmake_move(move, undo)
+        record = game_state['game_history'].pop()
+        game_state['san_history'].pop()
+        game_state['redo_stack'].append((move, record['player']))
+        plies += 1
+        if board.side == WHITE:
+            break
+    if plies:
+        # The history was rewritten, so deltas from any earlier version would be wrong
+        game_state['version'] += 1
+        game_state['base_version'] = game_state['version'] - len(game_state['game_history'])
+        game_state['rewound_version'] = game_state['version']
+        game_state['current_player'] = 'white'
+        if logged:
+            game_log.record_undo(game_state)
+    return plies
 
-def get_piece_color(piece):
-    """Get the color of a chess piece"""
-    if not piece:
+def player_to_act(board):
+    """Whose turn a game is on: Black only while the AI owes a reply, so a finished game is left with White"""
+    return 'black' if board.side != WHITE and legal_moves(board) else 'white'
+
+def ai_thinking(game_state):
+    """Check whether the AI still owes a reply in a game"""
+    return game_state['current_player'] == 'black' and bool(legal_moves(game_state['board']))
+
+def replay_taken_back(game_state, logged=True):
+    """Replay the plies of the last take-back; returns the number of plies redone"""
+    board = game_state['board']
+    redo_stack = game_state['redo_stack']
+    plies = 0
+    while redo_stack:
+        move, player = redo_stack.pop()
+        apply_move(game_state, move, player, logged=False)
+        plies += 1
+        if board.side == WHITE:
+            break
+    game_state['current_player'] = player_to_act(board)
+    if plies and logged:
+        game_log.record_redo(game_state)
+    return plies
+
+def state_update(game_state, since=None):
+    """Describe a game's position as the moves played since a client's version, or in full"""
+    version = game_state['version']
+    base_version = game_state['base_version']
+    if since is not None and game_state['rewound_version'] <= since <= version:
+        return {
+            'version': version,
+            'since': since,
+            'moves': game_state['game_history'][since - base_version:],
+            'clock': clock_view(game_state['clock'])
+        }
+    return {
+        'version': version,
+        'board': game_state['board'].to_glyphs(),
+        'game_history': game_state['game_history'],
+        'clock': clock_view(game_state['clock'])
+    }
+
+def state_etag(game_state):
+    """Entity tag that changes whenever the game's position or turn does"""
+    return f'W/"{game_state["game_id"]}-{game_state["version"]}-{game_state["current_player"]}"'
+
+def parse_version(value):
+    """Read a client-supplied state version, ignoring anything that is not an integer"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
         return None
-    # White pieces: ♔♕♖♗♘♙
-    # Black pieces: ♚♛♜♝♞♟
-    white_pieces = '♔♕♖♗♘♙'
-    return 'white' if piece in white_pieces else 'black'
-
-def get_simple_ai_move(board):
-    """Simple AI that makes basic moves for BLACK pieces only"""
-    import random
-    
-    # Find all black pieces
-    black_pieces = []
-    for row in range(8):
-        for col in range(8):
-            piece = board[row][col]
-            if piece and get_piece_color(piece) == 'black':
-                black_pieces.append((row, col, piece))
+
+# The move pipeline is split into stages so the WSGI routes below and the
+# ASGI app in asgi.py share everything except how they wait for the AI.
+
+def create_game(data):
+    """Start (or restart) a game and return (payload, status)"""
+    backend = data.get('backend') or default_backend()
+    if backend not in backends:
+        return {'success': False, 'error': f"Unknown AI backend: {backend}"}, 400
+    missing = backends.missing(backend)
+    if missing:
+        return {'success': False, 'error': f"AI backend {backend} is unavailable: needs {', '.join(missing)}"}, 503
+    time_control = data.get('time_control') or DEFAULT_TIME_CONTROL
+    if time_control != 'untimed' and time_control not in TIME_CONTROLS:
+        return {'success': False, 'error': f"Unknown time control: {time_control}"}, 400
     
-    if not black_pieces:
-        return "e5"  # Default move
+    # Passing an existing game ID restarts that game, otherwise a new one is created
+    game_state = games.create(backend, data.get('game_id'), new_clock(time_control))
+    game_log.record_start(game_state)
     
-    # Try to make a pawn move first (most common opening moves)
-    for row, col, piece in black_pieces:
-        if piece == '♟':  # Black pawn
-            # Try to move forward (black pawns move down the board)
-            if row < 7 and board[row + 1][col] is None:
-                # Convert to algebraic notation
-                files = 'abcdefgh'
-                ranks = '87654321'
-                to_square = f"{files[col]}{ranks[row + 1]}"
-                return to_square
+    return {
+        'success': True,
+        'game_id': game_state['game_id'],
+        'version': game_state['version'],
+        'board': game_state['board'].to_glyphs(),
+        'current_player': game_state['current_player'],
+        'ai_backend': backend,
+        'clock': clock_view(game_state['clock']),
+        'last_event_id': events.last_id(game_state['game_id']),
+        'message': 'Game initialized successfully'
+    }, 200
+
+def start_move(game_state, data):
+    """Validate and apply the human move; returns (game_context, error payload)"""
+    board = game_state['board']
+    from_pos = data['from']
+    to_pos = data['to']
     
-    # If no pawn moves, try to move knights or bishops
-    for row, col, piece in black_pieces:
-        if piece in '♞♝':  # Black knights and bishops
-            # Try to move to an empty square in the center
-            center_squares = [(3, 3), (3, 4), (4, 3), (4, 4), (2, 2), (2, 5), (5, 2), (5, 5)]
-            for new_row, new_col in center_squares:
-                if 0 <= new_row < 8 and 0 <= new_col < 8 and board[new_row][new_col] is None:
-                    # Convert to algebraic notation
-                    files = 'abcdefgh'
-                    ranks = '87654321'
-                    to_square = f"{files[new_col]}{ranks[new_row]}"
-                    
-                    # Add piece identifier
-                    piece_map = {'♞': 'N', '♝': 'B'}
-                    piece_id = piece_map.get(piece, '')
-                    return f"{piece_id}{to_square}"
+    with stage('apply_human_move'):
+        # Validate the human move against the server-side move generator
+        human_move = None
+        if board.side == WHITE:
+            white_moves = legal_moves(board)
+            human_move = find_move(board, square_index(from_pos['row'], from_pos['col']),
+                                   square_index(to_pos['row'], to_pos['col']), moves=white_moves)
+        if human_move is None:
+            return None, {'success': False, 'error': 'Illegal move'}
+        
+        # Make and record the move; a new move abandons whatever was taken back
+        since = parse_version(data.get('since'))
+        game_state['redo_stack'].clear()
+        apply_move(game_state, human_move, game_state['current_player'], white_moves)
+        press_clock(game_state['clock'], 'white')
+        game_state['current_player'] = 'black'
     
-    # If no center moves, try any empty square
-    for row, col, piece in black_pieces:
-        if piece in '♞♝♜♛♚':  # Black pieces
-            for new_row in range(8):
-                for new_col in range(8):
-                    if board[new_row][new_col] is None:
-                        # Convert to algebraic notation
-                        files = 'abcdefgh'
-                        ranks = '87654321'
-                        to_square = f"{files[new_col]}{ranks[new_row]}"
-                        
-                        # Add piece identifier
-                        piece_map = {'♞': 'N', '♝': 'B', '♜': 'R', '♛': 'Q', '♚': 'K'}
-                        piece_id = piece_map.get(piece, '')
-                        return f"{piece_id}{to_square}"
+    return ai_context(game_state, since), None
+
+def ai_context(game_state, since=None):
+    """Prepare the context for the AI's reply to the human move just played"""
+    # The SAN history is kept incrementally, never rebuilt. The AI gets its
+    # own copy of the board so it can think outside the game lock.
+    board = game_state['board']
+    return {
+        'board': board.copy(),
+        'last_move': game_state['san_history'][-1] if game_state['san_history'] else None,
+        'current_player': 'black',  # AI plays black
+        'history': game_state['san_history'],
+        'conversation_history': game_state['conversation_history'],
+        'legal_moves': legal_moves(board),
+        'backend': game_state['ai_backend'],  # The scheduler may swap in a cheaper one
+        'since': since,  # The client's version before this move
+        'ai_since': game_state['version']  # The version the AI reply is a delta from
+    }
+
+def book_move(game_state, game_context):
+    """Look the position up in the opening book before any AI backend is asked"""
+    with stage('opening_book'):
+        ai_move = opening_book.get_move(game_context['board'], game_context['legal_moves'])
+    if ai_move:
+        logger.debug("Book move: %s", ai_move)
+        AI_MOVES.inc('book')
+        ponderer.cancel(game_state['game_id'])
+    return ai_move
+
+def table_move(game_state, game_context):
+    """Play the exact endgame table move once material is low enough to be covered"""
+    with stage('endgame_table'):
+        found = endgame_tables.best_move(game_context['board'], game_context['legal_moves'])
+    if not found:
+        return None
+    ai_move, _ = found
+    logger.debug("Endgame table move: %s", ai_move)
+    AI_MOVES.inc('table')
+    ponderer.cancel(game_state['game_id'])
+    return ai_move
+
+def answered_locally(board):
+    """Check whether the book or the endgame tables answer a position without a backend"""
+    return opening_book.has_position(board) or endgame_tables.probe(board) is not None
+
+def request_ai_move(game_state, game_context, on_fallback=None):
+    """Ask the game's AI backend for a move, blocking until it answers"""
+    ai_move = table_move(game_state, game_context) or book_move(game_state, game_context)
+    if ai_move:
+        return ai_move
     
-    # Final fallback - try to move any black pawn
-    for row in range(1, 7):  # Check pawn rows
-        for col in range(8):
-            piece = board[row][col]
-            if piece == '♟':  # Black pawn
-                if row < 7 and board[row + 1][col] is None:
-                    files = 'abcdefgh'
-                    ranks = '87654321'
-                    to_square = f"{files[col]}{ranks[row + 1]}"
-                    return to_square
+    pondered = ponderer.take(game_state['game_id'], game_context['board'].hash)
+    if pondered is not None:
+        try:
+            with stage('ponder_wait'):
+                ai_move, fallback_reason = pondered.result()
+            # No move means the scheduler was too busy to speculate, so ask the backend now
+            if ai_move is not None:
+                logger.debug("Pondered AI move: %s", ai_move)
+                AI_MOVES.inc('ponder')
+                if fallback_reason and on_fallback:
+                    on_fallback(fallback_reason)
+                return ai_move
+        except Exception as e:
+            logger.warning("Pondered AI move failed: %r", e)
     
-    # Ultimate fallback
-    return "e5"
+    try:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Requesting AI move for position: %s", game_context['board'].to_fen())
+        
+        start = time.perf_counter()
+        with stage('ai_backend'):
+            ai_move = backends.get(game_context['backend']).get_move(
+                game_context['board'],
+                game_context['last_move'],
+                game_context['history'],
+                game_context['conversation_history'],
+                on_fallback=on_fallback
+            )
+        scheduler.observe(game_context['backend'], time.perf_counter() - start)
+        logger.debug("AI suggested move: %s", ai_move)
+        AI_MOVES.inc('backend')
+        return ai_move
+    except Exception as e:
+        logger.warning("AI move generation failed: %r", e)
+        return None
 
-def convert_algebraic_to_coords(move, board=None):
-    """Convert algebraic notation to board coordinates for BLACK pieces (AI)"""
-    files = 'abcdefgh'
-    ranks = '87654321'
-    
-    # Handle standard algebraic notation (e.g., 'e5', 'Nf6', 'O-O')
-    move = move.strip().lower()
+def finish_move(game_state, game_context, ai_move, since=None, fallback_reason=None):
+    """Apply the AI's answer (or the engine fallback) and build the response payload
     
-    # Handle castling
-    if move in ['o-o', '0-0', 'oo']:
-        # Kingside castling for black (AI)
-        return {
-            'from': {'row': 0, 'col': 4},  # e8
-            'to': {'row': 0, 'col': 6}     # g8
-        }
-    elif move in ['o-o-o', '0-0-0', 'ooo']:
-        # Queenside castling for black (AI)
-        return {
-            'from': {'row': 0, 'col': 4},  # e8
-            'to': {'row': 0, 'col': 2}     # c8
-        }
+    fallback_reason is the reason the backend already gave for playing an engine move.
+    """
+    board = game_state['board']
+    black_moves = game_context['legal_moves']
+    ai_coords = None
     
-    # Handle standard moves (e.g., 'e5', 'Nf6', 'exd5')
-    if len(move) >= 2:
-        # Extract destination square
-        if len(move) >= 3 and move[1] in 'x':
-            # Capture move (e.g., 'exd5')
-            to_file = move[2]
-            to_rank = move[3] if len(move) > 3 else '8'
+    if not black_moves:
+        ai_move = None
+        ai_response = "Checkmate - White wins" if in_check(board) else "Stalemate"
+    else:
+        with stage('validate'):
+            chosen = parse_san(board, ai_move, black_moves) if ai_move else None
+        if chosen:
+            ai_response = f"AI responds with {ai_move}"
         else:
-            # Regular move (e.g., 'e5', 'Nf6')
-            to_file = move[-2]
-            to_rank = move[-1]
+            logger.info("Illegal AI move: %s, using fallback AI move", ai_move)
+            if ai_move:
+                INVALID_AI_MOVES.inc(game_context['backend'])
+            with stage('fallback'):
+                ai_move = chess_engine.get_move(board)
+                chosen = parse_san(board, ai_move, black_moves)
+            ai_response = f"AI responds with {ai_move} (fallback)"
+            fallback_reason = fallback_reason or 'illegal_move'
+        if fallback_reason:
+            FALLBACKS.inc(fallback_reason)
         
-        try:
-            to_col = files.index(to_file)
-            to_row = ranks.index(to_rank)
-            
-            # Find the source piece based on the move type
-            if len(move) == 2 and move[0] in files:
-                # Pawn move (e.g., 'e5')
-                from_file = move[0]
-                from_col = files.index(from_file)
-                
-                # For black pawns, find the actual pawn on the board
-                if board:
-                    # Look for a black pawn in the specified file
-                    for row in range(8):
-                        piece = board[row][from_col]
-                        if piece == '♟':  # Black pawn
-                            # Check if this pawn can move to the destination
-                            if row < to_row:  # Pawn moves down the board
-                                return {
-                                    'from': {'row': row, 'col': from_col},
-                                    'to': {'row': to_row, 'col': to_col}
-                                }
-                
-                # If no pawn found in the file, look for any black pawn that can reach the destination
-                for row in range(8):
-                    for col in range(8):
-                        piece = board[row][col]
-                        if piece == '♟':  # Black pawn
-                            # Check if this pawn can reach the destination
-                            if col == to_col and row < to_row:  # Same file, moving down
-                                return {
-                                    'from': {'row': row, 'col': col},
-                                    'to': {'row': to_row, 'col': to_col}
-                                }
-                            elif abs(col - to_col) == 1 and row == to_row - 1:  # Capture move
-                                return {
-                                    'from': {'row': row, 'col': col},
-                                    'to': {'row': to_row, 'col': to_col}
-                                }
-                
-                # Fallback: assume pawn is at starting position
-                from_row = 1  # Black pawns start at row 1
-            else:
-                # Piece move - find the piece on the board
-                piece_type = move[0] if move[0] in 'nbrqk' else None
-                if piece_type and board:
-                    # Find the piece on the board
-                    for row in range(8):
-                        for col in range(8):
-                            piece = board[row][col]
-                            if piece and get_piece_color(piece) == 'black':
-                                # Check if it's the right piece type
-                                if (piece_type == 'n' and piece in '♞') or \
-                                   (piece_type == 'b' and piece in '♝') or \
-                                   (piece_type == 'r' and piece in '♜') or \
-                                   (piece_type == 'q' and piece in '♛') or \
-                                   (piece_type == 'k' and piece in '♚'):
-                                    # For now, just return the first matching piece
-                                    return {
-                                        'from': {'row': row, 'col': col},
-                                        'to': {'row': to_row, 'col': to_col}
-                                    }
-                
-                # If no specific piece found, look for any black piece that can reach the destination
-                for row in range(8):
-                    for col in range(8):
-                        piece = board[row][col]
-                        if piece and get_piece_color(piece) == 'black':
-                            # Simple check: if the piece is close to the destination
-                            if abs(row - to_row) <= 2 and abs(col - to_col) <= 2:
-                                return {
-                                    'from': {'row': row, 'col': col},
-                                    'to': {'row': to_row, 'col': to_col}
-                                }
-                
-                # Fallback: use simple heuristic for piece moves
-                from_col = to_col
-                from_row = to_row + 1 if to_row < 4 else to_row - 1
-            
-            return {
-                'from': {'row': from_row, 'col': from_col},
-                'to': {'row': to_row, 'col': to_col}
-            }
-        except (ValueError, IndexError):
+        # Update board with the AI move and record it
+        ai_record = apply_move(game_state, chosen, 'black', black_moves)
+        press_clock(game_state['clock'], 'black')
+        ai_coords = {'from': ai_record['from'], 'to': ai_record['to']}
+        logger.debug("AI move executed: %s %s", ai_move, ai_coords)
+        
+        if not legal_moves(board):
+            ai_response += " - Checkmate, Black wins" if in_check(board) else " - Stalemate"
+    
+    # Switch back to white (human player) and use their thinking time to precompute replies
+    game_state['current_player'] = 'white'
+    backend = backends.loaded(game_state['ai_backend'])
+    if ai_coords and backend is not None:
+        ponderer.start(game_state['game_id'], backend, board, game_state['san_history'][:], skip=answered_locally,
+                       backend_name=game_state['ai_backend'])
+    
+    payload = {
+        'success': True,
+        'current_player': game_state['current_player'],
+        'move_notation': game_context['last_move'],
+        'ai_response': ai_response,
+        'ai_move': ai_move,
+        'ai_coords': ai_coords,
+        'fallback_used': fallback_reason is not None,
+        'fallback_reason': fallback_reason,
+        'ai_backend': game_context['backend']
+    }
+    payload.update(state_update(game_state, since))
+    return payload
+
+def acknowledge_move(game_state, game_context):
+    """Build the immediate reply to a human move whose AI answer will be streamed"""
+    payload = {
+        'success': True,
+        'current_player': game_state['current_player'],
+        'move_notation': game_context['last_move'],
+        'ai_pending': True
+    }
+    payload.update(state_update(game_state, game_context['since']))
+    return payload
+
+def publish_ai_reply(game_id, payload, notified=False):
+    """Push the finished AI move, flagging a fallback first (unless already notified) so the UI can say so"""
+    if payload['fallback_used'] and not notified:
+        events.publish(game_id, 'fallback', {'reason': payload['fallback_reason']})
+    events.publish(game_id, 'ai_move', payload)
+
+def fallback_notifier(game_id, reasons):
+    """Return a callback that records a backend's engine fallback and reports it on the game's channel"""
+    def notify(reason):
+        reasons.append(reason)
+        events.publish(game_id, 'fallback', {'reason': reason})
+    return notify
+
+def ai_turn(game_state):
+    """Describe the AI's coming turn in a game to the scheduler"""
+    return scheduler.turn(game_state['game_id'], game_state['ai_backend'], game_state['clock'])
+
+def schedule_ai_move(game_state, game_context):
+    """Queue the AI's turn; it runs on the worker pool, with the backend it was granted, once it has a slot"""
+    def run(turn):
+        game_context['backend'] = turn.backend
+        run_ai_move(game_state['game_id'], game_state, game_context)
+    scheduler.submit(ai_turn(game_state), ai_workers, run)
+
+def finish_ai_turn(game_id, game_state, game_context, ai_move, since, reasons):
+    """Apply an AI reply computed outside the game lock; returns the payload, or None if the game moved on"""
+    with games.lock(game_id):
+        # The game may have been restarted, evicted or taken back while the AI was thinking
+        if games.get(game_id) is not game_state or game_state['version'] != game_context['ai_since']:
             return None
+        return finish_move(game_state, game_context, ai_move, since, reasons[-1] if reasons else None)
+
+def run_ai_move(game_id, game_state, game_context):
+    """Compute the AI reply on a worker thread and publish it to the game's channel"""
+    try:
+        ai_move = None
+        reasons = []
+        if game_context['legal_moves']:
+            events.publish(game_id, 'thinking', {'backend': game_state['ai_backend']})
+            ai_move = request_ai_move(game_state, game_context, fallback_notifier(game_id, reasons))
+        
+        # Subscribers saw the human move in the acknowledgement, so send just the reply
+        payload = finish_ai_turn(game_id, game_state, game_context, ai_move, game_context['ai_since'], reasons)
+        if payload is not None:
+            publish_ai_reply(game_id, payload, notified=bool(reasons))
+    except Exception as e:
+        logger.exception("AI move failed for game %s", game_id)
+        events.publish(game_id, 'error', {'error': str(e)})
+
+def rewind_game(data, redo=False):
+    """Take back the last move pair, or replay the last take-back; returns (payload, status)"""
+    game_id = data.get('game_id')
+    game_state = games.get(game_id)
+    if game_state is None:
+        return {'success': False, 'error': 'Unknown game'}, 404
     
-    return None
+    with games.lock(game_id):
+        if ai_thinking(game_state):
+            return {'success': False, 'error': 'The AI is still thinking'}, 409
+        plies = replay_taken_back(game_state) if redo else take_back(game_state)
+        if not plies:
+            return {'success': False, 'error': 'Nothing to redo' if redo else 'Nothing to undo'}, 400
+        
+        # Speculation was for a position that is no longer on the board
+        ponderer.cancel(game_id)
+        payload = {
+            'success': True,
+            'plies': plies,
+            'current_player': game_state['current_player'],
+            'can_undo': bool(game_state['move_stack']),
+            'can_redo': bool(game_state['redo_stack'])
+        }
+        payload.update(state_update(game_state, parse_version(data.get('since'))))
+    resume_game(game_state)
+    return payload, 200
+
+def event_cursor(game_id, header_id, query_id):
+    """Pick where an SSE stream resumes: Last-Event-ID, the client's cursor, or now"""
+    for value in (header_id, query_id):
+        if value and value.isdigit():
+            return int(value)
+    return events.last_id(game_id)
+
+def game_state_payload(game_id, since=None, if_none_match=None):
+    """Build a game's state and return (payload, status, headers); payload is None for a 304"""
+    game_state = games.get(game_id)
+    if game_state is None:
+        return {'success': False, 'error': 'Unknown game'}, 404, {}
+    
+    with games.lock(game_id):
+        etag = state_etag(game_state)
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return None, 304, headers
+        payload = {
+            'game_id': game_id,
+            'current_player': game_state['current_player']
+        }
+        payload.update(state_update(game_state, parse_version(since)))
+        return payload, 200, headers
 
 # AutoGen process_ai_move function removed - using simple AI only
 
@@ -267,199 +561,167 @@ def index():
 def initialize_game():
     """Initialize a new chess game"""
     try:
-        game_state['board'] = get_chess_board()
-        game_state['current_player'] = 'white'
-        game_state['game_history'] = []
-        game_state['conversation_history'] = []  # Reset conversation history
-        
-        # Reset AI conversation history
-        chess_ai.reset_conversation()
-        
-        return jsonify({
-            'success': True,
-            'board': game_state['board'],
-            'current_player': game_state['current_player'],
-            'message': 'Game initialized successfully'
-        })
+        payload, status = create_game(request.get_json(silent=True) or {})
+        return jsonify(payload), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/move', methods=['POST'])
 def make_move():
-    """Process a chess move and get AI response"""
+    """Apply the human move; the AI reply follows on /api/events"""
     try:
-        data = request.get_json()
-        from_pos = data['from']
-        to_pos = data['to']
-        piece = data['piece']
-        captured = data.get('captured')
-        
-        # Update game state
-        if game_state['board'] is None:
-            game_state['board'] = get_chess_board()
+        with stage('parse_request'):
+            data = request.get_json()
+            game_id = data.get('game_id')
+            game_state = games.get(game_id)
+        if game_state is None:
+            return jsonify({'success': False, 'error': 'Unknown game'}), 404
         
-        # Make the move
-        game_state['board'][to_pos['row']][to_pos['col']] = piece
-        game_state['board'][from_pos['row']][from_pos['col']] = None
-        
-        # Record move
-        move_record = {
-            'from': from_pos,
-            'to': to_pos,
-            'piece': piece,
-            'captured': captured,
-            'player': game_state['current_player']
-        }
-        game_state['game_history'].append(move_record)
-        
-        # Convert move to algebraic notation
-        move_notation = convert_move_to_algebraic(from_pos, to_pos, piece, captured)
-        
-        # Add human move to conversation history
-        game_state['conversation_history'].append(f"Human (White): {move_notation}")
-        
-        # Prepare context for AI
-        game_context = {
-            'board': game_state['board'],
-            'last_move': move_notation,
-            'current_player': 'black',  # AI plays black
-            'history': [convert_move_to_algebraic(m['from'], m['to'], m['piece'], m['captured']) 
-                       for m in game_state['game_history']]
-        }
-        
-        # Get AI move - ONLY use simple AI, no AutoGen
-        try:
-            print(f"Requesting AI move for position: {game_context['board']}")
+        with games.lock(game_id):
+            game_context, error = start_move(game_state, data)
+            if error:
+                return jsonify(error), 400
             
-            # Use ONLY simple AI approach - no AutoGen
-            ai_move = chess_ai.get_move(
-                game_context['board'], 
-                game_context['last_move'], 
-                game_context['history']
-            )
-            print(f"AI suggested move: {ai_move}")
-            
-            ai_coords = convert_algebraic_to_coords(ai_move, game_state['board'])
-            print(f"Converted to coordinates: {ai_coords}")
-            
-            if ai_coords:
-                # Validate that the AI move is legal
-                from_row = ai_coords['from']['row']
-                from_col = ai_coords['from']['col']
-                to_row = ai_coords['to']['row']
-                to_col = ai_coords['to']['col']
-                
-                print(f"AI move coordinates: from ({from_row},{from_col}) to ({to_row},{to_col})")
-                
-                # Check if the source square has a black piece
-                ai_piece = game_state['board'][from_row][from_col]
-                print(f"AI piece at source: {ai_piece}, color: {get_piece_color(ai_piece)}")
-                
-                if ai_piece and get_piece_color(ai_piece) == 'black':
-                    ai_captured = game_state['board'][to_row][to_col]
-                    print(f"AI captured piece: {ai_captured}")
-                    
-                    # Update board with AI move
-                    game_state['board'][to_row][to_col] = ai_piece
-                    game_state['board'][from_row][from_col] = None
-                    
-                    # Record AI move
-                    ai_move_record = {
-                        'from': ai_coords['from'],
-                        'to': ai_coords['to'],
-                        'piece': ai_piece,
-                        'captured': ai_captured,
-                        'player': 'black'
-                    }
-                    game_state['game_history'].append(ai_move_record)
-                    
-                    # Switch back to white (human player)
-                    game_state['current_player'] = 'white'
-                    
-                    ai_response = f"AI responds with {ai_move}"
-                    print(f"AI move executed: {ai_move}")
-                else:
-                    print(f"Invalid AI move - no black piece at source: {ai_coords}")
-                    print(f"Board at source: {game_state['board'][from_row][from_col]}")
-                    print("Using fallback AI move...")
-                    
-                    # Try fallback move
-                    fallback_move = get_simple_ai_move(game_state['board'])
-                    print(f"Fallback move: {fallback_move}")
-                    
-                    fallback_coords = convert_algebraic_to_coords(fallback_move, game_state['board'])
-                    if fallback_coords:
-                        from_row = fallback_coords['from']['row']
-                        from_col = fallback_coords['from']['col']
-                        to_row = fallback_coords['to']['row']
-                        to_col = fallback_coords['to']['col']
-                        
-                        fallback_piece = game_state['board'][from_row][from_col]
-                        if fallback_piece and get_piece_color(fallback_piece) == 'black':
-                            fallback_captured = game_state['board'][to_row][to_col]
-                            
-                            # Update board with fallback move
-                            game_state['board'][to_row][to_col] = fallback_piece
-                            game_state['board'][from_row][from_col] = None
-                            
-                            # Record fallback move
-                            fallback_move_record = {
-                                'from': fallback_coords['from'],
-                                'to': fallback_coords['to'],
-                                'piece': fallback_piece,
-                                'captured': fallback_captured,
-                                'player': 'black'
-                            }
-                            game_state['game_history'].append(fallback_move_record)
-                            
-                            # Switch back to white (human player)
-                            game_state['current_player'] = 'white'
-                            
-                            ai_response = f"AI responds with {fallback_move} (fallback)"
-                            print(f"Fallback move executed: {fallback_move}")
-                        else:
-                            ai_response = "AI move failed - no valid fallback"
-                            game_state['current_player'] = 'white'
-                    else:
-                        ai_response = "AI move failed - no valid fallback"
-                        game_state['current_player'] = 'white'
-            else:
-                print(f"Could not convert AI move to coordinates: {ai_move}")
-                ai_response = "AI move parsing failed"
-                game_state['current_player'] = 'white'
-        except Exception as e:
-            print(f"AI move generation failed: {e}")
-            ai_response = "AI move generation failed"
-            game_state['current_player'] = 'white'
-        
-        return jsonify({
-            'success': True,
-            'board': game_state['board'],
-            'current_player': game_state['current_player'],
-            'move_notation': move_notation,
-            'ai_response': ai_response,
-            'ai_move': ai_move if 'ai_move' in locals() else None,
-            'ai_coords': ai_coords if 'ai_coords' in locals() else None,
-            'game_history': game_state['game_history']
-        })
+            # Scripted clients can still ask for the AI reply in the same response
+            if data.get('wait'):
+                ai_move = None
+                reasons = []
+                if game_context['legal_moves']:
+                    with scheduler.slot(ai_turn(game_state)) as turn:
+                        game_context['backend'] = turn.backend
+                        ai_move = request_ai_move(game_state, game_context, fallback_notifier(game_id, reasons))
+                payload = finish_move(game_state, game_context, ai_move, game_context['since'],
+                                      reasons[-1] if reasons else None)
+                with stage('serialize'):
+                    return jsonify(payload)
         
+        schedule_ai_move(game_state, game_context)
+        payload = acknowledge_move(game_state, game_context)
+        with stage('serialize'):
+            return jsonify(payload)
+    
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/undo', methods=['POST'])
+def undo_move():
+    """Take back the last human move and the AI reply to it"""
+    try:
+        payload, status = rewind_game(request.get_json(silent=True) or {})
+        return jsonify(payload), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/redo', methods=['POST'])
+def redo_move():
+    """Replay the moves of the last take-back"""
+    try:
+        payload, status = rewind_game(request.get_json(silent=True) or {}, redo=True)
+        return jsonify(payload), status
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Stream a game's AI progress and moves as server-sent events"""
+    game_id = request.args.get('game_id')
+    if games.get(game_id) is None:
+        return jsonify({'success': False, 'error': 'Unknown game'}), 404
+    cursor = event_cursor(game_id, request.headers.get('Last-Event-ID'), request.args.get('last_event_id'))
+    
+    def generate(cursor):
+        while game_id in games:
+            batch = events.wait(game_id, cursor, SSE_KEEPALIVE)
+            if not batch:
+                yield ': keepalive\n\n'
+            for event_id, event, data in batch:
+                cursor = event_id
+                yield format_sse(event_id, event, data)
+    
+    return Response(generate(cursor), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # Removed unused /api/ai-move endpoint - AI moves are handled in /api/move
 
+@app.route('/api/pgn', methods=['GET'])
+def export_pgn():
+    """Download a game as PGN"""
+    game_id = request.args.get('game_id')
+    game_state = games.get(game_id)
+    if game_state is None:
+        return jsonify({'success': False, 'error': 'Unknown game'}), 404
+    with games.lock(game_id):
+        text = game_to_pgn(game_state)
+    return Response(text, mimetype='application/x-chess-pgn',
+                    headers={'Content-Disposition': f'attachment; filename="{game_id}.pgn"'})
+
+@app.route('/api/cache-stats', methods=['GET'])
+def get_cache_stats():
+    """Get hit/miss/eviction counters for the LLM position cache"""
+    return jsonify(llm_stats(lambda llm: llm.cache.stats()))
+
+@app.route('/api/coalescer-stats', methods=['GET'])
+def get_coalescer_stats():
+    """Get single-flight and batching counters for LLM requests"""
+    return jsonify(llm_stats(lambda llm: llm.coalescing_stats()))
+
+@app.route('/api/upstream-stats', methods=['GET'])
+def get_upstream_stats():
+    """Get deadline, hedging and circuit breaker counters for LLM calls"""
+    return jsonify(llm_stats(lambda llm: llm.upstream_stats()))
+
+@app.route('/api/backends', methods=['GET'])
+def get_backends():
+    """List the AI backends with their availability and first-use load time"""
+    return jsonify({'default': default_backend(), 'backends': backends.stats()})
+
+@app.route('/api/book-stats', methods=['GET'])
+def get_book_stats():
+    """Get size and hit-rate counters for the opening book"""
+    return jsonify(opening_book.stats())
+
+@app.route('/api/endgame-stats', methods=['GET'])
+def get_endgame_stats():
+    """Get the loaded endgame tables and probe counters"""
+    return jsonify(endgame_tables.stats())
+
+@app.route('/api/game-log-stats', methods=['GET'])
+def get_game_log_stats():
+    """Get write, group-commit and restore counters for the game log"""
+    return jsonify(game_log.stats())
+
+@app.route('/api/ponder-stats', methods=['GET'])
+def get_ponder_stats():
+    """Get prediction and hit-rate counters for speculative pondering"""
+    return jsonify(ponderer.stats())
+
+@app.route('/api/shared-stats', methods=['GET'])
+def get_shared_stats():
+    """Get this worker's saves, write conflicts and lease waits on the shared game store"""
+    return jsonify(shared_games.stats() if shared_games.enabled else {})
+
+@app.route('/api/scheduler-stats', methods=['GET'])
+def get_scheduler_stats():
+    """Get queue depth, queue waits, degraded turns and deadline misses for AI turns"""
+    return jsonify(scheduler.stats())
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose stage timings and counters in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/game-state', methods=['GET'])
 def get_game_state():
-    """Get current game state"""
-    return jsonify({
-        'board': game_state['board'],
-        'current_player': game_state['current_player'],
-        'game_history': game_state['game_history']
-    })
+    """Get current game state, or the moves since ?since=<version>"""
+    payload, status, headers = game_state_payload(request.args.get('game_id'), request.args.get('since'),
+                                                  request.headers.get('If-None-Match'))
+    if payload is None:
+        return '', status, headers
+    return jsonify(payload), status, headers
 
 if __name__ == '__main__':
-    # Initialize game state
-    game_state['board'] = get_chess_board()
-    print("Chess game initialized with simple AI")
+    print("Chess game server starting with simple AI")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True)
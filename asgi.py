@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point for the chess server
+
+Serves the same API as app.py, but awaits the AI backend on the event loop
+instead of parking a worker thread for the whole LLM round trip. Run with:
+
+    hypercorn asgi:app --bind 0.0.0.0:5000
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, Response, make_response, render_template, request, jsonify
+
+from app import (
+    SSE_KEEPALIVE, backends, default_backend, llm_stats, endgame_tables, events, game_log, games, opening_book,
+    ponderer, scheduler, shared_games,
+    acknowledge_move, ai_turn, book_move, table_move, create_game, event_cursor, fallback_notifier, finish_ai_turn,
+    game_state_payload, publish_ai_reply, rewind_game, start_move,
+)
+from game_events import format_sse
+from pgn import game_to_pgn
+from metrics import AI_MOVES, METRICS_ENABLED, REGISTRY, stage
+
+app = Quart(__name__)
+logger = logging.getLogger(__name__)
+
+# Strong references to in-flight AI tasks so they are not garbage collected
+ai_tasks = set()
+
+# With games in the shared store, taking a game's lock can wait for another
+# worker's lease and every store access is SQLite I/O, so those calls run on
+# these threads instead of stalling every connection on the event loop
+store_workers = ThreadPoolExecutor(max_workers=int(os.getenv("SHARED_STORE_THREADS", "32")),
+                                   thread_name_prefix='shared-store')
+
+
+async def off_loop(function, *args):
+    """Call a function that touches the game store, on a store thread when games are shared"""
+    if not shared_games.enabled:
+        return function(*args)
+    return await asyncio.get_running_loop().run_in_executor(store_workers, function, *args)
+
+
+def locked(game_id, function, *args):
+    """Call function with the game's lock held"""
+    with games.lock(game_id):
+        return function(*args)
+
+
+@app.after_request
+async def add_cors_headers(response):
+    """Mirror the permissive CORS policy flask-cors applies to the WSGI app"""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type, If-None-Match'
+    response.headers['Access-Control-Expose-Headers'] = 'ETag'
+    return response
+
+
+@app.route('/')
+async def index():
+    """Serve the main chess game page"""
+    return await render_template('chess_game.html')
+
+
+@app.route('/api/initialize', methods=['POST'])
+async def initialize_game():
+    """Initialize a new chess game"""
+    try:
+        payload, status = await off_loop(create_game, await request.get_json(silent=True) or {})
+        return jsonify(payload), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+async def await_ai_move(game_state, game_context, on_fallback=None):
+    """Wait for the scheduler to grant the AI's turn a slot, then answer with the backend it was given"""
+    if not game_context['legal_moves']:
+        return None
+    async with scheduler.slot_async(ai_turn(game_state)) as turn:
+        game_context['backend'] = turn.backend
+        return await answer_ai_move(game_state, game_context, on_fallback)
+
+
+async def answer_ai_move(game_state, game_context, on_fallback=None):
+    """Await the AI backend without blocking the event loop"""
+    ai_move = table_move(game_state, game_context) or book_move(game_state, game_context)
+    if ai_move:
+        return ai_move
+    pondered = ponderer.take(game_state['game_id'], game_context['board'].hash)
+    if pondered is not None:
+        try:
+            with stage('ponder_wait'):
+                ai_move, fallback_reason = await asyncio.wrap_future(pondered)
+            # No move means the scheduler was too busy to speculate, so ask the backend now
+            if ai_move is not None:
+                logger.debug("Pondered AI move: %s", ai_move)
+                AI_MOVES.inc('ponder')
+                if fallback_reason and on_fallback:
+                    on_fallback(fallback_reason)
+                return ai_move
+        except Exception as e:
+            logger.warning("Pondered AI move failed: %r", e)
+    try:
+        # A backend's first use imports and builds it, which must not stall the event loop
+        backend = backends.loaded(game_context['backend'])
+        if backend is None:
+            backend = await asyncio.get_running_loop().run_in_executor(None, backends.get, game_context['backend'])
+        start = time.perf_counter()
+        with stage('ai_backend'):
+            ai_move = await backend.get_move_async(
+                game_context['board'],
+                game_context['last_move'],
+                game_context['history'],
+                game_context['conversation_history'],
+                on_fallback=on_fallback
+            )
+        scheduler.observe(game_context['backend'], time.perf_counter() - start)
+        AI_MOVES.inc('backend')
+        return ai_move
+    except Exception as e:
+        logger.warning("AI move generation failed: %r", e)
+        return None
+
+
+async def run_ai_move(game_id, game_state, game_context):
+    """Compute the AI reply as a task and publish it to the game's channel"""
+    try:
+        reasons = []
+        if game_context['legal_moves']:
+            await off_loop(events.publish, game_id, 'thinking', {'backend': game_state['ai_backend']})
+        ai_move = await await_ai_move(game_state, game_context, fallback_notifier(game_id, reasons))
+
+        # Subscribers saw the human move in the acknowledgement, so send just the reply
+        payload = await off_loop(finish_ai_turn, game_id, game_state, game_context, ai_move,
+                                 game_context['ai_since'], reasons)
+        if payload is not None:
+            await off_loop(publish_ai_reply, game_id, payload, bool(reasons))
+    except Exception as e:
+        logger.exception("AI move failed for game %s", game_id)
+        await off_loop(events.publish, game_id, 'error', {'error': str(e)})
+
+
+@app.route('/api/move', methods=['POST'])
+async def make_move():
+    """Apply the human move; the AI reply follows on /api/events"""
+    try:
+        with stage('parse_request'):
+            data = await request.get_json()
+            game_id = data.get('game_id')
+            game_state = await off_loop(games.get, game_id)
+        if game_state is None:
+            return jsonify({'success': False, 'error': 'Unknown game'}), 404
+
+        # The game lock is only held for the quick board updates; while the AI
+        # is thinking it is Black's turn, so a second human move is rejected
+        game_context, error = await off_loop(locked, game_id, start_move, game_state, data)
+        if error:
+            return jsonify(error), 400
+
+        if data.get('wait'):
+            reasons = []
+            ai_move = await await_ai_move(game_state, game_context, fallback_notifier(game_id, reasons))
+            payload = await off_loop(finish_ai_turn, game_id, game_state, game_context, ai_move,
+                                     game_context['since'], reasons)
+            if payload is None:
+                return jsonify({'success': False, 'error': 'The game changed while the AI was thinking'}), 409
+            with stage('serialize'):
+                return jsonify(payload)
+
+        task = asyncio.create_task(run_ai_move(game_id, game_state, game_context))
+        ai_tasks.add(task)
+        task.add_done_callback(ai_tasks.discard)
+        payload = acknowledge_move(game_state, game_context)
+        with stage('serialize'):
+            return jsonify(payload)
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/undo', methods=['POST'])
+async def undo_move():
+    """Take back the last human move and the AI reply to it"""
+    try:
+        payload, status = await off_loop(rewind_game, await request.get_json(silent=True) or {})
+        return jsonify(payload), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/redo', methods=['POST'])
+async def redo_move():
+    """Replay the moves of the last take-back"""
+    try:
+        payload, status = await off_loop(rewind_game, await request.get_json(silent=True) or {}, True)
+        return jsonify(payload), status
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/events', methods=['GET'])
+async def stream_events():
+    """Stream a game's AI progress and moves as server-sent events"""
+    game_id = request.args.get('game_id')
+    if await off_loop(games.get, game_id) is None:
+        return jsonify({'success': False, 'error': 'Unknown game'}), 404
+    cursor = await off_loop(event_cursor, game_id, request.headers.get('Last-Event-ID'),
+                            request.args.get('last_event_id'))
+
+    async def generate(cursor):
+        while game_id in games:
+            batch = await events.wait_async(game_id, cursor, SSE_KEEPALIVE)
+            if not batch:
+                yield b': keepalive\n\n'
+            for event_id, event, data in batch:
+                cursor = event_id
+                yield format_sse(event_id, event, data).encode()
+
+    response = await make_response(generate(cursor), 200, {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.timeout = None  # Keep the stream open past Quart's default response timeout
+    return response
+
+
+@app.route('/api/pgn', methods=['GET'])
+async def export_pgn():
+    """Download a game as PGN"""
+    game_id = request.args.get('game_id')
+    game_state = await off_loop(games.get, game_id)
+    if game_state is None:
+        return jsonify({'success': False, 'error': 'Unknown game'}), 404
+    text = await off_loop(locked, game_id, game_to_pgn, game_state)
+    return Response(text, mimetype='application/x-chess-pgn',
+                    headers={'Content-Disposition': f'attachment; filename="{game_id}.pgn"'})
+
+
+@app.route('/api/cache-stats', methods=['GET'])
+async def get_cache_stats():
+    """Get hit/miss/eviction counters for the LLM position cache"""
+    return jsonify(llm_stats(lambda llm: llm.cache.stats()))
+
+
+@app.route('/api/coalescer-stats', methods=['GET'])
+async def get_coalescer_stats():
+    """Get single-flight and batching counters for LLM requests"""
+    return jsonify(llm_stats(lambda llm: llm.coalescing_stats()))
+
+
+@app.route('/api/upstream-stats', methods=['GET'])
+async def get_upstream_stats():
+    """Get deadline, hedging and circuit breaker counters for LLM calls"""
+    return jsonify(llm_stats(lambda llm: llm.upstream_stats()))
+
+
+@app.route('/api/backends', methods=['GET'])
+async def get_backends():
+    """List the AI backends with their availability and first-use load time"""
+    return jsonify({'default': default_backend(), 'backends': backends.stats()})
+
+
+@app.route('/api/book-stats', methods=['GET'])
+async def get_book_stats():
+    """Get size and hit-rate counters for the opening book"""
+    return jsonify(opening_book.stats())
+
+
+@app.route('/api/endgame-stats', methods=['GET'])
+async def get_endgame_stats():
+    """Get the loaded endgame tables and probe counters"""
+    return jsonify(endgame_tables.stats())
+
+
+@app.route('/api/game-log-stats', methods=['GET'])
+async def get_game_log_stats():
+    """Get write, group-commit and restore counters for the game log"""
+    return jsonify(game_log.stats())
+
+
+@app.route('/api/ponder-stats', methods=['GET'])
+async def get_ponder_stats():
+    """Get prediction and hit-rate counters for speculative pondering"""
+    return jsonify(ponderer.stats())
+
+
+@app.route('/api/shared-stats', methods=['GET'])
+async def get_shared_stats():
+    """Get this worker's saves, write conflicts and lease waits on the shared game store"""
+    return jsonify(shared_games.stats() if shared_games.enabled else {})
+
+
+@app.route('/api/scheduler-stats', methods=['GET'])
+async def get_scheduler_stats():
+    """Get queue depth, queue waits, degraded turns and deadline misses for AI turns"""
+    return jsonify(scheduler.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    """Expose stage timings and counters in the Prometheus text format"""
+    if not METRICS_ENABLED:
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/game-state', methods=['GET'])
+async def get_game_state():
+    """Get current game state, or the moves since ?since=<version>"""
+    payload, status, headers = await off_loop(game_state_payload, request.args.get('game_id'),
+                                              request.args.get('since'), request.headers.get('If-None-Match'))
+    if payload is None:
+        return '', status, headers
+    return jsonify(payload), status, headers
+
+
+if __name__ == '__main__':
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"0.0.0.0:{os.getenv('PORT', '5000')}"]
+    print("Chess game ASGI server starting")
+    asyncio.run(serve(app, config))
@@ -0,0 +1,257 @@
+"""
+Vectorized evaluation of many positions at once with NumPy
+
+Positions are encoded as int8 arrays of 64 signed piece codes (+1..+6 for
+White's pawn..king, -1..-6 for Black's, 0 for empty) and a whole batch is
+scored in one pass: material and piece-square values (the engine's own
+tables), mobility, attacked squares around each king and the pawn shield in
+front of it. Mobility and attacks are computed on one uint64 bitboard per
+piece type and position, so every step is a single array operation over the
+batch. Scoring all children of a position together is how moves are ranked
+for the engine's root ordering and for the candidate shortlist;
+evaluate_position computes the same score one position at a time.
+"""
+
+import numpy as np
+
+from chess_board import (
+    BLACK, WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, CASTLE, CASTLING_ROOKS, EN_PASSANT,
+)
+from chess_engine import SQUARE_SCORES
+from move_generator import BISHOP_DIRECTIONS, KING_OFFSETS, KNIGHT_OFFSETS, ROOK_DIRECTIONS, legal_moves
+
+MOBILITY_WEIGHT = 4  # Per square a knight, bishop, rook, queen or king can move to
+KING_ZONE_WEIGHT = 12  # Per square next to (or under) the king the opponent attacks
+PAWN_SHIELD_WEIGHT = 10  # Per own pawn on the three squares in front of the king
+
+_SQUARES = np.arange(64)
+_SQUARE_88 = [(index >> 3) << 4 | (index & 7) for index in range(64)]
+
+
+def _delta(offset):
+    """Split a 0x88 offset into (rows, columns)"""
+    columns = (offset + 8) % 16 - 8
+    return (offset - columns) // 16, columns
+
+
+_KNIGHT_DELTAS = [_delta(offset) for offset in KNIGHT_OFFSETS]
+_DIAGONAL_DELTAS = [_delta(offset) for offset in BISHOP_DIRECTIONS]
+_STRAIGHT_DELTAS = [_delta(offset) for offset in ROOK_DIRECTIONS]
+_KING_DELTAS = [_delta(offset) for offset in KING_OFFSETS]
+
+
+def _build_square_table():
+    """Material plus piece-square value per (signed piece code + 6, square), White positive"""
+    table = np.zeros((13, 64), dtype=np.int32)
+    for kind in range(PAWN, KING + 1):
+        for index, sq in enumerate(_SQUARE_88):
+            table[6 + kind, index] = SQUARE_SCORES[WHITE | kind][sq]
+            table[6 - kind, index] = -SQUARE_SCORES[BLACK | kind][sq]
+    return table
+
+
+_SQUARE_TABLE = _build_square_table()
+
+
+def encode(board):
+    """Encode a board as 64 signed piece codes, rank 8 first"""
+    planes = np.zeros(64, dtype=np.int8)
+    for piece, squares in enumerate(board.piece_squares):
+        if squares:
+            code = piece & 7 if piece < BLACK else -(piece & 7)
+            for sq in squares:
+                planes[(sq >> 4) * 8 + (sq & 7)] = code
+    return planes
+
+
+def encode_batch(boards):
+    """Encode several boards into one (N, 64) array"""
+    return np.stack([encode(board) for board in boards]) if boards else np.zeros((0, 64), dtype=np.int8)
+
+
+def encode_children(board, moves):
+    """Encode the position after each move, editing copies of the parent instead of making the moves"""
+    parent = encode(board)
+    children = np.repeat(parent[None, :], len(moves), axis=0)
+    sign = 1 if board.side == WHITE else -1
+    for row, (from_sq, to_sq, promotion, flags) in enumerate(moves):
+        child = children[row]
+        source = (from_sq >> 4) * 8 + (from_sq & 7)
+        child[(to_sq >> 4) * 8 + (to_sq & 7)] = sign * promotion if promotion else child[source]
+        child[source] = 0
+        if flags & CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            child[(rook_to >> 4) * 8 + (rook_to & 7)] = child[(rook_from >> 4) * 8 + (rook_from & 7)]
+            child[(rook_from >> 4) * 8 + (rook_from & 7)] = 0
+        elif flags & EN_PASSANT:
+            child[(from_sq >> 4) * 8 + (to_sq & 7)] = 0
+    return children
+
+
+def _shift_plan(rows, columns, distance=1):
+    """(shift left?, bit count, mask of squares that do not wrap around a board edge) for a shift"""
+    offset = (rows * 8 + columns) * distance
+    keep = 0
+    for index in range(64):
+        column = index & 7
+        if (columns >= 0 or column < 8 + columns * distance) and (columns <= 0 or column >= columns * distance):
+            keep |= 1 << index
+    return offset > 0, np.uint64(abs(offset)), np.uint64(keep)
+
+
+_PLANS = {(rows, columns, distance): _shift_plan(rows, columns, distance)
+          for rows in (-2, -1, 0, 1, 2) for columns in (-2, -1, 0, 1, 2) for distance in (1, 2, 4)
+          if (rows or columns) and abs(rows * distance) < 8 and abs(columns * distance) < 8}
+
+
+def _shift(bits, rows, columns, distance=1):
+    """Move every set square by rows and columns (times distance), dropping those that leave the board"""
+    left, amount, keep = _PLANS[rows, columns, distance]
+    return ((bits << amount) if left else (bits >> amount)) & keep
+
+
+def _slide(pieces, empty, rows, columns):
+    """Squares attacked by sliders along one direction, stopping at the first occupied square (Kogge-Stone)"""
+    _, _, keep = _PLANS[rows, columns, 1]
+    empty = empty & keep
+    pieces = pieces | (empty & _shift(pieces, rows, columns))
+    empty = empty & _shift(empty, rows, columns)
+    pieces = pieces | (empty & _shift(pieces, rows, columns, 2))
+    empty = empty & _shift(empty, rows, columns, 2)
+    pieces = pieces | (empty & _shift(pieces, rows, columns, 4))
+    return _shift(pieces, rows, columns)
+
+
+def _bitboards(planes, code):
+    """One uint64 per position with bit i set where planes[:, i] == code"""
+    return np.packbits(planes == code, axis=1, bitorder='little').view('<u8')[:, 0]
+
+
+def _activity(pieces, own, empty):
+    """Per position, the mobility of one side's pieces and the squares they attack"""
+    reachable = ~own
+    mobility = np.zeros(len(own), dtype=np.int32)
+    attacked = np.zeros(len(own), dtype=np.uint64)
+
+    # Pawns only count towards the attack map
+    for columns in (-1, 1):
+        attacked |= _shift(pieces[PAWN], -1, columns)
+
+    # One direction at a time, so two pieces never share a target and every move counts
+    for kind, deltas in ((KNIGHT, _KNIGHT_DELTAS), (KING, _KING_DELTAS)):
+        for rows, columns in deltas:
+            targets = _shift(pieces[kind], rows, columns)
+            attacked |= targets
+            mobility += np.bitwise_count(targets & reachable)
+
+    for kind, deltas in ((BISHOP, _DIAGONAL_DELTAS), (ROOK, _STRAIGHT_DELTAS)):
+        sliders = pieces[kind] | pieces[QUEEN]
+        for rows, columns in deltas:
+            targets = _slide(sliders, empty, rows, columns)
+            attacked |= targets
+            mobility += np.bitwise_count(targets & reachable)
+    return mobility, attacked
+
+
+def _king_safety(pieces, enemy_attacks):
+    """Per position, attacked squares around one side's king and its pawns in front of it"""
+    king = pieces[KING]
+    zone = king
+    for rows, columns in _KING_DELTAS:
+        zone = zone | _shift(king, rows, columns)
+    shield = np.zeros(len(king), dtype=np.int32)
+    for columns in (-1, 0, 1):
+        shield += np.bitwise_count(_shift(king, -1, columns) & pieces[PAWN])
+    return np.bitwise_count(zone & enemy_attacks).astype(np.int32), shield
+
+
+def evaluate_batch(planes):
+    """Score an (N, 64) batch of encoded positions in centipawns from White's point of view"""
+    planes = np.asarray(planes, dtype=np.int8)
+    count = len(planes)
+    score = _SQUARE_TABLE[planes.astype(np.intp) + 6, _SQUARES].sum(axis=1, dtype=np.int32)
+
+    # Black's pieces are scored as White's in the mirrored position (a byte swap
+    # flips the ranks), so both sides go through one pass: White first, then Black
+    pieces = [None] * (KING + 1)
+    for kind in range(PAWN, KING + 1):
+        pieces[kind] = np.concatenate((_bitboards(planes, kind), _bitboards(planes, -kind).byteswap()))
+    own = np.bitwise_or.reduce(pieces[PAWN:])
+    enemy = np.concatenate((own[count:], own[:count])).byteswap()
+    mobility, attacked = _activity(pieces, own, ~(own | enemy))
+    enemy_attacks = np.concatenate((attacked[count:], attacked[:count])).byteswap()
+    zone, shield = _king_safety(pieces, enemy_attacks)
+
+    score += MOBILITY_WEIGHT * (mobility[:count] - mobility[count:])
+    score -= KING_ZONE_WEIGHT * (zone[:count] - zone[count:])
+    score += PAWN_SHIELD_WEIGHT * (shield[:count] - shield[count:])
+    return score
+
+
+def score_moves(board, moves=None):
+    """Score the position after each legal move from the mover's point of view, in one batch"""
+    if moves is None:
+        moves = legal_moves(board)
+    if not moves:
+        return []
+    scores = evaluate_batch(encode_children(board, moves))
+    if board.side != WHITE:
+        scores = -scores
+    return list(zip(moves, scores.tolist()))
+
+
+def rank_moves(board, moves=None):
+    """Legal moves ordered best first by the static score of the position each leads to"""
+    return [move for move, _ in sorted(score_moves(board, moves), key=lambda item: -item[1])]
+
+
+def shortlist(board, count=None, moves=None):
+    """The count best-scoring legal moves (all of them for None), best first, as (move, score) pairs"""
+    return sorted(score_moves(board, moves), key=lambda item: -item[1])[:count]
+
+
+def evaluate_position(board):
+    """The evaluate_batch score of a single board, computed square by square without NumPy"""
+    squares = board.squares
+    score = 0
+    for piece, piece_squares in enumerate(board.piece_squares):
+        for sq in piece_squares:
+            score += SQUARE_SCORES[piece][sq] if piece < BLACK else -SQUARE_SCORES[piece][sq]
+
+    sides = {}
+    for color in (WHITE, BLACK):
+        mobility = 0
+        attacked = set()
+        for sq in board.piece_squares[color | PAWN]:
+            for offset in ((-17, -15) if color == WHITE else (15, 17)):
+                if not (sq + offset) & 0x88:
+                    attacked.add(sq + offset)
+        for kind, offsets, slides in ((KNIGHT, KNIGHT_OFFSETS, False), (BISHOP, BISHOP_DIRECTIONS, True),
+                                      (ROOK, ROOK_DIRECTIONS, True), (QUEEN, KING_OFFSETS, True),
+                                      (KING, KING_OFFSETS, False)):
+            for sq in board.piece_squares[color | kind]:
+                for offset in offsets:
+                    target = sq + offset
+                    while not target & 0x88:
+                        attacked.add(target)
+                        piece = squares[target]
+                        if not piece or piece & BLACK != color:
+                            mobility += 1
+                        if piece or not slides:
+                            break
+                        target += offset
+        sides[color] = mobility, attacked
+
+    for color, sign in ((WHITE, 1), (BLACK, -1)):
+        mobility, _ = sides[color]
+        _, enemy_attacks = sides[color ^ BLACK]
+        zone = shield = 0
+        for king_sq in board.piece_squares[color | KING]:
+            zone += king_sq in enemy_attacks
+            zone += sum(not (king_sq + offset) & 0x88 and king_sq + offset in enemy_attacks
+                        for offset in KING_OFFSETS)
+            ahead = -16 if color == WHITE else 16
+            shield += sum(not (king_sq + ahead + side) & 0x88 and squares[king_sq + ahead + side] == color | PAWN
+                          for side in (-1, 0, 1))
+        score += sign * (MOBILITY_WEIGHT * mobility - KING_ZONE_WEIGHT * zone + PAWN_SHIELD_WEIGHT * shield)
+    return score
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the chess server
+
+Launches the Flask or ASGI server as a fresh process several times and
+measures how long it takes until /api/backends answers, then how long the
+first engine game takes to get its first AI reply. With --llm the server is
+pointed at the local OpenAI stub and the first LLM move is timed as well,
+which is when the LLM backend is imported and built. Without --llm the
+server runs with no OPENAI_API_KEY, as a fresh checkout would. Exits
+non-zero when the median time to ready exceeds --max-seconds:
+
+    python benchmarks/cold_start.py --server flask --runs 5 --max-seconds 1.0
+    python benchmarks/cold_start.py --server asgi --llm
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import fetch_json, free_port
+from openai_stub import start_stub
+
+
+def post_json(port, path, body):
+    """POST a JSON body and return the decoded reply, or None on an error status"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        connection.request('POST', path, json.dumps(body), {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        reply = json.loads(response.read())
+        return reply if response.status == 200 else None
+    finally:
+        connection.close()
+
+
+def first_reply(port, backend):
+    """Seconds from creating a game on a backend to the AI's first reply"""
+    start = time.perf_counter()
+    game = post_json(port, '/api/initialize', {'backend': backend})
+    if game is None:
+        raise RuntimeError(f"could not start a {backend} game")
+    reply = post_json(port, '/api/move', {'game_id': game['game_id'], 'from': {'row': 6, 'col': 4},
+                                          'to': {'row': 4, 'col': 4}, 'wait': True})
+    if reply is None or not reply.get('ai_move'):
+        raise RuntimeError(f"no AI reply from the {backend} backend")
+    return time.perf_counter() - start
+
+
+def measure(kind, env, llm):
+    """Start one server process and return its timings in seconds"""
+    port = free_port()
+    if kind == 'flask':
+        command = [sys.executable, '-c', f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    else:
+        command = [sys.executable, '-m', 'hypercorn', 'asgi:app', '--bind', f"127.0.0.1:{port}"]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while fetch_json(f"http://127.0.0.1:{port}", '/api/backends') is None:
+            if process.poll() is not None:
+                raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+            if time.perf_counter() - start > 60:
+                raise RuntimeError(f"{kind} server did not start within 60s")
+            time.sleep(0.01)
+        timings = {'ready': time.perf_counter() - start, 'engine_move': first_reply(port, 'engine')}
+        if llm:
+            timings['llm_move'] = first_reply(port, 'llm')
+            loaded = fetch_json(f"http://127.0.0.1:{port}", '/api/backends')['backends']['llm']
+            timings['llm_init'] = loaded['init_seconds']
+        return timings
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask')
+    parser.add_argument('--runs', type=int, default=5, help='server launches to take the median of')
+    parser.add_argument('--llm', action='store_true', help='also time the first LLM move against the stub')
+    parser.add_argument('--max-seconds', type=float, default=1.0, help='median seconds to ready allowed')
+    args = parser.parse_args()
+
+    # No opening book, so the first reply really comes from the backend being timed
+    env = dict(os.environ, OPENING_BOOK_PATH='', PYTHONUNBUFFERED='1')
+    env.pop('OPENAI_API_KEY', None)
+    stub = None
+    if args.llm:
+        stub, _, upstream_url = start_stub(port=free_port(), latency=0.05)
+        env.update(OPENAI_BASE_URL=upstream_url, OPENAI_API_KEY='stub')
+    try:
+        runs = [measure(args.server, env, args.llm) for _ in range(args.runs)]
+    finally:
+        if stub is not None:
+            stub.shutdown()
+
+    print(f"{args.server} server, {args.runs} cold starts{' with the LLM stub' if args.llm else ', no API key'}\n")
+    print(f"{'phase':<28}{'median s':>10}{'max s':>10}")
+    labels = {'ready': 'process start to ready', 'engine_move': 'first engine reply',
+              'llm_move': 'first LLM reply', 'llm_init': '  of which LLM backend load'}
+    for key, label in labels.items():
+        if key in runs[0]:
+            values = [run[key] for run in runs]
+            print(f"{label:<28}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+    ready = statistics.median(run['ready'] for run in runs)
+    if ready > args.max_seconds:
+        print(f"\nFAIL: median time to ready {ready:.3f}s is over {args.max_seconds}s")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Batch evaluator benchmark: NumPy batches against a pure-Python loop
+
+Collects positions from seeded random games and scores every child of each
+one three ways: batch_eval.evaluate_batch, batch_eval.evaluate_position
+called once per child, and the engine's material-only evaluate for
+reference. Checks that the first two agree, then reports positions per
+second for each, once per parent position (move ordering) and over the
+whole set in one batch.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from batch_eval import encode_children, evaluate_batch, evaluate_position
+from chess_board import Board
+from chess_engine import evaluate
+from move_generator import legal_moves
+
+
+def sample_positions(count, seed):
+    """Positions with their legal moves, taken every few plies from random games"""
+    rng = random.Random(seed)
+    samples = []
+    while len(samples) < count:
+        board = Board.starting_position()
+        for ply in range(rng.randint(10, 120)):
+            moves = legal_moves(board)
+            if not moves:
+                break
+            if ply % 5 == 0:
+                samples.append((board.copy(), moves))
+            board.make_move(rng.choice(moves))
+    return samples[:count]
+
+
+def python_scores(samples, score):
+    """Score every child by making and unmaking its move on the parent board"""
+    scores = []
+    for board, moves in samples:
+        for move in moves:
+            undo = board.make_move(move)
+            scores.append(score(board))
+            board.unmake_move(move, undo)
+    return scores
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run(count, seed):
+    """Run every variant, print a results table and return the number of mismatches"""
+    samples = sample_positions(count, seed)
+    children = sum(len(moves) for _, moves in samples)
+
+    reference, python_time = timed(python_scores, samples, evaluate_position)
+    _, material_time = timed(python_scores, samples, evaluate)
+
+    def per_parent():
+        return np.concatenate([evaluate_batch(encode_children(board, moves)) for board, moves in samples])
+    per_parent_scores, per_parent_time = timed(per_parent)
+
+    planes = np.concatenate([encode_children(board, moves) for board, moves in samples])
+    batch_scores, batch_time = timed(evaluate_batch, planes)
+
+    mismatches = int(np.count_nonzero(per_parent_scores != reference) + np.count_nonzero(batch_scores != reference))
+    print(f"{len(samples)} parent positions, {children} children scored\n")
+    print(f"{'variant':<36}{'seconds':>10}{'positions/s':>14}{'speedup':>10}")
+    for name, elapsed in (('python loop, evaluate_position', python_time),
+                          ('python loop, engine material only', material_time),
+                          ('numpy, one batch per parent', per_parent_time),
+                          ('numpy, all children in one batch', batch_time)):
+        print(f"{name:<36}{elapsed:>10.3f}{children / elapsed:>14.0f}{python_time / elapsed:>9.1f}x")
+    print(f"\nMismatches against evaluate_position: {mismatches}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--positions', type=int, default=500, help='parent positions to sample')
+    parser.add_argument('--seed', type=int, default=1, help='seed for the random games')
+    args = parser.parse_args()
+    sys.exit(1 if run(args.positions, args.seed) else 0)
+
+
+if __name__ == '__main__':
+    main()
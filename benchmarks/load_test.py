@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Load test for the game API against a local OpenAI stub
+
+Starts the OpenAI-compatible stub from openai_stub.py in-process, launches the
+Flask or ASGI server as a child process pointed at it, and has N concurrent
+clients play scripted games through /api/initialize, /api/move (with
+"wait": true) and /api/game-state. Reports requests per second,
+p50/p95/p99 latency per endpoint, the engine fallback rate and the server's
+memory growth, and exits non-zero when a --max-* threshold is exceeded, so
+it can gate changes to app.py:
+
+    python benchmarks/load_test.py --server flask --clients 16 --games 4 --plies 20
+    python benchmarks/load_test.py --server asgi --clients 64 --latency 0.4 --jitter 0.3 --error-rate 0.05
+
+Use --url to load an already running server instead (memory is then only
+reported when --pid is given). --workers N launches the production mode of
+start_game.py instead: N worker processes sharing games through SQLite.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from chess_board import Board, square_coords
+from move_generator import legal_moves, parse_san
+from openai_stub import start_stub
+from start_game import production_command, production_env
+
+ENDPOINTS = ('initialize', 'move', 'game-state')
+
+
+def percentile(ordered, percent):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(len(ordered) * percent / 100)) - 1))]
+
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    """A process and all its descendants, from /proc (just the process elsewhere)"""
+    found = [pid]
+    for member in found:
+        try:
+            for task in os.listdir(f"/proc/{member}/task"):
+                with open(f"/proc/{member}/task/{task}/children") as children:
+                    found.extend(int(child) for child in children.read().split())
+        except OSError:
+            pass
+    return found
+
+
+def rss_bytes(pid):
+    """Resident set size of a server and its worker processes, or None where /proc is unavailable"""
+    total = None
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total = (total or 0) + int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+class Results:
+    """Thread-safe latency samples and counters gathered by the clients"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = Counter()
+        self.fallbacks = Counter()
+        self.ai_moves = 0
+        self.games = 0
+
+    def record(self, endpoint, seconds, status):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint, status] += 1
+            if status >= 400:
+                self.errors[endpoint] += 1
+
+    def record_reply(self, payload):
+        with self.lock:
+            if payload.get('ai_move'):
+                self.ai_moves += 1
+            if payload.get('fallback_used'):
+                self.fallbacks[payload.get('fallback_reason') or 'unknown'] += 1
+
+
+class Client:
+    """One simulated player with a keep-alive connection, playing random legal White moves"""
+
+    def __init__(self, base_url, results, backend, plies, polls, seed, time_control=None):
+        parts = urlsplit(base_url)
+        self.connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=120)
+        self.results = results
+        self.backend = backend
+        self.time_control = time_control
+        self.plies = plies
+        self.polls = polls
+        self.random = random.Random(seed)
+
+    def request(self, endpoint, method, path, body=None, headers=None):
+        """Send one request and return (status, response headers, parsed JSON or None)"""
+        headers = dict(headers or {})
+        data = None
+        if body is not None:
+            data = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            self.connection.request(method, path, data, headers)
+            response = self.connection.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            self.results.record(endpoint, time.perf_counter() - start, 599)
+            return 599, http.client.HTTPMessage(), None
+        self.results.record(endpoint, time.perf_counter() - start, status)
+        payload = json.loads(raw) if raw and status != 304 else None
+        return status, response.headers, payload
+
+    def play(self, games):
+        for _ in range(games):
+            self.play_game()
+        self.connection.close()
+
+    def play_game(self):
+        body = {'backend': self.backend}
+        if self.time_control:
+            body['time_control'] = self.time_control
+        status, _, game = self.request('initialize', 'POST', '/api/initialize', body)
+        if status != 200:
+            return
+        game_id = game['game_id']
+        version = game['version']
+        etag = None
+        board = Board.starting_position()
+        for _ in range(self.plies):
+            moves = legal_moves(board)
+            if not moves:
+                break
+            move = self.random.choice(moves)
+            status, _, reply = self.request('move', 'POST', '/api/move', {
+                'game_id': game_id,
+                'from': square_coords(move.from_sq),
+                'to': square_coords(move.to_sq),
+                'since': version,
+                'wait': True
+            })
+            if status != 200 or not reply.get('success'):
+                break
+            self.results.record_reply(reply)
+            version = reply['version']
+            board.make_move(move)
+            ai_move = parse_san(board, reply['ai_move']) if reply.get('ai_move') else None
+            if ai_move is None:
+                break
+            board.make_move(ai_move)
+
+            # A polling client: the first poll returns the new state, later ones hit 304
+            for _ in range(self.polls):
+                headers = {'If-None-Match': etag} if etag else {}
+                status, response_headers, _ = self.request(
+                    'game-state', 'GET', f"/api/game-state?game_id={game_id}&since={version}", headers=headers)
+                etag = response_headers.get('ETag', etag)
+        with self.results.lock:
+            self.results.games += 1
+
+
+def start_server(kind, port, upstream_url, log, workers=0, shared_path=None):
+    """Launch the Flask or ASGI server as a child process and wait until it answers"""
+    env = dict(production_env(shared_path) if workers else os.environ, OPENAI_BASE_URL=upstream_url,
+               OPENAI_API_KEY=os.getenv('OPENAI_API_KEY', 'stub'), PYTHONUNBUFFERED='1')
+    if workers:
+        command = production_command(kind, workers, f"127.0.0.1:{port}")
+    elif kind == 'flask':
+        command = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    else:
+        command = [sys.executable, '-m', 'hypercorn', 'asgi:app', '--bind', f"127.0.0.1:{port}"]
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{kind} server exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not start within 60s")
+
+
+def fetch_json(base_url, path):
+    """GET a JSON endpoint, returning None if it is unavailable"""
+    parts = urlsplit(base_url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    try:
+        connection.request('GET', path)
+        response = connection.getresponse()
+        return json.loads(response.read()) if response.status == 200 else None
+    except (OSError, ValueError, http.client.HTTPException):
+        return None
+    finally:
+        connection.close()
+
+
+def run(args):
+    """Run the load test and return (report dict, list of threshold failures)"""
+    stub = None
+    process = None
+    log = None
+    scratch = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+        pid = args.pid
+    else:
+        stub, stub_settings, upstream_url = start_stub(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, stall_rate=args.stall_rate,
+            stall=args.stall, illegal_rate=args.illegal_rate, seed=args.seed)
+        port = free_port()
+        log = open(args.server_log, 'w') if args.server_log else subprocess.DEVNULL
+        if args.workers:
+            scratch = tempfile.mkdtemp(prefix='chess-shared-')
+        process = start_server(args.server, port, upstream_url, log, args.workers,
+                               scratch and os.path.join(scratch, 'games.db'))
+        base_url = f"http://127.0.0.1:{port}"
+        pid = process.pid
+
+    results = Results()
+    peak = rss_start = rss_bytes(pid) if pid else None
+    done = threading.Event()
+
+    def sample_memory():
+        nonlocal peak
+        while not done.wait(0.5):
+            current = rss_bytes(pid)
+            if current and (peak is None or current > peak):
+                peak = current
+
+    clients = [Client(base_url, results, args.backend, args.plies, args.polls,
+                      None if args.seed is None else args.seed + number, args.time_control)
+               for number in range(args.clients)]
+    threads = [threading.Thread(target=client.play, args=(args.games,)) for client in clients]
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    rss_end = rss_bytes(pid) if pid else None
+
+    report = {
+        'server': args.url or (f"{args.server} x{args.workers} workers" if args.workers else args.server),
+        'clients': args.clients,
+        'games': results.games,
+        'seconds': elapsed,
+        'requests_per_second': sum(len(samples) for samples in results.latencies.values()) / elapsed,
+        'endpoints': {},
+        'ai_moves': results.ai_moves,
+        'fallbacks': dict(results.fallbacks),
+        'fallback_rate': sum(results.fallbacks.values()) / results.ai_moves if results.ai_moves else 0.0,
+        'not_modified': results.statuses['game-state', 304],
+        'memory': {
+            'rss_start': rss_start,
+            'rss_peak': peak,
+            'rss_end': rss_end,
+            'growth': rss_end - rss_start if rss_start and rss_end else None
+        },
+        'upstream': fetch_json(base_url, '/api/upstream-stats'),
+        'scheduler': fetch_json(base_url, '/api/scheduler-stats'),
+        'stub': stub_settings.stats() if stub else None
+    }
+    for endpoint in ENDPOINTS:
+        ordered = sorted(results.latencies[endpoint])
+        report['endpoints'][endpoint] = {
+            'requests': len(ordered),
+            'errors': results.errors[endpoint],
+            'per_second': len(ordered) / elapsed,
+            'p50': percentile(ordered, 50),
+            'p95': percentile(ordered, 95),
+            'p99': percentile(ordered, 99),
+            'max': ordered[-1] if ordered else 0.0
+        }
+
+    if process:
+        process.terminate()
+        process.wait(10)
+    if stub:
+        stub.shutdown()
+    if log not in (None, subprocess.DEVNULL):
+        log.close()
+    if scratch:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    failures = []
+    move_stats = report['endpoints']['move']
+    if args.max_p95 is not None and move_stats['p95'] > args.max_p95:
+        failures.append(f"/api/move p95 {move_stats['p95']:.3f}s > {args.max_p95}s")
+    errors = sum(stats['errors'] for stats in report['endpoints'].values())
+    if args.max_errors is not None and errors > args.max_errors:
+        failures.append(f"{errors} failed requests > {args.max_errors}")
+    if args.max_fallback_rate is not None and report['fallback_rate'] > args.max_fallback_rate:
+        failures.append(f"fallback rate {report['fallback_rate']:.1%} > {args.max_fallback_rate:.1%}")
+    growth = report['memory']['growth']
+    if args.max_memory_growth is not None and growth is not None and growth > args.max_memory_growth * 2**20:
+        failures.append(f"memory growth {growth / 2**20:.1f} MiB > {args.max_memory_growth} MiB")
+    return report, failures
+
+
+def print_report(report):
+    """Print the results as a table"""
+    print(f"{report['clients']} clients, {report['games']} games in {report['seconds']:.1f}s "
+          f"({report['requests_per_second']:.1f} req/s) against {report['server']}\n")
+    print(f"{'endpoint':<12}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:<12}{stats['requests']:>10}{stats['errors']:>8}{stats['per_second']:>9.1f}"
+              f"{stats['p50'] * 1000:>9.0f}{stats['p95'] * 1000:>9.0f}{stats['p99'] * 1000:>9.0f}"
+              f"{stats['max'] * 1000:>9.0f}")
+
+    reasons = ', '.join(f"{reason} {count}" for reason, count in sorted(report['fallbacks'].items()))
+    print(f"\nAI moves: {report['ai_moves']}, fallback rate {report['fallback_rate']:.1%}"
+          + (f" ({reasons})" if reasons else ""))
+    print(f"game-state 304 responses: {report['not_modified']}")
+    memory = report['memory']
+    if memory['rss_start']:
+        print(f"Server RSS: {memory['rss_start'] / 2**20:.1f} MiB -> {memory['rss_end'] / 2**20:.1f} MiB "
+              f"(peak {memory['rss_peak'] / 2**20:.1f} MiB, growth {memory['growth'] / 2**20:+.1f} MiB)")
+    upstream = report['upstream']
+    if upstream:
+        print(f"Upstream: {upstream['calls']} calls, {upstream['hedges']} hedges ({upstream['hedge_wins']} won), "
+              f"{upstream['deadline_misses']} deadline misses, breaker {upstream['breaker']['state']} "
+              f"(opened {upstream['breaker']['opens']}x)")
+        legality = upstream.get('legality')
+        if legality and legality['answers']:
+            print(f"LLM legality: {legality['first_try_legality_rate']:.1%} first try, "
+                  f"{legality['legality_rate']:.1%} overall, {legality['retries_per_move']:.2f} retries/move")
+    scheduler = report['scheduler']
+    if scheduler:
+        wait = scheduler['queue_wait_p95'] or 0.0
+        print(f"Scheduler: {scheduler['finished']} AI turns, max {scheduler['max_queued']} queued, "
+              f"queue wait p95 {wait * 1000:.0f} ms, degraded {scheduler['degraded']['clock']} for the clock "
+              f"and {scheduler['degraded']['queue']} for the queue, {scheduler['deadline_misses']} deadline misses")
+    if report['stub']:
+        stub = report['stub']
+        print(f"Stub: {stub['requests']} requests, {stub['errors']} errors, {stub['stalls']} stalls, "
+              f"{stub['illegal']} illegal answers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=('flask', 'asgi'), default='flask', help='server to launch')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='launch the production mode with this many worker processes sharing games')
+    parser.add_argument('--url', help='load an already running server instead of launching one')
+    parser.add_argument('--pid', type=int, help='process ID of the --url server, for memory readings')
+    parser.add_argument('--server-log', help='file to write the launched server\'s output to')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--games', type=int, default=2, help='games each client plays')
+    parser.add_argument('--plies', type=int, default=20, help='human moves per game')
+    parser.add_argument('--polls', type=int, default=2, help='/api/game-state polls after each move')
+    parser.add_argument('--backend', default='llm', help='AI backend for the games')
+    parser.add_argument('--time-control', help="time control for the games (default: the server's)")
+    parser.add_argument('--seed', type=int, help='seed for the clients\' moves and the stub')
+
+    stub = parser.add_argument_group('OpenAI stub')
+    stub.add_argument('--latency', type=float, default=0.2, help='base seconds per completion')
+    stub.add_argument('--jitter', type=float, default=0.1, help='mean extra exponential delay, seconds')
+    stub.add_argument('--error-rate', type=float, default=0.0, help='share of completions failing with HTTP 500')
+    stub.add_argument('--stall-rate', type=float, default=0.0, help='share of completions that hang')
+    stub.add_argument('--stall', type=float, default=60.0, help='seconds a stalled completion hangs')
+    stub.add_argument('--illegal-rate', type=float, default=0.0, help='share of completions with illegal moves')
+
+    gates = parser.add_argument_group('thresholds (exit code 1 when exceeded)')
+    gates.add_argument('--max-p95', type=float, help='seconds allowed for /api/move p95')
+    gates.add_argument('--max-errors', type=int, help='failed requests allowed')
+    gates.add_argument('--max-fallback-rate', type=float, help='share of AI moves allowed to fall back')
+    gates.add_argument('--max-memory-growth', type=float, help='MiB of server RSS growth allowed')
+    parser.add_argument('--json', help='also write the report to this JSON file')
+    args = parser.parse_args()
+
+    report, failures = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(report, output, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible chat completions stub with injectable latency and faults
+
+Answers /v1/chat/completions with a legal move for the FEN in the prompt (or
+one line per game for batched prompts), after a configurable delay. A share of
+requests can fail with HTTP 500, stall far past any sensible timeout, or come
+back with an illegal move, which exercises the deadline, hedging, circuit
+breaker and fallback paths without touching the real API.
+
+    python benchmarks/openai_stub.py --port 8765 --latency 0.3 --jitter 0.2 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub python app.py
+
+Settings can be changed while the stub runs by POSTing JSON to /stub/config,
+e.g. {"error_rate": 1.0} to take the "upstream" down and {"error_rate": 0} to
+bring it back. GET /stub/stats returns request counters.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chess_board import Board
+from move_generator import legal_moves, move_to_san
+
+FEN_PATTERN = re.compile(r'([1-8pnbrqkPNBRQK/]+ [wb] [KQkq-]+ [a-h1-8-]+ \d+ \d+)')
+BATCH_LINE = re.compile(r'^(\d+): (.+)$', re.M)
+CANDIDATES_PATTERN = re.compile(r'(\d+) best moves')
+
+
+class StubSettings:
+    """Latency and fault injection knobs, adjustable while the server runs"""
+
+    FIELDS = ('latency', 'jitter', 'error_rate', 'stall_rate', 'stall', 'illegal_rate')
+
+    def __init__(self, latency=0.2, jitter=0.0, error_rate=0.0, stall_rate=0.0, stall=60.0,
+                 illegal_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.illegal_rate = illegal_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.stalls = 0
+        self.illegal = 0
+
+    def update(self, values):
+        """Apply the known fields of a settings dict"""
+        for field in self.FIELDS:
+            if field in values:
+                setattr(self, field, float(values[field]))
+
+    def draw(self):
+        """Pick the fate of one request: ('error' | 'stall' | 'illegal' | 'ok', delay in seconds)"""
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            # Exponential jitter gives the long right tail real APIs show
+            delay = self.latency + (self.random.expovariate(1 / self.jitter) if self.jitter else 0.0)
+            if roll < self.error_rate:
+                self.errors += 1
+                return 'error', delay
+            if roll < self.error_rate + self.stall_rate:
+                self.stalls += 1
+                return 'stall', self.stall
+            if self.random.random() < self.illegal_rate:
+                self.illegal += 1
+                return 'illegal', delay
+            return 'ok', delay
+
+    def stats(self):
+        """Return the settings and request counters"""
+        with self.lock:
+            stats = {field: getattr(self, field) for field in self.FIELDS}
+            stats.update(requests=self.requests, errors=self.errors, stalls=self.stalls, illegal=self.illegal)
+            return stats
+
+
+def answer_for(fen, rng, count=1, illegal=False):
+    """Choose count legal moves for a FEN, in SAN and comma-separated; an illegal answer leads with Ke9"""
+    try:
+        board = Board.from_fen(fen)
+    except (ValueError, IndexError):
+        return "e5"
+    moves = legal_moves(board)
+    if not moves:
+        return "e5"
+    picks = [move_to_san(board, move, moves) for move in rng.sample(moves, min(count, len(moves)))]
+    if illegal:
+        # Like a real model's slip: the first candidate is wrong, any others are fine
+        picks = ["Ke9"] + picks[:count - 1]
+    return ", ".join(picks)
+
+
+def completion_text(prompt, fate, rng):
+    """Reply to a single-position or batched prompt, with as many candidates as it asks for"""
+    match = CANDIDATES_PATTERN.search(prompt)
+    count = int(match.group(1)) if match else 1
+    illegal = fate == 'illegal'
+    games = BATCH_LINE.findall(prompt)
+    if games:
+        return "\n".join(f"{number}: {answer_for(_fen(line), rng, count, illegal)}" for number, line in games)
+    return answer_for(_fen(prompt), rng, count, illegal)
+
+
+def _fen(text):
+    match = FEN_PATTERN.search(text)
+    return match.group(1) if match else ""
+
+
+def make_handler(settings):
+    """Build a request handler class bound to the given settings"""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path.rstrip('/') == '/stub/stats':
+                self._send(200, settings.stats())
+            else:
+                self._send(404, {'error': {'message': 'not found'}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.path.rstrip('/') == '/stub/config':
+                settings.update(body)
+                self._send(200, settings.stats())
+                return
+            if not self.path.endswith('/chat/completions'):
+                self._send(404, {'error': {'message': 'not found'}})
+                return
+
+            fate, delay = settings.draw()
+            time.sleep(delay)
+            if fate == 'error':
+                self._send(500, {'error': {'message': 'injected upstream error', 'type': 'server_error'}})
+                return
+            prompt = body['messages'][-1]['content']
+            with settings.lock:
+                content = completion_text(prompt, fate, settings.random)
+            self._send(200, {
+                'id': f"chatcmpl-stub-{settings.requests}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                             'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 2,
+                          'total_tokens': len(prompt) // 4 + 2}
+            })
+
+        def _send(self, status, payload):
+            data = json.dumps(payload).encode()
+            try:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up, e.g. a hedged or timed-out request
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server that stays quiet when a client drops its connection"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients close keep-alive connections mid-read when they shut down or abandon a request
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+def start_stub(host='127.0.0.1', port=0, **settings):
+    """Start the stub on a background thread; returns (server, settings, base_url)"""
+    settings = StubSettings(**settings)
+    server = StubServer((host, port), make_handler(settings))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, settings, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub with injected latency and faults")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2, help="base seconds before answering")
+    parser.add_argument('--jitter', type=float, default=0.0, help="mean of extra exponential delay, seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument('--stall-rate', type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument('--stall', type=float, default=60.0, help="seconds a stalled request hangs")
+    parser.add_argument('--illegal-rate', type=float, default=0.0, help="share of answers that are illegal moves")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server, _, base_url = start_stub(
+        args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        stall_rate=args.stall_rate, stall=args.stall, illegal_rate=args.illegal_rate, seed=args.seed
+    )
+    print(f"OpenAI stub listening on {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Perft benchmark for the server-side move generator
+
+Checks node counts on the standard perft positions and reports nodes per
+second, so generator speed can be compared between releases.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chess_board import Board, START_FEN
+from move_generator import divide, perft
+
+# (name, FEN, expected node counts indexed by depth - 1)
+POSITIONS = [
+    ('startpos', START_FEN, [20, 400, 8902, 197281]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379]),
+]
+
+
+def run(max_depth, only=None, show_divide=False):
+    """Run perft on every position and print a results table"""
+    total_nodes = 0
+    total_time = 0.0
+    failures = 0
+
+    print(f"{'position':<12}{'depth':>6}{'nodes':>12}{'expected':>12}{'seconds':>10}{'nps':>12}")
+    for name, fen, expected in POSITIONS:
+        if only and name not in only:
+            continue
+        depth = min(max_depth, len(expected))
+        board = Board.from_fen(fen)
+        start = time.perf_counter()
+        nodes = perft(board, depth)
+        elapsed = time.perf_counter() - start
+        total_nodes += nodes
+        total_time += elapsed
+        status = '' if nodes == expected[depth - 1] else '  MISMATCH'
+        failures += bool(status)
+        nps = nodes / elapsed if elapsed else 0
+        print(f"{name:<12}{depth:>6}{nodes:>12}{expected[depth - 1]:>12}{elapsed:>10.2f}{nps:>12.0f}{status}")
+        if show_divide and status:
+            for move, count in sorted(divide(board, depth).items()):
+                print(f"    {move}: {count}")
+
+    if total_time:
+        print(f"\nTotal: {total_nodes} nodes in {total_time:.2f}s ({total_nodes / total_time:.0f} nodes/s)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depth', type=int, default=3, help='maximum perft depth per position')
+    parser.add_argument('--position', action='append', help='only run the named position(s)')
+    parser.add_argument('--divide', action='store_true', help='print per-move counts on mismatch')
+    args = parser.parse_args()
+    sys.exit(1 if run(args.depth, args.position, args.divide) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Self-play tournament between AI backends
+
+Plays every pairing of the given players as many times as asked on a process
+pool, each game from an opening taken from the opening book lines with the
+colours swapped on every repeat. Games end on mate, stalemate, the 50-move
+rule, threefold repetition or bare kings; games still going after --max-plies
+are adjudicated on the engine's static evaluation. Reports Elo estimates,
+average and p95 move latency, fallback frequency and games per second:
+
+    python benchmarks/tournament.py engine:0.02 engine:0.1 random --games 200
+    python benchmarks/tournament.py llm engine --games 40 --latency 0.2 --illegal-rate 0.1
+
+Players are llm[:deadline], engine[:seconds per move], random and book. The llm
+player talks to the OpenAI stub from openai_stub.py, started in-process,
+unless --upstream names a real OpenAI-compatible endpoint.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from itertools import combinations
+from multiprocessing import Pool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ai_backends import RandomBackend, backends
+from chess_board import BISHOP, KING, KNIGHT, WHITE, Board
+from chess_engine import ChessEngine, evaluate
+from move_generator import in_check, legal_moves, move_to_san, parse_san
+from opening_book import DEFAULT_LINES
+from openai_stub import start_stub
+from load_test import percentile
+
+# Players are built once per worker process and reused for all its games
+_players = {}
+
+
+def make_player(spec):
+    """Build a player from its spec: llm[:deadline], engine[:seconds], random or any other registered backend"""
+    kind, _, value = spec.partition(':')
+    if kind == 'engine':
+        return ChessEngine(float(value) if value else None)
+    if kind == 'random':
+        return RandomBackend(os.getpid())
+    if kind == 'llm':
+        # Imported here so engine-only tournaments need no API key
+        from simple_chess_ai import SimpleChessAI
+        player = SimpleChessAI()
+        if value:
+            player.guard.deadline = float(value)
+        return player
+    if kind in backends:
+        return backends.get(kind)
+    raise ValueError(f"Unknown player {spec!r}")
+
+
+def get_player(spec):
+    player = _players.get(spec)
+    if player is None:
+        player = _players[spec] = make_player(spec)
+    return player
+
+
+def insufficient_material(board):
+    """Only kings left, or a king and one minor piece against a bare king"""
+    pieces = [piece & 7 for piece in board.squares if piece]
+    return len(pieces) <= 3 and all(kind in (KING, KNIGHT, BISHOP) for kind in pieces)
+
+
+def play_game(task):
+    """Play one game and return its result, termination and per-colour move statistics"""
+    number, white, black, opening, max_plies, adjudicate = task
+    board = Board.starting_position()
+    history = []
+    for san in opening:
+        board.make_move(parse_san(board, san))
+        history.append(san)
+    seen = Counter([board.hash])
+    conversations = {'white': [], 'black': []}
+    stats = {color: {'moves': 0, 'seconds': [], 'fallbacks': Counter()} for color in ('white', 'black')}
+    started = time.perf_counter()
+
+    result = termination = illegal = None
+    while result is None:
+        color = 'white' if board.side == WHITE else 'black'
+        moves = legal_moves(board)
+        if not moves:
+            result = ('0-1' if color == 'white' else '1-0') if in_check(board) else '1/2-1/2'
+            termination = 'checkmate' if in_check(board) else 'stalemate'
+            break
+        if board.halfmove_clock >= 100:
+            result, termination = '1/2-1/2', '50-move rule'
+            break
+        if seen[board.hash] >= 3:
+            result, termination = '1/2-1/2', 'repetition'
+            break
+        if insufficient_material(board):
+            result, termination = '1/2-1/2', 'insufficient material'
+            break
+        if len(history) >= max_plies:
+            score = evaluate(board) if board.side == WHITE else -evaluate(board)
+            if adjudicate and abs(score) >= adjudicate:
+                result = '1-0' if score > 0 else '0-1'
+            else:
+                result = '1/2-1/2'
+            termination = 'adjudicated'
+            break
+
+        player = get_player(white if color == 'white' else black)
+        reasons = []
+        tick = time.perf_counter()
+        try:
+            san = player.get_move(board.copy(), history[-1] if history else None, list(history),
+                                            conversations[color], on_fallback=reasons.append)
+        except Exception:
+            san = None
+        stats[color]['seconds'].append(time.perf_counter() - tick)
+        stats[color]['moves'] += 1
+        stats[color]['fallbacks'].update(reasons)
+
+        move = parse_san(board, san, moves) if san else None
+        if move is None:
+            # A backend that cannot produce a legal move loses the game
+            result = '0-1' if color == 'white' else '1-0'
+            termination, illegal = 'illegal move', san
+            break
+        history.append(move_to_san(board, move, moves))
+        board.make_move(move)
+        seen[board.hash] += 1
+
+    return {
+        'number': number,
+        'white': white,
+        'black': black,
+        'result': result,
+        'termination': termination,
+        'illegal': illegal,
+        'plies': len(history),
+        'moves': history,
+        'seconds': time.perf_counter() - started,
+        'stats': stats
+    }
+
+
+def schedule(players, games, opening_plies, max_plies, adjudicate, seed):
+    """Every pairing plays `games` games, alternating colours on each opening"""
+    rng = random.Random(seed)
+    tasks = []
+    for first, second in combinations(players, 2):
+        for index in range(games):
+            if index % 2 == 0:
+                opening = rng.choice(DEFAULT_LINES).split()[:opening_plies]
+            white, black = (first, second) if index % 2 == 0 else (second, first)
+            tasks.append((len(tasks) + 1, white, black, opening, max_plies, adjudicate))
+    return tasks
+
+
+def score_for(game, player):
+    """Points the player scored in a game: 1, 0.5 or 0"""
+    if game['result'] == '1/2-1/2':
+        return 0.5
+    winner = game['white'] if game['result'] == '1-0' else game['black']
+    return 1.0 if winner == player else 0.0
+
+
+def elo_difference(score, games):
+    """Elo difference implied by a score over some games, with a 95% error margin"""
+    if not games:
+        return 0.0, 0.0
+    share = min(max(score / games, 0.5 / games), 1 - 0.5 / games)
+    difference = -400 * math.log10(1 / share - 1)
+    # Normal approximation of the score's standard error, mapped through the logistic slope
+    error = math.sqrt(share * (1 - share) / games)
+    slope = 400 / (math.log(10) * share * (1 - share))
+    return difference, 1.96 * error * slope
+
+
+def fit_ratings(players, games, iterations=200):
+    """Bradley-Terry ratings over all games (draws count half), centred on zero Elo"""
+    wins = defaultdict(float)
+    played = defaultdict(int)
+    for game in games:
+        for player in (game['white'], game['black']):
+            wins[player] += score_for(game, player)
+        played[frozenset((game['white'], game['black']))] += 1
+    # One virtual draw per pairing keeps a player who never scored finite
+    for first, second in combinations(players, 2):
+        played[frozenset((first, second))] += 1
+        wins[first] += 0.5
+        wins[second] += 0.5
+
+    strength = {player: 1.0 for player in players}
+    for _ in range(iterations):
+        updated = {}
+        for player in players:
+            denominator = sum(played[frozenset((player, other))] / (strength[player] + strength[other])
+                              for other in players if other != player)
+            updated[player] = wins[player] / denominator if denominator else strength[player]
+        mean = sum(math.log10(value) for value in updated.values()) / len(updated)
+        strength = {player: value / 10 ** mean for player, value in updated.items()}
+    return {player: 400 * math.log10(value) for player, value in strength.items()}
+
+
+def run(args):
+    """Play the tournament and return the report"""
+    stub = None
+    if any(spec.partition(':')[0] == 'llm' for spec in args.players):
+        if args.upstream:
+            os.environ['OPENAI_BASE_URL'] = args.upstream
+        else:
+            stub, stub_settings, upstream_url = start_stub(
+                latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                illegal_rate=args.illegal_rate, seed=args.seed)
+            os.environ['OPENAI_BASE_URL'] = upstream_url
+            os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+    tasks = schedule(args.players, args.games, args.opening_plies, args.max_plies, args.adjudicate, args.seed)
+    games = []
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        for game in pool.imap_unordered(play_game, tasks, chunksize=args.chunk):
+            games.append(game)
+            if args.progress and len(games) % args.progress == 0:
+                print(f"{len(games)}/{len(tasks)} games, {len(games) / (time.perf_counter() - start):.1f} games/s")
+    elapsed = time.perf_counter() - start
+    games.sort(key=lambda game: game['number'])
+
+    players = {}
+    for player in args.players:
+        seconds = []
+        moves = 0
+        fallbacks = Counter()
+        points = 0.0
+        played = 0
+        for game in games:
+            for color in ('white', 'black'):
+                if game[color] == player:
+                    stats = game['stats'][color]
+                    seconds.extend(stats['seconds'])
+                    moves += stats['moves']
+                    fallbacks.update(stats['fallbacks'])
+                    points += score_for(game, player)
+                    played += 1
+        ordered = sorted(seconds)
+        players[player] = {
+            'games': played,
+            'points': points,
+            'moves': moves,
+            'average_move_seconds': sum(ordered) / len(ordered) if ordered else 0.0,
+            'p95_move_seconds': percentile(ordered, 95),
+            'fallbacks': dict(fallbacks),
+            'fallback_rate': sum(fallbacks.values()) / moves if moves else 0.0
+        }
+    ratings = fit_ratings(args.players, games)
+    for player, rating in ratings.items():
+        players[player]['elo'] = rating
+
+    pairings = []
+    for first, second in combinations(args.players, 2):
+        between = [game for game in games if {game['white'], game['black']} == {first, second}]
+        points = sum(score_for(game, first) for game in between)
+        difference, margin = elo_difference(points, len(between))
+        pairings.append({
+            'players': [first, second],
+            'games': len(between),
+            'score': points,
+            'wins': sum(score_for(game, first) == 1.0 for game in between),
+            'draws': sum(game['result'] == '1/2-1/2' for game in between),
+            'losses': sum(score_for(game, first) == 0.0 for game in between),
+            'elo_difference': difference,
+            'elo_margin': margin
+        })
+
+    report = {
+        'games': len(games),
+        'workers': args.workers or os.cpu_count(),
+        'seconds': elapsed,
+        'games_per_second': len(games) / elapsed if elapsed else 0.0,
+        'average_plies': sum(game['plies'] for game in games) / len(games) if games else 0.0,
+        'terminations': dict(Counter(game['termination'] for game in games)),
+        'players': players,
+        'pairings': pairings,
+        'stub': stub_settings.stats() if stub else None
+    }
+    if stub:
+        stub.shutdown()
+    return report, games
+
+
+def print_report(report):
+    """Print the standings and pairings as tables"""
+    print(f"{report['games']} games on {report['workers']} workers in {report['seconds']:.1f}s "
+          f"({report['games_per_second']:.2f} games/s, {report['average_plies']:.0f} plies on average)\n")
+    print(f"{'player':<16}{'elo':>7}{'games':>7}{'points':>8}{'avg ms':>9}{'p95 ms':>9}{'fallback':>10}")
+    standings = sorted(report['players'].items(), key=lambda item: -item[1]['elo'])
+    for player, stats in standings:
+        print(f"{player:<16}{stats['elo']:>+7.0f}{stats['games']:>7}{stats['points']:>8.1f}"
+              f"{stats['average_move_seconds'] * 1000:>9.1f}{stats['p95_move_seconds'] * 1000:>9.1f}"
+              f"{stats['fallback_rate']:>10.1%}")
+    print()
+    for pairing in report['pairings']:
+        first, second = pairing['players']
+        print(f"{first} vs {second}: +{pairing['wins']} ={pairing['draws']} -{pairing['losses']}, "
+              f"{pairing['elo_difference']:+.0f} ± {pairing['elo_margin']:.0f} Elo")
+    terminations = ', '.join(f"{name} {count}" for name, count in sorted(report['terminations'].items()))
+    print(f"\nTerminations: {terminations}")
+    if report['stub']:
+        stub = report['stub']
+        print(f"Stub: {stub['requests']} requests, {stub['errors']} errors, {stub['illegal']} illegal answers")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('players', nargs='+', help='players: llm[:deadline], engine[:seconds] or random')
+    parser.add_argument('--games', type=int, default=20, help='games per pairing')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk', type=int, default=1, help='games handed to a worker at a time')
+    parser.add_argument('--opening-plies', type=int, default=6, help='plies of a book line each game starts from')
+    parser.add_argument('--max-plies', type=int, default=200, help='plies before a game is adjudicated')
+    parser.add_argument('--adjudicate', type=int, default=300,
+                        help='centipawns the leader needs at --max-plies to be scored the winner (0: draw)')
+    parser.add_argument('--seed', type=int, help='seed for the openings and the stub')
+    parser.add_argument('--progress', type=int, default=0, help='print progress every N games')
+
+    stub = parser.add_argument_group('llm upstream')
+    stub.add_argument('--upstream', help='OpenAI-compatible base URL to use instead of the stub')
+    stub.add_argument('--latency', type=float, default=0.2, help='stub base seconds per completion')
+    stub.add_argument('--jitter', type=float, default=0.1, help='stub mean extra exponential delay, seconds')
+    stub.add_argument('--error-rate', type=float, default=0.0, help='share of stub completions failing')
+    stub.add_argument('--illegal-rate', type=float, default=0.0, help='share of stub completions with illegal moves')
+    parser.add_argument('--json', help='also write the report to this JSON file')
+    parser.add_argument('--pgn', help='write every game to this PGN file')
+    args = parser.parse_args()
+    if len(set(args.players)) < 2:
+        parser.error('at least two different players are needed')
+
+    report, games = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(report, output, indent=2)
+    if args.pgn:
+        from pgn import write_game
+        with open(args.pgn, 'w') as output:
+            for game in games:
+                output.write(write_game({'Event': 'Backend tournament', 'Round': game['number'],
+                                         'White': game['white'], 'Black': game['black'],
+                                         'Termination': game['termination']}, game['moves'], game['result']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""
+Compact 0x88 board representation shared by the server and the AI backends
+
+Squares are indexed as ``row * 16 + col`` where row 0 is rank 8 (Black's back
+rank) so indices line up with the ``{'row', 'col'}`` coordinates used by the
+frontend. Any index with ``sq & 0x88`` set is off the board.
+"""
+
+import random
+from collections import namedtuple
+
+# Piece codes: low three bits are the piece type, bit 3 is the colour
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE = 0
+BLACK = 8
+
+# Castling right bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+# Move flags
+NORMAL = 0
+DOUBLE_PUSH = 1
+EN_PASSANT = 2
+CASTLE = 4
+
+FILES = 'abcdefgh'
+RANKS = '87654321'
+
+Move = namedtuple('Move', ['from_sq', 'to_sq', 'promotion', 'flags'], defaults=[EMPTY, NORMAL])
+
+GLYPHS = [None] * 16
+for _code, _glyph in zip(range(1, 7), '♙♘♗♖♕♔'):
+    GLYPHS[WHITE | _code] = _glyph
+for _code, _glyph in zip(range(1, 7), '♟♞♝♜♛♚'):
+    GLYPHS[BLACK | _code] = _glyph
+
+PIECE_LETTERS = ' PNBRQK'
+
+# Castling rights that survive a move touching each square
+CASTLING_MASK = [0xF] * 128
+CASTLING_MASK[0x00] = 0xF & ~BLACK_QUEENSIDE
+CASTLING_MASK[0x04] = 0xF & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[0x07] = 0xF & ~BLACK_KINGSIDE
+CASTLING_MASK[0x70] = 0xF & ~WHITE_QUEENSIDE
+CASTLING_MASK[0x74] = 0xF & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[0x77] = 0xF & ~WHITE_KINGSIDE
+
+# Rook relocation for each castling king destination
+CASTLING_ROOKS = {
+    0x76: (0x77, 0x75),
+    0x72: (0x70, 0x73),
+    0x06: (0x07, 0x05),
+    0x02: (0x00, 0x03),
+}
+
+BACK_RANK = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+FEN_PIECES = {}
+for _code, _letter in enumerate(PIECE_LETTERS):
+    if _code:
+        FEN_PIECES[_letter] = WHITE | _code
+        FEN_PIECES[_letter.lower()] = BLACK | _code
+
+FEN_LETTERS = {code: letter for letter, code in FEN_PIECES.items()}
+
+FEN_CASTLING = ((WHITE_KINGSIDE, 'K'), (WHITE_QUEENSIDE, 'Q'), (BLACK_KINGSIDE, 'k'), (BLACK_QUEENSIDE, 'q'))
+
+# Zobrist keys, generated from a fixed seed so hashes are stable across processes and restarts
+_zobrist_random = random.Random(0x5EED_C4E55)
+ZOBRIST_PIECES = [[_zobrist_random.getrandbits(64) for _ in range(128)] for _ in range(16)]
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP_FILE = [_zobrist_random.getrandbits(64) for _ in range(8)]
+ZOBRIST_SIDE = _zobrist_random.getrandbits(64)
+del _zobrist_random
+
+
+def square_index(row, col):
+    """Convert frontend row/col coordinates to a 0x88 square index"""
+    return (row << 4) | col
+
+
+def square_coords(sq):
+    """Convert a 0x88 square index to a frontend coordinate dict"""
+    return {'row': sq >> 4, 'col': sq & 7}
+
+
+def square_name(sq):
+    """Return the algebraic name (e.g. 'e4') of a square"""
+    return FILES[sq & 7] + RANKS[sq >> 4]
+
+
+def parse_square(name):
+    """Return the 0x88 index of an algebraic square name, or None"""
+    if len(name) != 2 or name[0] not in FILES or name[1] not in RANKS:
+        return None
+    return square_index(RANKS.index(name[1]), FILES.index(name[0]))
+
+
+def piece_glyph(piece):
+    """Get the Unicode glyph the frontend uses for a piece code"""
+    return GLYPHS[piece]
+
+
+def move_squares(move, color):
+    """List every square a move changes, including castling rooks and en passant victims"""
+    squares = [move.from_sq, move.to_sq]
+    if move.flags & CASTLE:
+        squares.extend(CASTLING_ROOKS[move.to_sq])
+    elif move.flags & EN_PASSANT:
+        squares.append(move.to_sq + (16 if color == WHITE else -16))
+    return squares
+
+
+class Board:
+    """Mailbox board with per-piece occupancy sets and make/unmake"""
+
+    def __init__(self):
+        self.squares = bytearray(128)
+        self.piece_squares = [set() for _ in range(16)]
+        self.side = WHITE
+        self.castling = 0
+        self.ep_square = -1
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.hash = ZOBRIST_CASTLING[0]
+
+    @classmethod
+    def starting_position(cls):
+        """Return a board set up for a new game"""
+        board = cls()
+        for col, kind in enumerate(BACK_RANK):
+            board.put_piece(square_index(0, col), BLACK | kind)
+            board.put_piece(square_index(1, col), BLACK | PAWN)
+            board.put_piece(square_index(6, col), WHITE | PAWN)
+            board.put_piece(square_index(7, col), WHITE | kind)
+        board.castling = WHITE_KINGSIDE | WHITE_QUEENSIDE | BLACK_KINGSIDE | BLACK_QUEENSIDE
+        board.hash = board.compute_hash()
+        return board
+
+    @classmethod
+    def from_fen(cls, fen):
+        """Build a board from a FEN string"""
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen}")
+        board = cls()
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f"Invalid FEN: {fen}")
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if char.isdigit():
+                    col += int(char)
+                elif char in FEN_PIECES and col < 8:
+                    board.put_piece(square_index(row, col), FEN_PIECES[char])
+                    col += 1
+                else:
+                    raise ValueError(f"Invalid FEN: {fen}")
+        board.side = WHITE if fields[1] == 'w' else BLACK
+        for bit, letter in FEN_CASTLING:
+            if letter in fields[2]:
+                board.castling |= bit
+        board.ep_square = parse_square(fields[3]) if fields[3] != '-' else -1
+        if board.ep_square is None:
+            raise ValueError(f"Invalid FEN: {fen}")
+        if len(fields) >= 6:
+            board.halfmove_clock = int(fields[4])
+            board.fullmove_number = int(fields[5])
+        board.hash = board.compute_hash()
+        return board
+
+    def to_fen(self):
+        """Serialize the position as a FEN string"""
+        rows = []
+        for row in range(8):
+            text = ''
+            empty = 0
+            for col in range(8):
+                piece = self.squares[(row << 4) | col]
+                if piece:
+                    if empty:
+                        text += str(empty)
+                        empty = 0
+                    text += FEN_LETTERS[piece]
+                else:
+                    empty += 1
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = ''.join(letter for bit, letter in FEN_CASTLING if self.castling & bit) or '-'
+        ep = square_name(self.ep_square) if self.ep_square >= 0 else '-'
+        side = 'w' if self.side == WHITE else 'b'
+        return f"{'/'.join(rows)} {side} {castling} {ep} {self.halfmove_clock} {self.fullmove_number}"
+
+    def compute_hash(self):
+        """Compute the Zobrist hash of the position from scratch"""
+        key = ZOBRIST_CASTLING[self.castling]
+        for piece, squares in enumerate(self.piece_squares):
+            table = ZOBRIST_PIECES[piece]
+            for sq in squares:
+                key ^= table[sq]
+        if self.ep_square >= 0:
+            key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+        if self.side == BLACK:
+            key ^= ZOBRIST_SIDE
+        return key
+
+    def copy(self):
+        """Return an independent copy of this board"""
+        board = Board.__new__(Board)
+        board.squares = bytearray(self.squares)
+        board.piece_squares = [set(squares) for squares in self.piece_squares]
+        board.side = self.side
+        board.castling = self.castling
+        board.ep_square = self.ep_square
+        board.halfmove_clock = self.halfmove_clock
+        board.fullmove_number = self.fullmove_number
+        board.hash = self.hash
+        return board
+
+    def to_glyphs(self):
+        """Render the board as the 8x8 glyph grid the JSON API returns"""
+        squares = self.squares
+        return [[GLYPHS[squares[(row << 4) | col]] for col in range(8)] for row in range(8)]
+
+    def king_square(self, color):
+        """Return the king's square for a colour, or -1 if it has been captured"""
+        for sq in self.piece_squares[color | KING]:
+            return sq
+        return -1
+
+    def put_piece(self, sq, piece):
+        """Place a piece on an empty square"""
+        self.squares[sq] = piece
+        self.piece_squares[piece].add(sq)
+        self.hash ^= ZOBRIST_PIECES[piece][sq]
+
+    def remove_piece(self, sq):
+        """Clear a square and return the piece that was on it"""
+        piece = self.squares[sq]
+        if piece:
+            self.squares[sq] = EMPTY
+            self.piece_squares[piece].discard(sq)
+            self.hash ^= ZOBRIST_PIECES[piece][sq]
+        return piece
+
+    def make_move(self, move):
+        """Apply a move in place and return the state needed to unmake it"""
+        from_sq, to_sq, promotion, flags = move
+        squares = self.squares
+        piece_squares = self.piece_squares
+        piece = squares[from_sq]
+        color = piece & 8
+        key = self.hash
+
+        captured = squares[to_sq]
+        if captured:
+            piece_squares[captured].discard(to_sq)
+            key ^= ZOBRIST_PIECES[captured][to_sq]
+        elif flags & EN_PASSANT:
+            cap_sq = to_sq + (16 if color == WHITE else -16)
+            captured = squares[cap_sq]
+            squares[cap_sq] = EMPTY
+            piece_squares[captured].discard(cap_sq)
+            key ^= ZOBRIST_PIECES[captured][cap_sq]
+        undo = (captured, self.castling, self.ep_square, self.halfmove_clock, self.hash)
+
+        squares[from_sq] = EMPTY
+        piece_squares[piece].discard(from_sq)
+        placed = (color | promotion) if promotion else piece
+        squares[to_sq] = placed
+        piece_squares[placed].add(to_sq)
+        key ^= ZOBRIST_PIECES[piece][from_sq] ^ ZOBRIST_PIECES[placed][to_sq]
+
+        if flags & CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            rook = squares[rook_from]
+            squares[rook_from] = EMPTY
+            squares[rook_to] = rook
+            piece_squares[rook].discard(rook_from)
+            piece_squares[rook].add(rook_to)
+            key ^= ZOBRIST_PIECES[rook][rook_from] ^ ZOBRIST_PIECES[rook][rook_to]
+
+        castling = self.castling & CASTLING_MASK[from_sq] & CASTLING_MASK[to_sq]
+        key ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+        self.castling = castling
+        if self.ep_square >= 0:
+            key ^= ZOBRIST_EP_FILE[self.ep_square & 7]
+        if flags & DOUBLE_PUSH:
+            self.ep_square = (from_sq + to_sq) >> 1
+            key ^= ZOBRIST_EP_FILE[to_sq & 7]
+        else:
+            self.ep_square = -1
+        self.halfmove_clock = 0 if captured or piece & 7 == PAWN else self.halfmove_clock + 1
+        if color == BLACK:
+            self.fullmove_number += 1
+        self.side = color ^ BLACK
+        self.hash = key ^ ZOBRIST_SIDE
+        return undo
+
+    def unmake_move(self, move, undo):
+        """Revert a move previously applied with make_move"""
+        from_sq, to_sq, promotion, flags = move
+        captured, self.castling, self.ep_square, self.halfmove_clock, self.hash = undo
+        squares = self.squares
+        piece_squares = self.piece_squares
+
+        placed = squares[to_sq]
+        color = placed & 8
+        piece = (color | PAWN) if promotion else placed
+        piece_squares[placed].discard(to_sq)
+        squares[to_sq] = EMPTY
+        squares[from_sq] = piece
+        piece_squares[piece].add(from_sq)
+
+        if flags & EN_PASSANT:
+            cap_sq = to_sq + (16 if color == WHITE else -16)
+            squares[cap_sq] = captured
+            piece_squares[captured].add(cap_sq)
+        elif captured:
+            squares[to_sq] = captured
+            piece_squares[captured].add(to_sq)
+
+        if flags & CASTLE:
+            rook_from, rook_to = CASTLING_ROOKS[to_sq]
+            rook = squares[rook_to]
+            squares[rook_to] = EMPTY
+            squares[rook_from] = rook
+            piece_squares[rook].discard(rook_to)
+            piece_squares[rook].add(rook_from)
+
+        if color == BLACK:
+            self.fullmove_number -= 1
+        self.side = color
@@ -0,0 +1,295 @@
+"""
+Local alpha-beta search engine used as a zero-network AI backend
+"""
+
+import asyncio
+import os
+import time
+
+from chess_board import BLACK, WHITE, PAWN, KING, EN_PASSANT
+from move_generator import in_check, is_square_attacked, legal_moves, move_to_san, pseudo_legal_moves
+
+MATE_SCORE = 100000
+INFINITY = 1000000
+
+PIECE_VALUES = [0, 100, 320, 330, 500, 900, 20000]
+
+# Piece-square tables from White's point of view, listed rank 8 to rank 1
+_PAWN_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+]
+_KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+_BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+_ROOK_TABLE = [
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+]
+_QUEEN_TABLE = [
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+]
+_KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+]
+
+
+def _build_square_scores():
+    """Combine material and piece-square tables into one 0x88 lookup per piece code"""
+    tables = [None, _PAWN_TABLE, _KNIGHT_TABLE, _BISHOP_TABLE, _ROOK_TABLE, _QUEEN_TABLE, _KING_TABLE]
+    scores = [[0] * 128 for _ in range(16)]
+    for kind in range(PAWN, KING + 1):
+        for index, bonus in enumerate(tables[kind]):
+            sq = ((index >> 3) << 4) | (index & 7)
+            scores[WHITE | kind][sq] = PIECE_VALUES[kind] + bonus
+            # Black uses the same table mirrored top to bottom
+            scores[BLACK | kind][sq ^ 0x70] = PIECE_VALUES[kind] + bonus
+    return scores
+
+
+SQUARE_SCORES = _build_square_scores()
+
+
+def evaluate(board):
+    """Static evaluation in centipawns from the side to move's point of view"""
+    piece_squares = board.piece_squares
+    score = 0
+    for kind in range(PAWN, KING + 1):
+        table = SQUARE_SCORES[WHITE | kind]
+        for sq in piece_squares[WHITE | kind]:
+            score += table[sq]
+        table = SQUARE_SCORES[BLACK | kind]
+        for sq in piece_squares[BLACK | kind]:
+            score -= table[sq]
+    return score if board.side == WHITE else -score
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the move time budget runs out"""
+
+
+class ChessEngine:
+    """Iterative-deepening alpha-beta searcher with quiescence and move ordering"""
+
+    def __init__(self, time_limit=None, max_depth=32):
+        if time_limit is None:
+            time_limit = float(os.getenv("CHESS_ENGINE_TIME_LIMIT", "0.08"))
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+
+    def get_move(self, board, last_move=None, move_history=None, conversation_history=None, on_fallback=None):
+        """Return the engine's move in SAN, with the same signature as SimpleChessAI.get_move"""
+        move, _, _ = self.search(board)
+        if move is None:
+            return None
+        return move_to_san(board, move)
+
+    async def get_move_async(self, board, last_move=None, move_history=None, conversation_history=None,
+                             on_fallback=None):
+        """Run the search in the default executor so it does not block the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_move, board.copy())
+
+    def search(self, board, time_limit=None):
+        """Search a copy of the board and return (best move, score, completed depth)"""
+        board = board.copy()
+        moves = legal_moves(board)
+        if not moves:
+            return None, (-MATE_SCORE if in_check(board) else 0), 0
+        if len(moves) == 1:
+            return moves[0], 0, 0
+        budget = self.time_limit if time_limit is None else time_limit
+        # Rank the root moves with one vectorized evaluation of every child, so
+        # the first iterations already search the most promising moves first
+        from batch_eval import rank_moves  # batch_eval builds on this module's tables
+        return _Search(self.max_depth, budget).run(board, rank_moves(board, moves))
+
+
+class _Search:
+    """State for a single search, so one engine can serve concurrent games"""
+
+    def __init__(self, max_depth, time_limit):
+        self.max_depth = max_depth
+        self.start = time.perf_counter()
+        self.deadline = self.start + time_limit
+        self.nodes = 0
+        self.killers = [[None, None] for _ in range(max_depth + 1)]
+        self.history = [[0] * 128 for _ in range(16)]
+
+    def run(self, board, moves):
+        """Deepen one ply at a time until the time budget runs out"""
+        best_move, best_score, completed = moves[0], 0, 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score, move = self._root(board, moves, depth)
+            except SearchTimeout:
+                break
+            best_move, best_score, completed = move, score, depth
+            # Search the previous best move first on the next iteration
+            moves.remove(move)
+            moves.insert(0, move)
+            if abs(score) >= MATE_SCORE - self.max_depth:
+                break
+            # Another iteration would most likely not finish in the remaining time
+            elapsed = time.perf_counter() - self.start
+            if self.start + elapsed * 3 > self.deadline:
+                break
+        return best_move, best_score, completed
+
+    def _root(self, board, moves, depth):
+        """Search every root move and return (best score, best move)"""
+        alpha, beta = -INFINITY, INFINITY
+        best_move = moves[0]
+        for move in moves:
+            undo = board.make_move(move)
+            score = -self._alpha_beta(board, depth - 1, -beta, -alpha, 1)
+            board.unmake_move(move, undo)
+            if score > alpha:
+                alpha, best_move = score, move
+        return alpha, best_move
+
+    def _check_time(self):
+        """Abort the search once the deadline has passed"""
+        self.nodes += 1
+        if not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def _alpha_beta(self, board, depth, alpha, beta, ply):
+        """Fail-hard negamax alpha-beta search"""
+        self._check_time()
+        if depth <= 0:
+            return self._quiescence(board, alpha, beta)
+        if board.halfmove_clock >= 100:
+            return 0
+
+        color = board.side
+        enemy = color ^ BLACK
+        checked = in_check(board)
+        if checked and ply < 2 * self.max_depth:
+            depth += 1
+
+        legal = 0
+        for move in self._ordered(board, pseudo_legal_moves(board), ply):
+            undo = board.make_move(move)
+            king_sq = board.king_square(color)
+            if king_sq >= 0 and is_square_attacked(board, king_sq, enemy):
+                board.unmake_move(move, undo)
+                continue
+            legal += 1
+            score = -self._alpha_beta(board, depth - 1, -beta, -alpha, ply + 1)
+            board.unmake_move(move, undo)
+            if score >= beta:
+                if not undo[0]:
+                    self._store_killer(move, ply)
+                    self.history[board.squares[move.from_sq]][move.to_sq] += depth * depth
+                return beta
+            if score > alpha:
+                alpha = score
+
+        if not legal:
+            return -MATE_SCORE + ply if checked else 0
+        return alpha
+
+    def _quiescence(self, board, alpha, beta):
+        """Resolve captures so the static evaluation is not taken mid-exchange"""
+        self._check_time()
+        stand_pat = evaluate(board)
+        if stand_pat >= beta:
+            return beta
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        color = board.side
+        enemy = color ^ BLACK
+        squares = board.squares
+        captures = [move for move in pseudo_legal_moves(board)
+                    if squares[move.to_sq] or move.promotion or move.flags & EN_PASSANT]
+        for move in self._ordered(board, captures, None):
+            undo = board.make_move(move)
+            king_sq = board.king_square(color)
+            if king_sq >= 0 and is_square_attacked(board, king_sq, enemy):
+                board.unmake_move(move, undo)
+                continue
+            score = -self._quiescence(board, -beta, -alpha)
+            board.unmake_move(move, undo)
+            if score >= beta:
+                return beta
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _ordered(self, board, moves, ply):
+        """Sort moves: MVV-LVA captures, then killer moves, then history score"""
+        squares = board.squares
+        killers = self.killers[ply] if ply is not None and ply < len(self.killers) else (None, None)
+        history = self.history
+
+        def score(move):
+            piece = squares[move.from_sq]
+            victim = squares[move.to_sq]
+            if victim or move.flags & EN_PASSANT:
+                return 1000000 + PIECE_VALUES[victim & 7 or PAWN] * 10 - PIECE_VALUES[piece & 7] // 100
+            if move.promotion:
+                return 950000 + PIECE_VALUES[move.promotion]
+            if move == killers[0]:
+                return 900000
+            if move == killers[1]:
+                return 800000
+            return history[piece][move.to_sq]
+
+        return sorted(moves, key=score, reverse=True)
+
+    def _store_killer(self, move, ply):
+        """Remember a quiet move that caused a beta cutoff at this ply"""
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1] = killers[0]
+                killers[0] = move
+
+
+# Global engine instance
+chess_engine = ChessEngine()
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Retrograde-analysis endgame tables for positions with few pieces
+
+A table covers one material signature, e.g. 'KQK' (white king and queen
+against the black king) or 'KRKP'. It holds one byte per position, indexed
+directly by side to move and the square of each piece in signature order:
+
+    0          draw
+    1..254     distance to mate in plies, plus one; an even distance means the
+               side to move gets mated, an odd one means it mates
+    255        unreachable (overlapping pieces, side not to move in check, ...)
+
+Positions with the weaker side holding the extra material are probed through
+the colour-flipped table. Castling rights are not modelled, so positions that
+still have them are not probed. Generate tables offline (each signature's
+sub-tables, reached by captures and promotions, are built first):
+
+    python endgame_tables.py --output tablebases KQK KRK KPK
+
+Three-piece tables take well under a minute each; four-piece tables work the
+same way but are 64 times larger and take correspondingly longer.
+"""
+
+import argparse
+import mmap
+import os
+import time
+
+from chess_board import BLACK, WHITE, PIECE_LETTERS, EN_PASSANT
+from move_generator import legal_moves, move_to_san
+
+DRAW = -1
+UNREACHABLE = 255
+
+PIECE_ORDER = 'KQRBNP'
+PIECE_VALUES = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+PROMOTIONS = 'QRBN'
+
+# Material that can never mate, so needs no table
+INSUFFICIENT = {'KK', 'KBK', 'KNK'}
+
+
+def _steps(deltas):
+    """Per-square target sets for a jumping piece"""
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        table.append(frozenset((row + dr) * 8 + col + dc for dr, dc in deltas
+                               if 0 <= row + dr < 8 and 0 <= col + dc < 8))
+    return table
+
+
+def _rays(directions):
+    """Per-square rays, nearest square first, for a sliding piece"""
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        rays = []
+        for dr, dc in directions:
+            ray = []
+            r, c = row + dr, col + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                ray.append(r * 8 + c)
+                r, c = r + dr, c + dc
+            if ray:
+                rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return table
+
+
+ORTHOGONAL = ((-1, 0), (1, 0), (0, -1), (0, 1))
+DIAGONAL = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_JUMPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+STEPS = {'K': _steps(ORTHOGONAL + DIAGONAL), 'N': _steps(KNIGHT_JUMPS)}
+RAYS = {'R': _rays(ORTHOGONAL), 'B': _rays(DIAGONAL), 'Q': _rays(ORTHOGONAL + DIAGONAL)}
+
+# Squares (row * 8 + col, row 0 = rank 8) a pawn of each colour attacks from a square
+PAWN_ATTACKS = {WHITE: _steps(((-1, -1), (-1, 1))), BLACK: _steps(((1, -1), (1, 1)))}
+PAWN_STEP = {WHITE: -8, BLACK: 8}
+PAWN_START_ROW = {WHITE: 6, BLACK: 1}
+PAWN_PROMOTION_ROW = {WHITE: 0, BLACK: 7}
+
+
+def split_signature(signature):
+    """Split a signature like 'KQKR' into its white and black halves"""
+    second_king = signature.index('K', 1)
+    return signature[:second_king], signature[second_king:]
+
+
+def signature_pieces(signature):
+    """List the (colour, kind letter) of each piece in table order"""
+    white, black = split_signature(signature)
+    return [(WHITE, kind) for kind in white] + [(BLACK, kind) for kind in black]
+
+
+def _side_signature(kinds):
+    """Order one side's piece letters king first, then by value"""
+    return ''.join(sorted(kinds, key=PIECE_ORDER.index))
+
+
+def normalize(pieces, stm):
+    """Map pieces [(colour, kind, square)] to (signature, squares, stm) in table orientation"""
+    white = _side_signature(kind for color, kind, _ in pieces if color == WHITE)
+    black = _side_signature(kind for color, kind, _ in pieces if color == BLACK)
+    flip = sum(PIECE_VALUES[k] for k in black) > sum(PIECE_VALUES[k] for k in white) or \
+        (sum(PIECE_VALUES[k] for k in black) == sum(PIECE_VALUES[k] for k in white) and black > white)
+    if flip:
+        # Swap colours and mirror the ranks so the stronger side is always White
+        pieces = [(color ^ BLACK, kind, sq ^ 56) for color, kind, sq in pieces]
+        white, black = black, white
+        stm ^= BLACK
+    ordered = sorted(pieces, key=lambda piece: (piece[0], PIECE_ORDER.index(piece[1]), piece[2]))
+    return white + black, [sq for _, _, sq in ordered], stm
+
+
+def table_index(squares, stm):
+    """Direct index of a position: side to move, then each piece's square in base 64"""
+    index = 1 if stm == BLACK else 0
+    for sq in squares:
+        index = index * 64 + sq
+    return index
+
+
+def decode_value(value):
+    """Convert a stored byte to plies to mate, DRAW, or None if unreachable"""
+    if value == 0:
+        return DRAW
+    if value == UNREACHABLE:
+        return None
+    return value - 1
+
+
+def _attacks(color, kind, from_sq, target, occupied):
+    """Check whether a piece on from_sq attacks target, given the occupied squares"""
+    if kind == 'P':
+        return target in PAWN_ATTACKS[color][from_sq]
+    if kind in STEPS:
+        return target in STEPS[kind][from_sq]
+    for ray in RAYS[kind][from_sq]:
+        for sq in ray:
+            if sq == target:
+                return True
+            if sq in occupied:
+                break
+    return False
+
+
+def _in_check(pieces, squares, color):
+    """Check whether color's king is attacked; captured pieces have square -1"""
+    occupied = set(sq for sq in squares if sq >= 0)
+    king_sq = next(sq for (owner, kind), sq in zip(pieces, squares) if owner == color and kind == 'K')
+    for (owner, kind), sq in zip(pieces, squares):
+        if owner != color and sq >= 0 and _attacks(owner, kind, sq, king_sq, occupied):
+            return True
+    return False
+
+
+class EndgameTables:
+    """Endgame tables mapped read-only from a directory of <signature>.bin files"""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.getenv("ENDGAME_TABLES_PATH",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tablebases'))
+        self.path = path
+        self._tables = {}
+        self._files = []
+        self.max_pieces = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if path and os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                signature, extension = os.path.splitext(name)
+                if extension != '.bin':
+                    continue
+                table_file = open(os.path.join(path, name), 'rb')
+                self._files.append(table_file)
+                self.add(signature, mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def add(self, signature, data):
+        """Register a table held in any bytes-like object"""
+        if len(data) != 2 * 64 ** len(signature):
+            raise ValueError(f"Table {signature} has {len(data)} bytes, expected {2 * 64 ** len(signature)}")
+        self._tables[signature] = data
+        self.max_pieces = max(self.max_pieces, len(signature))
+
+    def __contains__(self, signature):
+        return signature in self._tables
+
+    def probe_pieces(self, pieces, stm):
+        """Look up pieces [(colour, kind, square 0-63)]: plies to mate, DRAW, or None if no table"""
+        signature, squares, stm = normalize(pieces, stm)
+        if signature in INSUFFICIENT:
+            return DRAW
+        table = self._tables.get(signature)
+        if table is None:
+            return None
+        return decode_value(table[table_index(squares, stm)])
+
+    def probe(self, board):
+        """Look a board up: plies to mate for the side to move, DRAW, or None if not covered"""
+        if board.castling:
+            return None
+        pieces = []
+        for piece_code in range(16):
+            squares = board.piece_squares[piece_code]
+            if squares:
+                if len(pieces) + len(squares) > self.max_pieces:
+                    return None
+                kind = PIECE_LETTERS[piece_code & 7]
+                pieces.extend((piece_code & BLACK, kind, (sq >> 4) * 8 + (sq & 7)) for sq in squares)
+        if len(pieces) > self.max_pieces:
+            return None
+        return self.probe_pieces(pieces, board.side)
+
+    def best_move(self, board, moves=None):
+        """Return (SAN, plies to mate or DRAW) of the table's best move, or None if not covered"""
+        if self.probe(board) is None:
+            self.misses += 1
+            return None
+        if moves is None:
+            moves = legal_moves(board)
+        if any(move.flags & EN_PASSANT for move in moves):
+            return None  # En passant rights are not part of the table index
+        best, best_score, best_result = None, None, None
+        for move in moves:
+            undo = board.make_move(move)
+            # Nor is a double push the opponent can answer en passant
+            if board.ep_square >= 0 and any(reply.flags & EN_PASSANT for reply in legal_moves(board)):
+                result = None
+            else:
+                result = self.probe(board)
+            board.unmake_move(move, undo)
+            if result is None:
+                return None
+            # Prefer the quickest win, then a draw, then the slowest loss
+            if result == DRAW:
+                score, ours = 0, DRAW
+            elif result % 2 == 0:
+                score, ours = 1000 - result, result + 1
+            else:
+                score, ours = result - 1000, result + 1
+            if best_score is None or score > best_score:
+                best, best_score, best_result = move, score, ours
+        if best is None:
+            return None
+        self.hits += 1
+        return move_to_san(board, best, moves), best_result
+
+    def stats(self):
+        """Return the loaded signatures and probe counters"""
+        return {
+            'path': self.path,
+            'tables': sorted(self._tables),
+            'hits': self.hits,
+            'misses': self.misses
+        }
+
+    def close(self):
+        """Unmap every table file"""
+        for table in self._tables.values():
+            if isinstance(table, mmap.mmap):
+                table.close()
+        for table_file in self._files:
+            table_file.close()
+        self._tables.clear()
+        self._files = []
+
+
+class TableGenerator:
+    """Retrograde analysis for one signature, using existing tables for captures and promotions"""
+
+    def __init__(self, signature, tables):
+        self.signature = signature
+        self.tables = tables
+        self.pieces = signature_pieces(signature)
+        self.count = len(self.pieces)
+        self.half = 64 ** self.count
+
+    def decode(self, index):
+        """Return (squares, stm) for a table index"""
+        stm = BLACK if index >= self.half else WHITE
+        index %= self.half
+        squares = []
+        for _ in range(self.count):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        squares.reverse()
+        return squares, stm
+
+    def is_valid(self, squares, stm):
+        """Check that a position could occur: distinct squares, no back-rank pawns, no capturable king"""
+        if len(set(squares)) != self.count:
+            return False
+        for (color, kind), sq in zip(self.pieces, squares):
+            if kind == 'P' and sq >> 3 in (0, 7):
+                return False
+        return not _in_check(self.pieces, squares, stm ^ BLACK)
+
+    def moves(self, squares, stm):
+        """Yield (new squares, promotion letter or None, captured piece index or None) for legal moves"""
+        occupant = {sq: i for i, sq in enumerate(squares)}
+        for i, ((color, kind), from_sq) in enumerate(zip(self.pieces, squares)):
+            if color != stm:
+                continue
+            for to_sq, promotions in self._targets(color, kind, from_sq, occupant):
+                captured = occupant.get(to_sq)
+                if captured is not None and self.pieces[captured][0] == stm:
+                    continue
+                after = list(squares)
+                after[i] = to_sq
+                if captured is not None:
+                    after[captured] = -1
+                if _in_check(self.pieces, after, stm):
+                    continue
+                for promotion in promotions:
+                    yield after, promotion, captured
+
+    def _targets(self, color, kind, from_sq, occupant):
+        """Yield (target square, promotion letters) pairs before the own-piece and check filters"""
+        if kind == 'P':
+            push = from_sq + PAWN_STEP[color]
+            promotions = tuple(PROMOTIONS) if push >> 3 == PAWN_PROMOTION_ROW[color] else (None,)
+            if push not in occupant:
+                yield push, promotions
+                double = push + PAWN_STEP[color]
+                if from_sq >> 3 == PAWN_START_ROW[color] and double not in occupant:
+                    yield double, (None,)
+            for target in PAWN_ATTACKS[color][from_sq]:
+                if target in occupant:
+                    yield target, promotions
+        elif kind in STEPS:
+            for target in STEPS[kind][from_sq]:
+                yield target, (None,)
+        else:
+            for ray in RAYS[kind][from_sq]:
+                for target in ray:
+                    yield target, (None,)
+                    if target in occupant:
+                        break
+
+    def unmoves(self, squares, stm):
+        """Yield indexes of positions with the other side to move that lead here without a capture"""
+        mover = stm ^ BLACK
+        occupied = set(squares)
+        for i, ((color, kind), sq) in enumerate(zip(self.pieces, squares)):
+            if color != mover:
+                continue
+            if kind == 'P':
+                origins = []
+                back = sq - PAWN_STEP[color]
+                if back not in occupied and back >> 3 != PAWN_PROMOTION_ROW[color ^ BLACK]:
+                    origins.append(back)
+                    start = back - PAWN_STEP[color]
+                    if start >> 3 == PAWN_START_ROW[color] and start not in occupied:
+                        origins.append(start)
+            elif kind in STEPS:
+                origins = [target for target in STEPS[kind][sq] if target not in occupied]
+            else:
+                origins = []
+                for ray in RAYS[kind][sq]:
+                    for target in ray:
+                        if target in occupied:
+                            break
+                        origins.append(target)
+            for origin in origins:
+                before = list(squares)
+                before[i] = origin
+                yield table_index(before, mover)
+
+    def _external(self, squares, stm, promotion, captured):
+        """Probe the smaller or promoted table a capture or promotion leads into"""
+        pieces = []
+        for i, ((color, kind), sq) in enumerate(zip(self.pieces, squares)):
+            if i == captured:
+                continue
+            if kind == 'P' and promotion and sq >> 3 == PAWN_PROMOTION_ROW[color]:
+                kind = promotion
+            pieces.append((color, kind, sq))
+        result = self.tables.probe_pieces(pieces, stm)
+        if result is None:
+            signature, _, _ = normalize(pieces, stm)
+            raise LookupError(f"Generate the {signature} table before {self.signature}")
+        return result
+
+    def generate(self):
+        """Run the retrograde analysis and return the table as a bytearray"""
+        size = 2 * self.half
+        table = bytearray([UNREACHABLE]) * size
+        valid = bytearray(size)
+        resolved = bytearray(size)
+        remaining = [0] * size
+        longest_external_loss = {}
+        buckets = {}
+
+        def schedule(plies, index):
+            buckets.setdefault(plies, []).append(index)
+
+        # Forward pass: validity, mates, stalemates and moves that leave the table
+        for index in range(size):
+            squares, stm = self.decode(index)
+            if not self.is_valid(squares, stm):
+                continue
+            valid[index] = 1
+            table[index] = 0
+            total = 0
+            best_win = None
+            for after, promotion, captured in self.moves(squares, stm):
+                total += 1
+                if promotion is None and captured is None:
+                    continue
+                result = self._external(after, stm ^ BLACK, promotion, captured)
+                if result == DRAW:
+                    continue
+                if result % 2 == 0:
+                    best_win = result + 1 if best_win is None else min(best_win, result + 1)
+                else:
+                    total -= 1
+                    longest_external_loss[index] = max(longest_external_loss.get(index, 0), result)
+            remaining[index] = total
+            if best_win is not None:
+                schedule(best_win, index)
+            elif total == 0:
+                if index in longest_external_loss:
+                    schedule(longest_external_loss[index] + 1, index)
+                elif _in_check(self.pieces, squares, stm):
+                    schedule(0, index)
+                else:
+                    resolved[index] = 1  # Stalemate
+
+        # Retrograde pass: settle positions in order of distance to mate
+        plies = 0
+        while buckets:
+            for index in buckets.pop(plies, ()):
+                if resolved[index]:
+                    continue
+                resolved[index] = 1
+                table[index] = plies + 1
+                squares, stm = self.decode(index)
+                for parent in self.unmoves(squares, stm):
+                    if not valid[parent] or resolved[parent]:
+                        continue
+                    if plies % 2 == 0:
+                        # The parent can move into a lost position for the opponent
+                        schedule(plies + 1, parent)
+                    else:
+                        remaining[parent] -= 1
+                        if remaining[parent] == 0:
+                            schedule(max(plies, longest_external_loss.get(parent, 0)) + 1, parent)
+            plies += 1
+        return table
+
+
+def generate_tables(signatures, output):
+    """Generate each signature in order and write <output>/<signature>.bin"""
+    os.makedirs(output, exist_ok=True)
+    tables = EndgameTables(output)
+    for signature in signatures:
+        start = time.perf_counter()
+        table = TableGenerator(signature, tables).generate()
+        with open(os.path.join(output, signature + '.bin'), 'wb') as table_file:
+            table_file.write(table)
+        tables.add(signature, table)
+        wins = sum(1 for value in table if 0 < value < UNREACHABLE and value % 2 == 0)
+        longest = max((value - 1 for value in table if 0 < value < UNREACHABLE), default=0)
+        print(f"{signature}: {len(table)} positions, {wins} wins for the side to move, "
+              f"longest mate {longest} plies, {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tables by retrograde analysis")
+    parser.add_argument('signatures', nargs='*', default=['KQK', 'KRK', 'KPK'],
+                        help="material signatures, sub-tables first (default: KQK KRK KPK)")
+    parser.add_argument('--output', default='tablebases', help="directory to write the tables to")
+    args = parser.parse_args()
+    generate_tables(args.signatures, args.output)
+
+
+if __name__ == '__main__':
+    main()
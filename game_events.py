@@ -0,0 +1,92 @@
+"""
+Per-game event channels used to push AI progress and moves to the browser
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+
+
+class GameEvents:
+    """Numbered event backlog per game with blocking and asyncio waiters
+
+    Each game keeps its most recent events so a client that reconnects with
+    Last-Event-ID picks up anything it missed.
+    """
+
+    def __init__(self, backlog=64):
+        self.backlog = backlog
+        self._channels = {}
+        self._condition = threading.Condition()
+        self._async_waiters = {}
+
+    def publish(self, game_id, event, data):
+        """Append an event to a game's channel and wake its subscribers"""
+        with self._condition:
+            channel = self._channels.setdefault(game_id, {'next_id': 1, 'events': deque(maxlen=self.backlog)})
+            event_id = channel['next_id']
+            channel['next_id'] += 1
+            channel['events'].append((event_id, event, data))
+            self._condition.notify_all()
+            waiters = self._async_waiters.pop(game_id, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return event_id
+
+    def since(self, game_id, last_id=0):
+        """Return the buffered events newer than last_id"""
+        with self._condition:
+            channel = self._channels.get(game_id)
+            if channel is None:
+                return []
+            return [item for item in channel['events'] if item[0] > last_id]
+
+    def last_id(self, game_id):
+        """Return the ID of a game's newest event, or 0 if it has none"""
+        with self._condition:
+            channel = self._channels.get(game_id)
+            return channel['next_id'] - 1 if channel else 0
+
+    def wait(self, game_id, last_id=0, timeout=15.0):
+        """Block until events newer than last_id exist, or the timeout passes"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._has_new(game_id, last_id), timeout)
+        return self.since(game_id, last_id)
+
+    async def wait_async(self, game_id, last_id=0, timeout=15.0):
+        """Await events newer than last_id without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._condition:
+            if self._has_new(game_id, last_id):
+                future = None
+            else:
+                self._async_waiters.setdefault(game_id, []).append((loop, future))
+        if future is not None:
+            try:
+                await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.since(game_id, last_id)
+
+    def discard(self, game_id):
+        """Drop a finished game's channel"""
+        with self._condition:
+            self._channels.pop(game_id, None)
+
+    def _has_new(self, game_id, last_id):
+        """Check for unseen events; the caller holds the condition"""
+        channel = self._channels.get(game_id)
+        return channel is not None and channel['next_id'] - 1 > last_id
+
+
+def _resolve(future):
+    """Complete an asyncio waiter unless it already timed out"""
+    if not future.done():
+        future.set_result(None)
+
+
+def format_sse(event_id, event, data):
+    """Encode one event in text/event-stream framing"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
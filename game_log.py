@@ -0,0 +1,308 @@
+"""
+Durable append-only game log with periodic snapshots and lazy restore
+
+Every game gets <id>.jsonl, a write-ahead log of compact JSON records:
+
+    {"type":"start","version":0,"backend":"llm","time":...}
+    {"type":"move","version":1,"move":"e2e4","player":"white","time":...}
+    {"type":"undo","version":5,"time":...}  /  {"type":"redo","version":7,"time":...}
+
+and, every GAME_SNAPSHOT_EVERY versions, <id>.snap holding the full game state
+plus the log offset it covers, replaced atomically. A game is restored from
+its latest snapshot and the log records after that offset, or from its last
+start record when there is no snapshot.
+
+Appends only enqueue the record. One background writer drains the queue,
+writes everything that arrived together and fsyncs each touched file once
+(group commit), so request threads never wait for the disk. Set
+GAME_LOG_DIR to enable the log.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from chess_board import PIECE_LETTERS, parse_square
+from game_store import snapshot_game
+from move_generator import move_to_uci
+
+# Game IDs become file names, so anything but plain identifiers is never logged
+SAFE_GAME_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+_FLUSH = object()
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def parse_uci(text):
+    """Split long algebraic notation into (from square, to square, promotion piece type)"""
+    promotion = PIECE_LETTERS.index(text[4].upper()) if len(text) > 4 else 0
+    return parse_square(text[:2]), parse_square(text[2:4]), promotion
+
+
+class GameLog:
+    """Per-game JSONL write-ahead logs behind a single group-commit writer thread
+
+    The log is on when it has a directory (GAME_LOG_DIR by default); with
+    enabled=False it stays off whatever the directory, and records nothing.
+    """
+
+    def __init__(self, directory=None, snapshot_every=None, fsync=None, max_open=256, enabled=True):
+        if directory is None and enabled:
+            directory = os.getenv("GAME_LOG_DIR") or None
+        if snapshot_every is None:
+            snapshot_every = int(os.getenv("GAME_SNAPSHOT_EVERY", "20"))
+        if fsync is None:
+            fsync = os.getenv("GAME_LOG_FSYNC", "1").lower() not in ('0', 'false', 'no')
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self.max_open = max_open
+        self._queue = queue.SimpleQueue()
+        self._files = OrderedDict()  # game ID -> open log file, least recently used first
+        self._writer = None
+        self._lock = threading.Lock()
+
+        self.records = 0
+        self.snapshots = 0
+        self.commits = 0
+        self.restores = 0
+        self.write_errors = 0
+
+        if enabled and directory:
+            os.makedirs(directory, exist_ok=True)
+            self._writer = threading.Thread(target=self._run, name='game-log', daemon=True)
+            self._writer.start()
+            # Commit whatever is still queued when the server shuts down
+            atexit.register(self.close)
+
+    @property
+    def enabled(self):
+        return self._writer is not None
+
+    def _path(self, game_id, suffix):
+        return os.path.join(self.directory, game_id + suffix)
+
+    def _loggable(self, game_id):
+        return self.enabled and bool(game_id) and SAFE_GAME_ID.match(game_id) is not None
+
+    def record_start(self, game_state):
+        """Log that a game was created or restarted"""
+        if self._loggable(game_state['game_id']):
+            self._queue.put((game_state['game_id'], {
+                'type': 'start',
+                'version': game_state['version'],
+                'backend': game_state['ai_backend'],
+                'time_control': game_state['clock']['control'] if game_state['clock'] else None,
+                'time': time.time()
+            }))
+
+    def record_move(self, game_state, move, player):
+        """Log a move just applied to a game, snapshotting the game when one is due"""
+        game_id = game_state['game_id']
+        if not self._loggable(game_id):
+            return
+        version = game_state['version']
+        self._queue.put((game_id, {
+            'type': 'move',
+            'version': version,
+            'move': move_to_uci(move),
+            'player': player,
+            'time': time.time()
+        }))
+        self._snapshot_if_due(game_state)
+
+    def record_undo(self, game_state):
+        """Log a take-back; the plies undone follow from the position, as they do when it was made"""
+        self._record_step(game_state, 'undo')
+
+    def record_redo(self, game_state):
+        """Log that the last take-back was replayed"""
+        self._record_step(game_state, 'redo')
+
+    def _record_step(self, game_state, kind):
+        if self._loggable(game_state['game_id']):
+            self._queue.put((game_state['game_id'], {
+                'type': kind,
+                'version': game_state['version'],
+                'time': time.time()
+            }))
+            self._snapshot_if_due(game_state)
+
+    def _snapshot_if_due(self, game_state):
+        """Queue a full snapshot every snapshot_every versions"""
+        version = game_state['version']
+        if not self.snapshot_every or version % self.snapshot_every:
+            return
+        self._queue.put((game_state['game_id'], dict(type='snapshot', **snapshot_game(game_state))))
+
+    def load(self, game_id):
+        """Read a game back as (snapshot dict or None, start record or None, records after them)
+
+        Returns None if the game was never logged.
+        """
+        if not self._loggable(game_id):
+            return None
+        self.flush()
+        path = self._path(game_id, '.jsonl')
+        if not os.path.exists(path):
+            return None
+
+        snapshot = None
+        offset = 0
+        try:
+            with open(self._path(game_id, '.snap')) as snap:
+                snapshot = json.load(snap)
+            offset = snapshot.pop('offset')
+        except (OSError, ValueError, KeyError):
+            snapshot = None
+
+        start = None
+        tail = []
+        with open(path, 'rb') as log:
+            if offset > os.path.getsize(path):
+                offset = 0
+                snapshot = None
+            log.seek(offset)
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # A torn final write; nothing after it was committed
+                if record['type'] == 'start':
+                    # A restart supersedes everything logged before it, snapshot included
+                    snapshot = None
+                    start = record
+                    tail = []
+                elif snapshot is None or record['version'] > snapshot['version']:
+                    tail.append(record)
+        if snapshot is None and start is None:
+            return None
+        with self._lock:
+            self.restores += 1
+        return snapshot, start, tail
+
+    def flush(self, timeout=None):
+        """Block until everything enqueued so far is written and committed"""
+        if not self.enabled:
+            return
+        done = threading.Event()
+        self._queue.put((None, (_FLUSH, done)))
+        done.wait(timeout)
+
+    def close(self):
+        """Commit outstanding records and stop the writer"""
+        if not self.enabled:
+            return
+        self._queue.put((None, (_STOP, None)))
+        self._writer.join()
+        self._writer = None
+
+    def _run(self):
+        """Writer thread: take whatever has queued up, write it, commit it once"""
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = self._write_batch(batch)
+            if stop:
+                for log in self._files.values():
+                    log.close()
+                self._files.clear()
+                return
+
+    def _write_batch(self, batch):
+        """Write one group of records, fsync each touched log once, then release any waiters"""
+        touched = {}
+        waiters = []
+        stop = False
+        for game_id, record in batch:
+            if game_id is None:
+                marker, done = record
+                if marker is _STOP:
+                    stop = True
+                else:
+                    waiters.append(done)
+                continue
+            try:
+                log = self._open(game_id)
+                if record['type'] == 'snapshot':
+                    self._commit(log)
+                    self._write_snapshot(game_id, record, log.tell())
+                    continue
+                log.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+                touched[game_id] = log
+                with self._lock:
+                    self.records += 1
+            except OSError as e:
+                with self._lock:
+                    self.write_errors += 1
+                logger.error("Game log write failed for %s: %s", game_id, e)
+        for game_id, log in touched.items():
+            try:
+                self._commit(log)
+            except (OSError, ValueError):
+                # The file may have been closed to stay under max_open; that committed it already
+                pass
+        if touched:
+            with self._lock:
+                self.commits += 1
+        for done in waiters:
+            done.set()
+        return stop
+
+    def _open(self, game_id):
+        """Return the game's log file, opening it for append and closing the least recently used"""
+        log = self._files.get(game_id)
+        if log is None:
+            log = open(self._path(game_id, '.jsonl'), 'ab')
+            self._files[game_id] = log
+            while len(self._files) > self.max_open:
+                _, oldest = self._files.popitem(last=False)
+                self._commit(oldest)
+                oldest.close()
+        self._files.move_to_end(game_id)
+        return log
+
+    def _commit(self, log):
+        log.flush()
+        if self.fsync:
+            os.fsync(log.fileno())
+
+    def _write_snapshot(self, game_id, snapshot, offset):
+        """Atomically replace a game's snapshot; it covers the log up to offset"""
+        snapshot = dict(snapshot, offset=offset)
+        path = self._path(game_id, '.snap')
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as snap:
+            json.dump(snapshot, snap, separators=(',', ':'))
+            snap.flush()
+            if self.fsync:
+                os.fsync(snap.fileno())
+        os.replace(temporary, path)
+        with self._lock:
+            self.snapshots += 1
+
+    def stats(self):
+        """Return write, commit and restore counters"""
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'records': self.records,
+                'snapshots': self.snapshots,
+                'commits': self.commits,
+                'records_per_commit': self.records / self.commits if self.commits else 0.0,
+                'restores': self.restores,
+                'write_errors': self.write_errors,
+                'pending': self._queue.qsize()
+            }
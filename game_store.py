@@ -0,0 +1,291 @@
+"""
+Per-game state store with per-game locks, idle expiry and a memory cap
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from chess_board import WHITE, Board, Move
+
+logger = logging.getLogger(__name__)
+
+
+def new_game(game_id, backend='llm', version=0, clock=None):
+    """Create the state dict for a fresh game"""
+    return {
+        'game_id': game_id,
+        'version': version,  # Bumped on every move; never reused for a game ID
+        'base_version': version,  # Version before the first entry of game_history
+        'rewound_version': version,  # Version of the last undo; older clients need the full state
+        'board': Board.starting_position(),
+        'current_player': 'white',
+        'game_history': [],
+        'san_history': [],  # Moves in SAN, appended as they are played
+        'move_stack': [],  # (move, undo) per ply, so take-backs unmake in O(1)
+        'redo_stack': [],  # (move, player) taken back, most recent last
+        'conversation_history': [],  # Track the conversation between AI and human
+        'ai_backend': backend,
+        'clock': clock,  # ai_scheduler.new_clock() dict, or None for an untimed game
+        'last_access': time.monotonic()
+    }
+
+
+def snapshot_game(game_state):
+    """The full state of a game as a JSON-ready dict, for log snapshots and the shared store"""
+    # History records and stack entries are never modified once appended,
+    # so shallow copies are a consistent view for another thread
+    return {
+        'version': game_state['version'],
+        'base_version': game_state['base_version'],
+        'rewound_version': game_state['rewound_version'],
+        'fen': game_state['board'].to_fen(),
+        'current_player': game_state['current_player'],
+        'backend': game_state['ai_backend'],
+        'clock': dict(game_state['clock']) if game_state['clock'] else None,
+        'game_history': list(game_state['game_history']),
+        'san_history': list(game_state['san_history']),
+        'move_stack': list(game_state['move_stack']),
+        'redo_stack': list(game_state['redo_stack'])
+    }
+
+
+def game_from_snapshot(game_id, snapshot):
+    """Rebuild a game's state dict from a snapshot_game dict that went through JSON"""
+    game_state = new_game(game_id, snapshot['backend'], snapshot['base_version'], snapshot.get('clock'))
+    board = Board.from_fen(snapshot['fen'])
+    game_state.update(
+        board=board,
+        version=snapshot['version'],
+        rewound_version=snapshot['rewound_version'],
+        current_player=snapshot.get('current_player', 'white' if board.side == WHITE else 'black'),
+        game_history=snapshot['game_history'],
+        san_history=snapshot['san_history'],
+        move_stack=[(Move(*move), tuple(undo)) for move, undo in snapshot['move_stack']],
+        redo_stack=[(Move(*move), player) for move, player in snapshot['redo_stack']]
+    )
+    return game_state
+
+
+class _SharedLock:
+    """A shared game's lock: the local RLock plus the game's lease in the shared store
+
+    Taking it refreshes the in-memory game if another worker process moved
+    since, and releasing it writes the game back if this process changed it.
+    """
+
+    def __init__(self, store, game_id):
+        self._store = store
+        self._game_id = game_id
+        self._local = threading.RLock()
+        self._depth = 0
+        self._version = None  # Stored version when the outermost holder took the lease
+
+    def __enter__(self):
+        self._local.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            try:
+                self._store.shared.acquire(self._game_id)
+                self._version = self._store._refresh(self._game_id)
+            except BaseException:
+                self._store.shared.release(self._game_id)
+                self._depth -= 1
+                self._local.release()
+                raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self._depth == 1:
+                try:
+                    self._store._write_back(self._game_id, self._version)
+                finally:
+                    self._store.shared.release(self._game_id)
+        finally:
+            self._depth -= 1
+            self._local.release()
+        return False
+
+
+class GameStore:
+    """Games keyed by ID, each guarded by its own lock
+
+    The index lock only protects the dict itself and is never held while a
+    move is processed, so a slow AI call in one game never blocks another.
+    With a shared store (see shared_games.py) the games held here are a
+    per-process cache of it: reads pick up newer versions written by other
+    worker processes, and a game's lock also holds its lease in the store.
+    """
+
+    def __init__(self, max_games=None, idle_ttl=None, on_remove=None, loader=None, on_restore=None, shared=None):
+        if max_games is None:
+            max_games = int(os.getenv("MAX_GAMES", "10000"))
+        if idle_ttl is None:
+            idle_ttl = float(os.getenv("GAME_IDLE_TTL", "3600"))
+        self.max_games = max_games
+        self.idle_ttl = idle_ttl
+        self._games = OrderedDict()  # Least recently used first
+        self._locks = {}
+        self._index_lock = threading.Lock()
+        self._on_remove = on_remove  # Called with the ID of every game that is dropped
+        self._loader = loader  # Rebuilds a game that is not in memory, or returns None
+        self._on_restore = on_restore  # Called with every game the loader brought back
+        self.shared = shared
+        self._expired_at = 0.0
+        self.evictions = 0
+
+    def lock(self, game_id):
+        """Return the lock that serializes work on a game, across worker processes when shared"""
+        with self._index_lock:
+            return self._lock_locked(game_id)
+
+    def _lock_locked(self, game_id):
+        """Return (creating if needed) a game's lock; the caller holds the index lock"""
+        lock = self._locks.get(game_id)
+        if lock is None:
+            lock = self._locks[game_id] = threading.RLock() if self.shared is None else _SharedLock(self, game_id)
+        return lock
+
+    def create(self, backend='llm', game_id=None, clock=None):
+        """Start a new game (or restart an existing ID) and return its state"""
+        previous = self.get(game_id) if game_id else None
+        game_id = game_id or uuid.uuid4().hex
+        with self._index_lock:
+            # A restarted game keeps counting up so clients never mistake it for the old one
+            previous = self._games.get(game_id, previous)
+            game = new_game(game_id, backend, previous['version'] + 1 if previous else 0, clock)
+            self._games[game_id] = game
+            self._games.move_to_end(game_id)
+            self._lock_locked(game_id)
+            self._evict_locked()
+        if self.shared is not None:
+            if not self.shared.save(game):
+                logger.warning("Game %s was restarted by another worker at the same time", game_id)
+            # Stored games idle past the TTL are dropped, checked at most once a minute
+            if time.monotonic() - self._expired_at > 60:
+                self._expired_at = time.monotonic()
+                self.shared.expire(self.idle_ttl)
+        return game
+
+    def get(self, game_id):
+        """Return a game's state and mark it as recently used, or None if unknown"""
+        if not game_id:
+            return None
+        if self.shared is not None:
+            self._refresh(game_id, wait=False)
+        with self._index_lock:
+            game = self._games.get(game_id)
+            if game is not None:
+                if time.monotonic() - game['last_access'] <= self.idle_ttl:
+                    game['last_access'] = time.monotonic()
+                    self._games.move_to_end(game_id)
+                    return game
+                self._remove_locked(game_id)
+                self.evictions += 1
+        return self._restore(game_id)
+
+    def _restore(self, game_id):
+        """Bring a game that is not in memory back through the loader, or return None"""
+        if self._loader is None:
+            return None
+        game = self._loader(game_id)
+        if game is None:
+            return None
+        with self._index_lock:
+            current = self._games.get(game_id)
+            if current is not None:
+                return current  # Another request restored or recreated it first
+            self._games[game_id] = game
+            self._lock_locked(game_id)
+            self._evict_locked()
+        if self._on_restore is not None:
+            self._on_restore(game)
+        return game
+
+    def _refresh(self, game_id, wait=True):
+        """Bring the in-memory copy of a shared game up to the stored version and return that version
+
+        Without wait, a game whose lock another thread here holds is left alone:
+        that thread has refreshed it already and may be changing it.
+        """
+        lock = self.lock(game_id)
+        if not lock._local.acquire(blocking=wait):
+            return None
+        try:
+            stored = self.shared.version(game_id)
+            with self._index_lock:
+                game = self._games.get(game_id)
+            if stored is None or game is not None and game['version'] >= stored:
+                return stored
+            fresh = self.shared.load(game_id)
+            if fresh is None:
+                return stored
+            with self._index_lock:
+                game = self._games.get(game_id)
+                if game is None:
+                    self._games[game_id] = fresh
+                    self._evict_locked()
+                else:
+                    # Updated in place, so work holding on to the dict sees the new version
+                    fresh['conversation_history'] = game['conversation_history']
+                    game.clear()
+                    game.update(fresh)
+                    self._games.move_to_end(game_id)
+            return fresh['version']
+        finally:
+            lock._local.release()
+
+    def _write_back(self, game_id, stored_version):
+        """Save a shared game if it changed while its lease was held"""
+        with self._index_lock:
+            game = self._games.get(game_id)
+        if game is not None and game['version'] != stored_version:
+            if not self.shared.save(game, stored_version):
+                logger.error("Game %s changed in the shared store while this worker held its lease", game_id)
+
+    def delete(self, game_id):
+        """Forget a game"""
+        with self._index_lock:
+            self._remove_locked(game_id)
+
+    def evict_idle(self):
+        """Drop games that have been idle longer than the TTL"""
+        with self._index_lock:
+            self._evict_locked()
+
+    def start_sweeper(self, interval):
+        """Evict idle games every interval seconds on a daemon thread, not only when a game is created"""
+        def sweep():
+            while True:
+                time.sleep(interval)
+                self.evict_idle()
+        sweeper = threading.Thread(target=sweep, name='game-sweeper', daemon=True)
+        sweeper.start()
+        return sweeper
+
+    def _evict_locked(self):
+        """Evict idle games from the LRU end, then the oldest games above the cap"""
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._games:
+            game_id, game = next(iter(self._games.items()))
+            if game['last_access'] >= cutoff and len(self._games) <= self.max_games:
+                break
+            self._remove_locked(game_id)
+            self.evictions += 1
+
+    def _remove_locked(self, game_id):
+        """Drop a game and its lock; the caller holds the index lock"""
+        self._games.pop(game_id, None)
+        self._locks.pop(game_id, None)
+        if self._on_remove is not None:
+            self._on_remove(game_id)
+
+    def __len__(self):
+        return len(self._games)
+
+    def __contains__(self, game_id):
+        return game_id in self._games
@@ -0,0 +1,206 @@
+"""
+Counters and stage timing histograms for the move pipeline, in Prometheus text format
+
+Set METRICS_ENABLED=0 to turn every timer and counter into a no-op; /metrics
+then answers 404.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ('0', 'false', 'no')
+
+# Upper bounds in seconds, from a dictionary lookup up to a slow LLM round trip
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=()):
+    """Render a {name="value",...} label set, or an empty string without labels"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        """Add to the count for the given label values"""
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+
+class Gauge:
+    """Current value read from a callback each time metrics are rendered"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, read):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def samples(self):
+        return [f"{self.name} {_format_value(self.read())}"]
+
+
+class _Timer:
+    """Context manager that observes its elapsed time into a histogram"""
+
+    __slots__ = ('histogram', 'label_values', 'start')
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+        return False
+
+
+class _NullTimer:
+    """Shared stand-in for _Timer while metrics are disabled"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram, optionally split by label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        """Record one observation for the given label values"""
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *label_values):
+        """Return a context manager timing its block into the histogram"""
+        if not METRICS_ENABLED:
+            return _NULL_TIMER
+        return _Timer(self, label_values)
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [('le', bound if bound == '+Inf' else repr(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Ordered collection of metrics rendered together on /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _add(self, metric):
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, read):
+        """Register a gauge; re-registering a name replaces its callback"""
+        self._metrics[name] = Gauge(name, documentation, read)
+        return self._metrics[name]
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'chess_stage_seconds', "Time spent in each stage of handling a move", ('stage',))
+AI_MOVES = REGISTRY.counter(
+    'chess_ai_moves_total', "AI replies by where they came from (table, book, ponder, backend)", ('source',))
+FALLBACKS = REGISTRY.counter(
+    'chess_fallbacks_total', "AI moves played by the local engine instead of the backend", ('reason',))
+INVALID_AI_MOVES = REGISTRY.counter(
+    'chess_invalid_ai_moves_total', "Backend answers that were not a legal move in the position", ('backend',))
+LLM_ANSWERS = REGISTRY.counter(
+    'chess_llm_answers_total', "LLM moves by which answer held the legal move played (or illegal)", ('outcome',))
+LLM_RETRIES = REGISTRY.counter(
+    'chess_llm_retries_total', "Extra LLM calls made because an answer held no legal move")
+AI_DEADLINE_MISSES = REGISTRY.counter(
+    'chess_ai_deadline_misses_total', "AI turns whose move was ready after the clock deadline", ('time_control',))
+AI_DEGRADED = REGISTRY.counter(
+    'chess_ai_degraded_total', "AI turns played by a cheaper backend than the game's (clock, queue)", ('reason',))
+
+
+def stage(name):
+    """Time a pipeline stage: `with stage('validate'): ...`"""
+    if not METRICS_ENABLED:
+        return _NULL_TIMER
+    return _Timer(STAGE_SECONDS, (name,))
@@ -0,0 +1,399 @@
+"""
+Legal move generation, SAN conversion and perft for the 0x88 board
+"""
+
+import re
+
+from chess_board import (
+    BLACK, WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, EMPTY,
+    NORMAL, DOUBLE_PUSH, EN_PASSANT, CASTLE,
+    WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE,
+    PIECE_LETTERS, Move, parse_square, square_name,
+)
+
+KNIGHT_OFFSETS = (-33, -31, -18, -14, 14, 18, 31, 33)
+BISHOP_DIRECTIONS = (-17, -15, 15, 17)
+ROOK_DIRECTIONS = (-16, -1, 1, 16)
+KING_OFFSETS = BISHOP_DIRECTIONS + ROOK_DIRECTIONS
+
+PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Per-colour pawn geometry: push offset, start row, promotion row, capture offsets
+PAWN_PUSH = {WHITE: -16, BLACK: 16}
+PAWN_START_ROW = {WHITE: 6, BLACK: 1}
+PAWN_PROMOTION_ROW = {WHITE: 0, BLACK: 7}
+PAWN_CAPTURES = {WHITE: (-17, -15), BLACK: (15, 17)}
+
+CASTLING_MOVES = {
+    WHITE: ((WHITE_KINGSIDE, 0x74, 0x76, (0x75, 0x76), (0x75, 0x76)),
+            (WHITE_QUEENSIDE, 0x74, 0x72, (0x73, 0x72, 0x71), (0x73, 0x72))),
+    BLACK: ((BLACK_KINGSIDE, 0x04, 0x06, (0x05, 0x06), (0x05, 0x06)),
+            (BLACK_QUEENSIDE, 0x04, 0x02, (0x03, 0x02, 0x01), (0x03, 0x02))),
+}
+
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+COORDINATE_PATTERN = re.compile(r'^([a-h][1-8])-?([a-h][1-8])([nbrq])?$')
+
+
+def is_square_attacked(board, sq, by_color):
+    """Check whether any piece of by_color attacks a square"""
+    squares = board.squares
+
+    # A white pawn attacks from below (higher row), a black pawn from above
+    pawn = by_color | PAWN
+    for offset in ((15, 17) if by_color == WHITE else (-15, -17)):
+        target = sq + offset
+        if not target & 0x88 and squares[target] == pawn:
+            return True
+
+    knight = by_color | KNIGHT
+    for offset in KNIGHT_OFFSETS:
+        target = sq + offset
+        if not target & 0x88 and squares[target] == knight:
+            return True
+
+    king = by_color | KING
+    for offset in KING_OFFSETS:
+        target = sq + offset
+        if not target & 0x88 and squares[target] == king:
+            return True
+
+    bishop, rook, queen = by_color | BISHOP, by_color | ROOK, by_color | QUEEN
+    for direction in BISHOP_DIRECTIONS:
+        target = sq + direction
+        while not target & 0x88:
+            piece = squares[target]
+            if piece:
+                if piece == bishop or piece == queen:
+                    return True
+                break
+            target += direction
+    for direction in ROOK_DIRECTIONS:
+        target = sq + direction
+        while not target & 0x88:
+            piece = squares[target]
+            if piece:
+                if piece == rook or piece == queen:
+                    return True
+                break
+            target += direction
+    return False
+
+
+def in_check(board, color=None):
+    """Check whether a side (default: the side to move) has its king attacked"""
+    if color is None:
+        color = board.side
+    king_sq = board.king_square(color)
+    return king_sq >= 0 and is_square_attacked(board, king_sq, color ^ BLACK)
+
+
+def pseudo_legal_moves(board):
+    """Generate moves for the side to move without checking king safety"""
+    squares = board.squares
+    piece_squares = board.piece_squares
+    color = board.side
+    enemy = color ^ BLACK
+    moves = []
+    append = moves.append
+
+    push = PAWN_PUSH[color]
+    start_row = PAWN_START_ROW[color]
+    promotion_row = PAWN_PROMOTION_ROW[color]
+    for sq in piece_squares[color | PAWN]:
+        target = sq + push
+        if not target & 0x88 and not squares[target]:
+            if target >> 4 == promotion_row:
+                for promotion in PROMOTIONS:
+                    append(Move(sq, target, promotion, NORMAL))
+            else:
+                append(Move(sq, target, EMPTY, NORMAL))
+                if sq >> 4 == start_row and not squares[target + push]:
+                    append(Move(sq, target + push, EMPTY, DOUBLE_PUSH))
+        for offset in PAWN_CAPTURES[color]:
+            target = sq + offset
+            if target & 0x88:
+                continue
+            piece = squares[target]
+            if piece and piece & 8 == enemy:
+                if target >> 4 == promotion_row:
+                    for promotion in PROMOTIONS:
+                        append(Move(sq, target, promotion, NORMAL))
+                else:
+                    append(Move(sq, target, EMPTY, NORMAL))
+            elif target == board.ep_square:
+                append(Move(sq, target, EMPTY, EN_PASSANT))
+
+    for sq in piece_squares[color | KNIGHT]:
+        for offset in KNIGHT_OFFSETS:
+            target = sq + offset
+            if not target & 0x88:
+                piece = squares[target]
+                if not piece or piece & 8 == enemy:
+                    append(Move(sq, target, EMPTY, NORMAL))
+
+    for kind, directions in ((BISHOP, BISHOP_DIRECTIONS), (ROOK, ROOK_DIRECTIONS), (QUEEN, KING_OFFSETS)):
+        for sq in piece_squares[color | kind]:
+            for direction in directions:
+                target = sq + direction
+                while not target & 0x88:
+                    piece = squares[target]
+                    if piece:
+                        if piece & 8 == enemy:
+                            append(Move(sq, target, EMPTY, NORMAL))
+                        break
+                    append(Move(sq, target, EMPTY, NORMAL))
+                    target += direction
+
+    for sq in piece_squares[color | KING]:
+        for offset in KING_OFFSETS:
+            target = sq + offset
+            if not target & 0x88:
+                piece = squares[target]
+                if not piece or piece & 8 == enemy:
+                    append(Move(sq, target, EMPTY, NORMAL))
+
+    if board.castling:
+        for right, king_from, king_to, empty, safe in CASTLING_MOVES[color]:
+            if not board.castling & right or squares[king_from] != color | KING:
+                continue
+            if any(squares[sq] for sq in empty):
+                continue
+            if is_square_attacked(board, king_from, enemy):
+                continue
+            if any(is_square_attacked(board, sq, enemy) for sq in safe):
+                continue
+            append(Move(king_from, king_to, EMPTY, CASTLE))
+
+    return moves
+
+
+def legal_moves(board):
+    """Generate all legal moves for the side to move"""
+    color = board.side
+    enemy = color ^ BLACK
+    moves = []
+    for move in pseudo_legal_moves(board):
+        undo = board.make_move(move)
+        king_sq = board.king_square(color)
+        if king_sq < 0 or not is_square_attacked(board, king_sq, enemy):
+            moves.append(move)
+        board.unmake_move(move, undo)
+    return moves
+
+
+def is_pseudo_legal(board, move):
+    """Check whether pseudo_legal_moves would generate a move, looking only at that move"""
+    from_sq, to_sq, promotion, flags = move
+    if (from_sq | to_sq) & 0x88:
+        return False
+    squares = board.squares
+    color = board.side
+    piece = squares[from_sq]
+    if not piece or piece & 8 != color:
+        return False
+    captured = squares[to_sq]
+    if captured and captured & 8 == color:
+        return False
+    kind = piece & 7
+    offset = to_sq - from_sq
+
+    if kind == PAWN:
+        if (to_sq >> 4 == PAWN_PROMOTION_ROW[color]) != (promotion in PROMOTIONS):
+            return False
+        push = PAWN_PUSH[color]
+        if flags == EN_PASSANT:
+            return to_sq == board.ep_square and offset in PAWN_CAPTURES[color]
+        if flags == DOUBLE_PUSH:
+            return (from_sq >> 4 == PAWN_START_ROW[color] and offset == 2 * push
+                    and not squares[from_sq + push] and not captured)
+        if flags != NORMAL:
+            return False
+        if offset == push:
+            return not captured
+        return offset in PAWN_CAPTURES[color] and bool(captured)
+
+    if promotion != EMPTY:
+        return False
+    if flags == CASTLE:
+        if kind != KING:
+            return False
+        enemy = color ^ BLACK
+        for right, king_from, king_to, empty, safe in CASTLING_MOVES[color]:
+            if from_sq == king_from and to_sq == king_to:
+                return (bool(board.castling & right) and not any(squares[sq] for sq in empty)
+                        and not is_square_attacked(board, king_from, enemy)
+                        and not any(is_square_attacked(board, sq, enemy) for sq in safe))
+        return False
+    if flags != NORMAL:
+        return False
+    # On a 0x88 board the difference between two squares identifies the step between them
+    if kind == KNIGHT:
+        return offset in KNIGHT_OFFSETS
+    if kind == KING:
+        return offset in KING_OFFSETS
+    directions = BISHOP_DIRECTIONS if kind == BISHOP else ROOK_DIRECTIONS if kind == ROOK else KING_OFFSETS
+    for direction in directions:
+        target = from_sq + direction
+        while not target & 0x88:
+            if target == to_sq:
+                return True
+            if squares[target]:
+                break
+            target += direction
+    return False
+
+
+def is_legal(board, move):
+    """Check whether a move is legal in the current position, without generating the others"""
+    if not is_pseudo_legal(board, move):
+        return False
+    color = board.side
+    undo = board.make_move(move)
+    king_sq = board.king_square(color)
+    legal = king_sq < 0 or not is_square_attacked(board, king_sq, color ^ BLACK)
+    board.unmake_move(move, undo)
+    return legal
+
+
+def find_move(board, from_sq, to_sq, promotion=EMPTY, moves=None):
+    """Look up the legal move between two squares, or None if there isn't one"""
+    if moves is None:
+        moves = legal_moves(board)
+    for move in moves:
+        if move.from_sq == from_sq and move.to_sq == to_sq:
+            if move.promotion == promotion or (not promotion and move.promotion in (EMPTY, QUEEN)):
+                return move
+    return None
+
+
+def move_to_san(board, move, moves=None):
+    """Convert a legal move to Standard Algebraic Notation"""
+    if moves is None:
+        moves = legal_moves(board)
+    from_sq, to_sq, promotion, flags = move
+    piece = board.squares[from_sq]
+    kind = piece & 7
+
+    if flags & CASTLE:
+        san = 'O-O' if to_sq & 7 == 6 else 'O-O-O'
+    else:
+        capture = bool(board.squares[to_sq]) or bool(flags & EN_PASSANT)
+        if kind == PAWN:
+            san = square_name(from_sq)[0] + 'x' if capture else ''
+        else:
+            san = PIECE_LETTERS[kind]
+            rivals = [other.from_sq for other in moves
+                      if other.to_sq == to_sq and other.from_sq != from_sq
+                      and board.squares[other.from_sq] == piece]
+            if rivals:
+                if all(other & 7 != from_sq & 7 for other in rivals):
+                    san += square_name(from_sq)[0]
+                elif all(other >> 4 != from_sq >> 4 for other in rivals):
+                    san += square_name(from_sq)[1]
+                else:
+                    san += square_name(from_sq)
+            if capture:
+                san += 'x'
+        san += square_name(to_sq)
+        if promotion:
+            san += '=' + PIECE_LETTERS[promotion]
+
+    undo = board.make_move(move)
+    if in_check(board):
+        san += '#' if not legal_moves(board) else '+'
+    board.unmake_move(move, undo)
+    return san
+
+
+def move_to_uci(move):
+    """Convert a move to coordinate notation (e.g. 'e2e4', 'e7e8q')"""
+    text = square_name(move.from_sq) + square_name(move.to_sq)
+    if move.promotion:
+        text += PIECE_LETTERS[move.promotion].lower()
+    return text
+
+
+def _match_san(board, moves, text):
+    """Match a cleaned-up SAN string against a list of legal moves"""
+    match = SAN_PATTERN.match(text)
+    if not match:
+        return None
+    letter, from_file, from_rank, target, promotion = match.groups()
+    kind = PIECE_LETTERS.index(letter) if letter else PAWN
+    to_sq = parse_square(target)
+    promotion = PIECE_LETTERS.index(promotion) if promotion else EMPTY
+
+    candidates = []
+    for move in moves:
+        if move.to_sq != to_sq or board.squares[move.from_sq] & 7 != kind:
+            continue
+        name = square_name(move.from_sq)
+        if from_file and name[0] != from_file:
+            continue
+        if from_rank and name[1] != from_rank:
+            continue
+        if move.promotion != promotion and not (not promotion and move.promotion == QUEEN):
+            continue
+        candidates.append(move)
+    return candidates[0] if len(candidates) == 1 else None
+
+
+def parse_san(board, text, moves=None):
+    """Resolve a SAN (or coordinate) move string to a legal Move, or None"""
+    if moves is None:
+        moves = legal_moves(board)
+    text = text.strip().rstrip('+#!?').replace(' ', '')
+    if not text:
+        return None
+
+    castle = text.upper().replace('0', 'O').replace('-', '')
+    if castle in ('OO', 'OOO'):
+        to_file = 6 if castle == 'OO' else 2
+        for move in moves:
+            if move.flags & CASTLE and move.to_sq & 7 == to_file:
+                return move
+        return None
+
+    match = COORDINATE_PATTERN.match(text.lower())
+    if match:
+        from_sq, to_sq = parse_square(match.group(1)), parse_square(match.group(2))
+        promotion = PIECE_LETTERS.index(match.group(3).upper()) if match.group(3) else EMPTY
+        for move in moves:
+            if move.from_sq == from_sq and move.to_sq == to_sq and \
+                    (move.promotion == promotion or (not promotion and move.promotion == QUEEN)):
+                return move
+
+    move = _match_san(board, moves, text)
+    if move:
+        return move
+
+    # LLM answers are often lower-cased ('nf6'); a leading 'b' may be a pawn file or a bishop
+    if text[0] in 'nrqk':
+        return _match_san(board, moves, text[0].upper() + text[1:])
+    if text[0] == 'b' and len(text) > 2:
+        return _match_san(board, moves, 'B' + text[1:])
+    return None
+
+
+def perft(board, depth):
+    """Count leaf nodes of the legal move tree to a fixed depth"""
+    moves = legal_moves(board)
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        undo = board.make_move(move)
+        nodes += perft(board, depth - 1)
+        board.unmake_move(move, undo)
+    return nodes
+
+
+def divide(board, depth):
+    """Return perft node counts split by root move, keyed by coordinate notation"""
+    counts = {}
+    for move in legal_moves(board):
+        undo = board.make_move(move)
+        counts[move_to_uci(move)] = perft(board, depth - 1)
+        board.unmake_move(move, undo)
+    return counts
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped opening book with Polyglot-style 16-byte entries
+
+Each entry is a big-endian (key, move, weight, learn) record of 8, 2, 2 and 4
+bytes, sorted by key, exactly like a Polyglot book. The key is this project's
+own Zobrist hash (chess_board.ZOBRIST_*) rather than the Polyglot random
+table, so books are built with this module. Moves use the Polyglot encoding,
+including castling written as the king capturing its own rook.
+
+The file is opened read-only through mmap, so every worker process on a host
+shares the same page-cache copy. Build a book with:
+
+    python opening_book.py --output opening_book.bin [--lines lines.txt] [--depth 16]
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+from collections import Counter
+
+from chess_board import BLACK, CASTLE, EMPTY, KING, Board, square_index
+from move_generator import find_move, legal_moves, move_to_san, parse_san
+
+ENTRY = struct.Struct('>QHHI')
+
+# Main lines of common openings, one SAN sequence each; repeated prefixes add weight
+DEFAULT_LINES = [
+    "e4 e5 Nf3 Nc6 Bb5 a6 Ba4 Nf6 O-O Be7 Re1 b5 Bb3 d6",
+    "e4 e5 Nf3 Nc6 Bb5 Nf6 O-O Nxe4 d4 Nd6 Bxc6 dxc6 dxe5 Nf5",
+    "e4 e5 Nf3 Nc6 Bb5 a6 Bxc6 dxc6 O-O f6 d4 exd4 Nxd4 c5",
+    "e4 e5 Nf3 Nc6 Bc4 Bc5 c3 Nf6 d3 d6 O-O O-O",
+    "e4 e5 Nf3 Nc6 Bc4 Nf6 d3 Be7 O-O O-O",
+    "e4 e5 Nf3 Nc6 d4 exd4 Nxd4 Nf6 Nxc6 bxc6 e5 Qe7",
+    "e4 e5 Nf3 Nf6 Nxe5 d6 Nf3 Nxe4 d4 d5 Bd3",
+    "e4 e5 f4 exf4 Nf3 g5 h4 g4 Ne5",
+    "e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6 Be3 e5 Nb3 Be6",
+    "e4 c5 Nf3 Nc6 d4 cxd4 Nxd4 Nf6 Nc3 e5 Ndb5 d6 Bg5 a6 Na3 b5",
+    "e4 c5 Nf3 e6 d4 cxd4 Nxd4 Nc6 Nc3 Qc7 Be2 a6 O-O Nf6",
+    "e4 c5 c3 Nf6 e5 Nd5 d4 cxd4 Nf3 Nc6 cxd4 d6",
+    "e4 c5 Nc3 Nc6 g3 g6 Bg2 Bg7 d3 d6",
+    "e4 e6 d4 d5 Nc3 Nf6 Bg5 Be7 e5 Nfd7 Bxe7 Qxe7 f4 O-O",
+    "e4 e6 d4 d5 Nd2 Nf6 e5 Nfd7 Bd3 c5 c3 Nc6 Ne2 cxd4 cxd4 f6",
+    "e4 e6 d4 d5 e5 c5 c3 Nc6 Nf3 Qb6 a3 c4",
+    "e4 c6 d4 d5 Nc3 dxe4 Nxe4 Bf5 Ng3 Bg6 h4 h6 Nf3 Nd7 h5 Bh7",
+    "e4 c6 d4 d5 e5 Bf5 Nf3 e6 Be2 c5 Be3",
+    "e4 d5 exd5 Qxd5 Nc3 Qa5 d4 Nf6 Nf3 c6 Bc4 Bf5",
+    "e4 d6 d4 Nf6 Nc3 g6 f4 Bg7 Nf3 O-O",
+    "d4 d5 c4 e6 Nc3 Nf6 Bg5 Be7 e3 O-O Nf3 h6 Bh4 b6",
+    "d4 d5 c4 c6 Nf3 Nf6 Nc3 dxc4 a4 Bf5 e3 e6 Bxc4 Bb4 O-O O-O",
+    "d4 d5 c4 dxc4 Nf3 Nf6 e3 e6 Bxc4 c5 O-O a6",
+    "d4 d5 Bf4 Nf6 e3 c5 c3 Nc6 Nd2 e6 Ngf3 Bd6 Bg3 O-O",
+    "d4 Nf6 c4 e6 Nc3 Bb4 e3 O-O Bd3 d5 Nf3 c5 O-O",
+    "d4 Nf6 c4 e6 Nf3 b6 g3 Ba6 b3 Bb4+ Bd2 Be7",
+    "d4 Nf6 Nf3 e6 c4 d5 Nc3 Be7 Bf4 O-O e3 c5",
+    "d4 Nf6 c4 g6 Nc3 Bg7 e4 d6 Nf3 O-O Be2 e5 O-O Nc6 d5 Ne7",
+    "d4 Nf6 c4 g6 Nc3 d5 cxd5 Nxd5 e4 Nxc3 bxc3 Bg7 Nf3 c5",
+    "d4 Nf6 c4 c5 d5 b5 cxb5 a6 bxa6 Bxa6 Nc3 d6",
+    "d4 f5 g3 Nf6 Bg2 g6 Nf3 Bg7 O-O O-O c4 d6",
+    "c4 e5 Nc3 Nf6 Nf3 Nc6 g3 d5 cxd5 Nxd5 Bg2 Nb6 O-O Be7",
+    "c4 c5 Nc3 Nc6 g3 g6 Bg2 Bg7 Nf3 e6 O-O Nge7",
+    "Nf3 d5 g3 Nf6 Bg2 e6 O-O Be7 d3 O-O",
+]
+
+# Polyglot writes castling as the king capturing its own rook
+CASTLE_TO_POLYGLOT = {0x76: 0x77, 0x72: 0x70, 0x06: 0x07, 0x02: 0x00}
+POLYGLOT_TO_CASTLE = {rook: king for king, rook in CASTLE_TO_POLYGLOT.items()}
+
+
+def encode_move(move):
+    """Pack a move into the 16-bit Polyglot move encoding"""
+    to_sq = CASTLE_TO_POLYGLOT[move.to_sq] if move.flags & CASTLE else move.to_sq
+    promotion = move.promotion - 1 if move.promotion else 0  # knight=1 .. queen=4
+    # Polyglot counts ranks from White's side, our rows from Black's
+    return ((to_sq & 7) | (7 - (to_sq >> 4)) << 3 | (move.from_sq & 7) << 6
+            | (7 - (move.from_sq >> 4)) << 9 | promotion << 12)
+
+
+def decode_move(board, code, moves=None):
+    """Resolve a Polyglot move code to a legal Move in the position, or None"""
+    from_sq = square_index(7 - (code >> 9 & 7), code >> 6 & 7)
+    to_sq = square_index(7 - (code >> 3 & 7), code & 7)
+    promotion = code >> 12 & 7
+    if board.squares[from_sq] & 7 == KING and to_sq in POLYGLOT_TO_CASTLE and \
+            abs((from_sq & 7) - (to_sq & 7)) > 1:
+        to_sq = POLYGLOT_TO_CASTLE[to_sq]
+    return find_move(board, from_sq, to_sq, promotion + 1 if promotion else EMPTY, moves)
+
+
+def game_ply(board):
+    """Number of half-moves played to reach the position"""
+    return (board.fullmove_number - 1) * 2 + (board.side == BLACK)
+
+
+class OpeningBook:
+    """Read-only, memory-mapped opening book searched by binary search on the key"""
+
+    def __init__(self, path=None, max_ply=None, seed=None):
+        if path is None:
+            path = os.getenv("OPENING_BOOK_PATH",
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin'))
+        if max_ply is None:
+            max_ply = int(os.getenv("OPENING_BOOK_DEPTH", "16"))
+        self.path = path
+        self.max_ply = max_ply
+        self._random = random.Random(seed)
+        self._file = None
+        self._map = None
+        self.size = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if path and os.path.exists(path) and os.path.getsize(path) >= ENTRY.size:
+            self._file = open(path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = len(self._map) // ENTRY.size
+
+    def entries(self, key):
+        """Return the (move code, weight) pairs stored for a position key"""
+        if self._map is None:
+            return []
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(self._map, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while low < self.size:
+            entry_key, code, weight, _ = ENTRY.unpack_from(self._map, low * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append((code, weight))
+            low += 1
+        return found
+
+    def covers(self, board):
+        """Check whether the book is loaded and the position is shallow enough to look up"""
+        return self._map is not None and game_ply(board) < self.max_ply
+
+    def has_position(self, board):
+        """Check whether the book has any move for a position"""
+        return self.covers(board) and bool(self.entries(board.hash))
+
+    def get_move(self, board, moves=None):
+        """Pick a book move by weighted random choice, returned in SAN, or None"""
+        if not self.covers(board):
+            return None
+        if moves is None:
+            moves = legal_moves(board)
+        candidates, weights = [], []
+        for code, weight in self.entries(board.hash):
+            move = decode_move(board, code, moves)
+            if move is not None and weight:
+                candidates.append(move)
+                weights.append(weight)
+        if not candidates:
+            self.misses += 1
+            return None
+        self.hits += 1
+        move = self._random.choices(candidates, weights)[0]
+        return move_to_san(board, move, moves)
+
+    def stats(self):
+        """Return book size and lookup counters"""
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path if self._map is not None else None,
+            'entries': self.size,
+            'max_ply': self.max_ply,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        """Unmap the book file"""
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+
+def build_book(lines, path, max_ply=16):
+    """Write a sorted book from SAN move sequences, weighting moves by how often they occur"""
+    counts = Counter()
+    for number, line in enumerate(lines, 1):
+        board = Board.starting_position()
+        for ply, san in enumerate(line.split()[:max_ply]):
+            move = parse_san(board, san)
+            if move is None:
+                raise ValueError(f"Line {number}: illegal move {san!r} at ply {ply + 1}")
+            counts[board.hash, encode_move(move)] += 1
+            board.make_move(move)
+
+    # Polyglot weights are 16-bit, so scale the counts to use the full range
+    top = max(counts.values(), default=1)
+    records = sorted(((key, code, max(1, count * 0xFFFF // top)) for (key, code), count in counts.items()),
+                     key=lambda record: (record[0], -record[2]))
+    with open(path, 'wb') as book:
+        for key, code, weight in records:
+            book.write(ENTRY.pack(key, code, weight, 0))
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from SAN move sequences")
+    parser.add_argument('--output', default='opening_book.bin', help="book file to write")
+    parser.add_argument('--lines', help="text file with one SAN move sequence per line (default: built-in lines)")
+    parser.add_argument('--depth', type=int, default=16, help="plies of each line to include")
+    args = parser.parse_args()
+
+    lines = DEFAULT_LINES
+    if args.lines:
+        with open(args.lines) as source:
+            lines = [line.strip() for line in source if line.strip() and not line.startswith('#')]
+    count = build_book(lines, args.output, args.depth)
+    print(f"Wrote {count} entries to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Streaming PGN reader and writer, and a bulk replay checker
+
+Games are read one at a time from any iterable of lines, so an archive of
+any size is never held in memory. Each game is replayed on the server's own
+board model and every move is checked for legality. Served games are
+written back out from their SAN history. Check an archive with:
+
+    python pgn.py games.pgn [--workers 8] [--chunk 200] [--output clean.pgn]
+
+The parent process only splits the file at game boundaries and hands chunks
+of raw games to a process pool, which does the parsing and replay.
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+from collections import deque
+from multiprocessing import Pool
+
+from chess_board import START_FEN, WHITE, Board
+from move_generator import in_check, is_legal, legal_moves, parse_san, pseudo_legal_moves
+
+HEADER_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATTERN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s(){};$.]+[^\s(){};$]*')
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+# The Seven Tag Roster comes first, in this order, in every exported game
+ROSTER = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+SETUP_TAGS = ('SetUp', 'FEN')
+
+
+def split_games(lines):
+    """Yield the raw text of each game in a stream of PGN lines"""
+    game = []
+    in_movetext = False
+    for line in lines:
+        if line.startswith('[') and in_movetext:
+            yield ''.join(game)
+            game = []
+            in_movetext = False
+        if line.strip() and not line.startswith('['):
+            in_movetext = True
+        if game or line.strip():
+            game.append(line)
+    if game:
+        yield ''.join(game)
+
+
+def parse_game(text):
+    """Parse one game's text into {'headers', 'moves' (SAN, main line only), 'result'}"""
+    headers = {}
+    movetext = []
+    for line in text.splitlines():
+        if line.startswith('[') and not movetext:
+            match = HEADER_PATTERN.match(line)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif line.strip() and not line.startswith('%'):
+            movetext.append(line)
+
+    moves = []
+    result = headers.get('Result', '*')
+    depth = 0  # Variation nesting; only the main line is kept
+    for token in TOKEN_PATTERN.findall('\n'.join(movetext)):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth = max(0, depth - 1)
+        elif depth or token[0] in '{;$' or token[0].isdigit() and token.endswith('.'):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return {'headers': headers, 'moves': moves, 'result': result}
+
+
+def read_games(lines):
+    """Yield every game in a stream of PGN lines, parsed"""
+    for text in split_games(lines):
+        yield parse_game(text)
+
+
+def game_result(board):
+    """The PGN result of a position: decisive or drawn if the game is over there, otherwise '*'"""
+    if legal_moves(board):
+        return '*'
+    if not in_check(board):
+        return '1/2-1/2'
+    return '0-1' if board.side == WHITE else '1-0'
+
+
+def resolve_san(board, san):
+    """Resolve a SAN move to a legal Move, or None, checking only the move it names for legality"""
+    move = parse_san(board, san, pseudo_legal_moves(board))
+    if move is not None and is_legal(board, move):
+        return move
+    # A pinned piece can make SAN ambiguous among pseudo-legal moves only
+    return parse_san(board, san)
+
+
+def replay_game(game):
+    """Replay a parsed game on a Board; returns its SAN moves, final board and the first error, if any"""
+    fen = game['headers'].get('FEN')
+    try:
+        board = Board.from_fen(fen) if fen else Board.starting_position()
+    except (ValueError, IndexError, KeyError) as e:
+        return {'moves': [], 'board': None, 'error': f"bad FEN {fen!r}: {e}"}
+
+    moves = []
+    for ply, san in enumerate(game['moves'], 1):
+        move = resolve_san(board, san)
+        if move is None:
+            return {'moves': moves, 'board': board, 'error': f"illegal move {san!r} at ply {ply}"}
+        moves.append(san)
+        board.make_move(move)
+
+    result = game['result']
+    final = game_result(board)
+    if final != '*' and result != final:
+        return {'moves': moves, 'board': board, 'error': f"result {result} but the position is {final}"}
+    return {'moves': moves, 'board': board, 'error': None}
+
+
+def write_game(headers, moves, result='*', start_fen=None, width=80):
+    """Format a game as PGN text: the roster tags, the rest, then wrapped movetext"""
+    headers = dict(headers, Result=result)
+    if start_fen and start_fen != START_FEN:
+        headers.update(SetUp='1', FEN=start_fen)
+    lines = []
+    for name in ROSTER:
+        lines.append(_tag(name, headers.get(name, '?' if name != 'Date' else '????.??.??')))
+    # SetUp and FEN follow the roster directly, ahead of any other tags
+    for name in SETUP_TAGS:
+        if name in headers:
+            lines.append(_tag(name, headers[name]))
+    for name, value in headers.items():
+        if name not in ROSTER and name not in SETUP_TAGS:
+            lines.append(_tag(name, value))
+    lines.append('')
+
+    board = Board.from_fen(start_fen) if start_fen else None
+    # A four-field FEN has no move counters, which the board then starts at move 1
+    number = board.fullmove_number if board is not None else 1
+    black_first = board is not None and board.side != WHITE
+    tokens = []
+    for index, san in enumerate(moves):
+        if not (index + black_first) % 2:
+            tokens.append(f"{number + (index + black_first) // 2}.")
+        elif index == 0:
+            tokens.append(f"{number}...")
+        tokens.append(san)
+    tokens.append(result)
+
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def _tag(name, value):
+    value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'[{name} "{value}"]'
+
+
+def game_to_pgn(game_state, headers=None):
+    """Export a served game, human as White and the AI as Black, from its SAN history"""
+    board = game_state['board']
+    tags = {
+        'Event': 'Human vs AI',
+        'Site': '?',
+        'Date': time.strftime('%Y.%m.%d'),
+        'White': 'Human',
+        'Black': f"AI ({game_state['ai_backend']})",
+        'GameId': game_state['game_id']
+    }
+    clock = game_state['clock']
+    tags['TimeControl'] = f"{clock['base']}+{clock['increment']}" if clock else '-'
+    tags.update(headers or {})
+    return write_game(tags, game_state['san_history'], game_result(board))
+
+
+def check_chunk(texts, export=False):
+    """Replay a chunk of raw games; returns (plies, [(index in chunk, error)], [PGN of valid games])"""
+    plies = 0
+    errors = []
+    valid = []
+    for index, text in enumerate(texts):
+        game = parse_game(text)
+        replay = replay_game(game)
+        plies += len(replay['moves'])
+        if replay['error']:
+            errors.append((index, replay['error']))
+        elif export:
+            valid.append(write_game(game['headers'], replay['moves'], game['result'], game['headers'].get('FEN')))
+    return plies, errors, valid
+
+
+def chunked(items, size):
+    """Group an iterable into lists of up to size items"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def check_file(path, workers=None, chunk_size=200, output=None, max_errors=20):
+    """Replay every game in a PGN file on a process pool and return totals and throughput"""
+    workers = workers or os.cpu_count() or 1
+    stats = {'games': 0, 'plies': 0, 'illegal': 0, 'errors': []}
+    started = time.perf_counter()
+    export = output is not None
+    out = open(output, 'w') if export else None
+    try:
+        with open(path, encoding='utf-8', errors='replace') as source, Pool(workers) as pool:
+            # Keep a bounded window of chunks in flight, so reading stays just
+            # ahead of the workers instead of queuing the whole file
+            pending = deque()
+            submitted = 0
+            for chunk in chunked(split_games(source), chunk_size):
+                pending.append((submitted, chunk, pool.apply_async(check_chunk, (chunk, export))))
+                submitted += len(chunk)
+                if len(pending) >= workers * 2:
+                    _collect(pending.popleft(), stats, out, max_errors)
+            while pending:
+                _collect(pending.popleft(), stats, out, max_errors)
+    finally:
+        if out is not None:
+            out.close()
+    stats['seconds'] = time.perf_counter() - started
+    stats['games_per_second'] = stats['games'] / stats['seconds'] if stats['seconds'] else 0.0
+    stats['plies_per_second'] = stats['plies'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def _collect(entry, stats, out, max_errors):
+    """Fold one finished chunk into the totals"""
+    first, chunk, result = entry
+    plies, errors, valid = result.get()
+    stats['games'] += len(chunk)
+    stats['plies'] += plies
+    stats['illegal'] += len(errors)
+    for index, error in errors:
+        if len(stats['errors']) < max_errors:
+            stats['errors'].append((first + index + 1, error))
+    if out is not None:
+        out.writelines(valid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and legality-check every game in a PGN file")
+    parser.add_argument('path', help="PGN file to check")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunk', type=int, default=200, help="games sent to a worker at a time")
+    parser.add_argument('--output', help="write the games that replay cleanly here, re-exported as PGN")
+    args = parser.parse_args()
+
+    stats = check_file(args.path, args.workers, args.chunk, args.output)
+    for number, error in stats['errors']:
+        print(f"Game {number}: {error}")
+    print(f"{stats['games']} games, {stats['plies']} plies, {stats['illegal']} with errors "
+          f"in {stats['seconds']:.2f}s: {stats['games_per_second']:.0f} games/s, "
+          f"{stats['plies_per_second']:.0f} plies/s")
+    return 1 if stats['illegal'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Speculative pondering: precompute AI replies to the human's likely next moves
+
+Every AI move starts up to PONDER_CANDIDATES speculative backend calls, of
+which at most one is used. For the local backends that is only CPU time, but
+for the LLM each one is a paid API request, so LLM games are only pondered
+when PONDER_LLM is set, at up to PONDER_CANDIDATES extra requests per move.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from chess_engine import evaluate
+from move_generator import legal_moves, move_to_san
+
+# Backends whose calls cost money, pondered only when explicitly enabled
+PAID_BACKENDS = ('llm',)
+
+
+def predict_replies(board, count, moves=None):
+    """Rank the side to move's legal moves by one-ply static evaluation and keep the best few"""
+    if moves is None:
+        moves = legal_moves(board)
+    scored = []
+    for move in moves:
+        undo = board.make_move(move)
+        # evaluate() scores for the side now to move, which is the opponent
+        scored.append((-evaluate(board), move))
+        board.unmake_move(move, undo)
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [move for _, move in scored[:count]]
+
+
+class Ponderer:
+    """Bounded background pool that fills a per-game cache of AI answers
+
+    Each game has at most one generation of speculative work. Starting a new
+    generation, or taking a result, cancels whatever is still queued for that
+    game; LLM calls already in flight finish but their results are dropped.
+    With a scheduler, each backend call needs one of its speculative slots,
+    so speculation stops while real AI turns are waiting.
+    """
+
+    def __init__(self, candidates=None, max_workers=None, max_pending=None, scheduler=None, ponder_paid=None):
+        if candidates is None:
+            candidates = int(os.getenv("PONDER_CANDIDATES", "3"))
+        if max_workers is None:
+            max_workers = int(os.getenv("PONDER_WORKERS", "4"))
+        if max_pending is None:
+            max_pending = int(os.getenv("PONDER_MAX_PENDING", str(max_workers * 8)))
+        if ponder_paid is None:
+            ponder_paid = os.getenv("PONDER_LLM", "0").lower() in ('1', 'true', 'yes')
+        self.candidates = candidates
+        self.max_pending = max_pending
+        self.scheduler = scheduler
+        self.ponder_paid = ponder_paid
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='ponder')
+        self._lock = threading.Lock()
+        self._games = {}  # game ID -> {position key: (rank, future)}
+        self._pending = 0
+
+        self.predictions = 0
+        self.hits = 0
+        self.inflight_hits = 0
+        self.misses = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.deferred = 0
+        self.hits_by_rank = [0] * max(candidates, 0)
+
+    def start(self, game_id, backend, board, move_history, skip=None, backend_name=None):
+        """Speculate on the human's likely replies; skip(position) excludes ones answered elsewhere"""
+        self.cancel(game_id)
+        if self.candidates <= 0 or backend_name in PAID_BACKENDS and not self.ponder_paid:
+            return
+        board = board.copy()
+        moves = legal_moves(board)
+        speculations = {}
+        for rank, move in enumerate(predict_replies(board, self.candidates, moves)):
+            child = board.copy()
+            child.make_move(move)
+            if skip is not None and skip(child):
+                continue
+            with self._lock:
+                if self._pending >= self.max_pending:
+                    self.skipped += 1
+                    continue
+                self._pending += 1
+            san = move_to_san(board, move, moves)
+            future = self._pool.submit(self._think, backend, child, san, move_history + [san])
+            future.add_done_callback(self._finished)
+            speculations[child.hash] = (rank, future)
+        with self._lock:
+            self._games[game_id] = speculations
+            self.predictions += len(speculations)
+
+    def take(self, game_id, key):
+        """Claim the speculative answer for a position, cancelling the rest of the game's work
+
+        Returns a future (possibly still running) for the AI's (move, fallback reason),
+        or None on a miss. The move is None when the scheduler was too busy to speculate.
+        """
+        with self._lock:
+            speculations = self._games.pop(game_id, {})
+            entry = speculations.pop(key, None)
+            if entry is None:
+                if speculations:
+                    self.misses += 1
+            else:
+                rank, future = entry
+                if future.done():
+                    self.hits += 1
+                else:
+                    self.inflight_hits += 1
+                self.hits_by_rank[rank] += 1
+        self._cancel_all(speculations)
+        return entry[1] if entry else None
+
+    def cancel(self, game_id):
+        """Drop a game's speculative work"""
+        with self._lock:
+            speculations = self._games.pop(game_id, {})
+        self._cancel_all(speculations)
+
+    def _cancel_all(self, speculations):
+        """Cancel queued speculative searches; running ones are left to finish"""
+        for _, future in speculations.values():
+            if future.cancel():
+                with self._lock:
+                    self.cancelled += 1
+
+    def _finished(self, future):
+        """Release a pending slot when a speculative search ends or is cancelled"""
+        with self._lock:
+            self._pending -= 1
+
+    def _think(self, backend, board, last_move, move_history):
+        """Ask a backend for its reply to one predicted human move; returns (move, fallback reason)"""
+        if self.scheduler is None:
+            return self._ask(backend, board, last_move, move_history)
+        with self.scheduler.speculative_slot() as granted:
+            if granted:
+                return self._ask(backend, board, last_move, move_history)
+        with self._lock:
+            self.deferred += 1
+        return None, None
+
+    def _ask(self, backend, board, last_move, move_history):
+        reasons = []
+        # A throwaway transcript keeps speculative answers out of the game's conversation
+        move = backend.get_move(board, last_move, move_history, [], on_fallback=reasons.append)
+        return move, reasons[-1] if reasons else None
+
+    def stats(self):
+        """Return prediction and hit-rate counters"""
+        with self._lock:
+            lookups = self.hits + self.inflight_hits + self.misses
+            return {
+                'candidates': self.candidates,
+                'predictions': self.predictions,
+                'hits': self.hits,
+                'inflight_hits': self.inflight_hits,
+                'misses': self.misses,
+                'cancelled': self.cancelled,
+                'skipped': self.skipped,
+                'deferred': self.deferred,
+                'pending': self._pending,
+                'hits_by_rank': list(self.hits_by_rank),
+                'hit_rate': (self.hits + self.inflight_hits) / lookups if lookups else 0.0
+            }
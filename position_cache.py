@@ -0,0 +1,114 @@
+"""
+Bounded LRU/TTL cache from Zobrist position keys to validated AI moves
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class PositionCache:
+    """In-memory LRU cache with expiry and an optional SQLite store that survives restarts"""
+
+    def __init__(self, max_entries=None, ttl=None, path=None):
+        if max_entries is None:
+            max_entries = int(os.getenv("POSITION_CACHE_SIZE", "50000"))
+        if ttl is None:
+            ttl = float(os.getenv("POSITION_CACHE_TTL", "86400"))
+        if path is None:
+            path = os.getenv("POSITION_CACHE_PATH") or None
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS position_moves "
+                "(position_key TEXT PRIMARY KEY, move TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached move for a position key, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                move, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return move
+                del self._entries[key]
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT move, expires FROM position_moves WHERE position_key = ?", (format(key, '016x'),)
+                ).fetchone()
+                if row and row[1] > now:
+                    self._insert(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, move):
+        """Store a validated move for a position key"""
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._insert(key, move, expires)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO position_moves (position_key, move, expires) VALUES (?, ?, ?)",
+                    (format(key, '016x'), move, expires)
+                )
+                self._db.commit()
+
+    def _insert(self, key, move, expires):
+        """Add an entry to the in-memory LRU, evicting the oldest when full"""
+        self._entries[key] = (move, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Drop every in-memory entry (the on-disk store is kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """Close the on-disk store"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,219 @@
+"""
+Single-flight deduplication and micro-batching for upstream AI requests
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+
+
+class _CoalescerStats:
+    """Counters shared by the thread and asyncio coalescers"""
+
+    def _reset_stats(self):
+        self.requests = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+    def _record_dispatch(self, waiting):
+        """Count one upstream call covering the given (submitted time, ...) entries"""
+        now = time.monotonic()
+        self.upstream_calls += 1
+        if len(waiting) > 1:
+            self.batches += 1
+            self.batched_items += len(waiting)
+        for entry in waiting:
+            delay = now - entry[0]
+            self.queue_delay_total += delay
+            self.queue_delay_max = max(self.queue_delay_max, delay)
+
+    def stats(self):
+        """Return request, coalescing and queueing-delay counters"""
+        dispatched = self.requests - self.coalesced
+        return {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'upstream_calls': self.upstream_calls,
+            'batches': self.batches,
+            'batched_items': self.batched_items,
+            'coalescing_ratio': self.requests / self.upstream_calls if self.upstream_calls else 1.0,
+            'queue_delay_avg': self.queue_delay_total / dispatched if dispatched else 0.0,
+            'queue_delay_max': self.queue_delay_max
+        }
+
+
+def _resolve(waiting, results, error):
+    """Hand every waiting entry its result or the call's error
+
+    With neither, the call was interrupted by a BaseException (KeyboardInterrupt,
+    SystemExit, task cancellation) that is on its way up; the futures are
+    cancelled so nobody waits on them forever.
+    """
+    for index, (_, _, _, future) in enumerate(waiting):
+        if future.done():
+            continue
+        if results is not None:
+            future.set_result(results[index])
+        elif error is not None:
+            future.set_exception(error)
+        else:
+            future.cancel()
+
+
+class Coalescer(_CoalescerStats):
+    """Thread-based coalescer around a blocking call(item) and optional batch_call(items)
+
+    Requests with the same key while one is in flight share its result. With a
+    batch window, distinct keys arriving within the window are sent together
+    through batch_call, which returns one result per item.
+    """
+
+    def __init__(self, call, batch_call=None, window=0.0, max_batch=8):
+        self.call = call
+        self.batch_call = batch_call if window > 0 and max_batch > 1 else None
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._batch_full = threading.Condition(self._lock)
+        self._inflight = {}
+        self._batch = None
+        self._reset_stats()
+
+    def submit(self, key, item):
+        """Return the result for an item, sharing or batching the upstream call where possible"""
+        submitted = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = flusher = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                leader = True
+                flusher = False
+                if self.batch_call is not None:
+                    flusher = self._batch is None
+                    if flusher:
+                        self._batch = []
+                    self._batch.append((submitted, key, item, future))
+                    if len(self._batch) >= self.max_batch:
+                        self._batch_full.notify_all()
+
+        if leader and self.batch_call is None:
+            self._dispatch([(submitted, key, item, future)])
+        elif flusher:
+            with self._lock:
+                self._batch_full.wait_for(lambda: len(self._batch) >= self.max_batch, self.window)
+                waiting, self._batch = self._batch, None
+            self._dispatch(waiting)
+        return future.result()
+
+    def _dispatch(self, waiting):
+        """Make one upstream call for the waiting entries and resolve their futures"""
+        with self._lock:
+            self._record_dispatch(waiting)
+        results = error = None
+        try:
+            if len(waiting) == 1:
+                results = [self.call(waiting[0][2])]
+            else:
+                results = self.batch_call([entry[2] for entry in waiting])
+        except Exception as e:
+            error = e
+        finally:
+            with self._lock:
+                for _, key, _, _ in waiting:
+                    self._inflight.pop(key, None)
+            _resolve(waiting, results, error)
+
+    def stats(self):
+        with self._lock:
+            return super().stats()
+
+
+class AsyncCoalescer(_CoalescerStats):
+    """asyncio counterpart of Coalescer around coroutine functions call and batch_call"""
+
+    def __init__(self, call, batch_call=None, window=0.0, max_batch=8):
+        self.call = call
+        self.batch_call = batch_call if window > 0 and max_batch > 1 else None
+        self.window = window
+        self.max_batch = max_batch
+        self._loop = None
+        self._inflight = {}
+        self._batch = None
+        self._batch_full = None
+        self._tasks = set()
+        self._reset_stats()
+
+    async def submit(self, key, item):
+        """Await the result for an item, sharing or batching the upstream call where possible"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Futures belong to one event loop; start afresh if the server's loop changed
+            self._loop = loop
+            self._inflight = {}
+            self._batch = None
+            self._tasks = set()
+        submitted = time.monotonic()
+        self.requests += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield the shared future so one caller giving up does not cancel it for the others
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._inflight[key] = future
+        entry = (submitted, key, item, future)
+        # The upstream call runs as its own task, so it completes for the
+        # followers even if the request that started it is cancelled
+        if self.batch_call is None:
+            self._spawn(self._dispatch([entry]))
+        elif self._batch is None:
+            self._batch = [entry]
+            self._batch_full = asyncio.Event()
+            self._spawn(self._flush_after_window())
+        else:
+            self._batch.append(entry)
+            if len(self._batch) >= self.max_batch:
+                self._batch_full.set()
+        return await asyncio.shield(future)
+
+    def _spawn(self, coroutine):
+        """Run a coroutine as a task, keeping a reference until it finishes"""
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_after_window(self):
+        """Send the current batch once the window closes or the batch fills up"""
+        try:
+            await asyncio.wait_for(self._batch_full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        waiting, self._batch = self._batch, None
+        await self._dispatch(waiting)
+
+    async def _dispatch(self, waiting):
+        """Make one upstream call for the waiting entries and resolve their futures"""
+        self._record_dispatch(waiting)
+        results = error = None
+        try:
+            if len(waiting) == 1:
+                results = [await self.call(waiting[0][2])]
+            else:
+                results = await self.batch_call([entry[2] for entry in waiting])
+        except Exception as e:
+            error = e
+        finally:
+            for _, key, _, _ in waiting:
+                self._inflight.pop(key, None)
+            _resolve(waiting, results, error)
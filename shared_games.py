@@ -0,0 +1,262 @@
+"""
+Game state shared by every worker process through one SQLite database
+
+In production mode several server processes serve the same games, so the
+authoritative copy of each game lives here instead of in one process:
+
+    games   one row per game: its version and a snapshot_game() JSON blob
+    leases  which worker holds a game's lock, and until when
+    events  each game's recent SSE events, so a stream on any worker sees them
+
+The database runs in WAL mode, so readers never wait for the writer. Each
+thread keeps its own connection. A game's lease is taken with one upsert
+that only succeeds if the lease is free or expired. Its holder writes the
+game back with a compare-and-set on the version it started from, so a
+holder whose lease ran out can never overwrite a newer move. Set
+SHARED_GAMES_PATH to enable it.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from game_events import GameEvents, _resolve
+from game_store import game_from_snapshot, snapshot_game
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (game_id TEXT PRIMARY KEY, version INTEGER NOT NULL, state TEXT NOT NULL,
+                                  updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (game_id TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS events (game_id TEXT NOT NULL, event_id INTEGER NOT NULL, event TEXT NOT NULL,
+                                   data TEXT NOT NULL, PRIMARY KEY (game_id, event_id));
+"""
+
+
+class GameBusy(Exception):
+    """Raised when another worker holds a game's lease for longer than the lock timeout"""
+
+
+class SharedGames:
+    """Game snapshots, per-game leases and event backlogs in a WAL-mode SQLite file"""
+
+    def __init__(self, path=None, lease=None, lock_timeout=None):
+        if path is None:
+            path = os.getenv("SHARED_GAMES_PATH") or None
+        if lease is None:
+            lease = float(os.getenv("SHARED_LOCK_LEASE", "60"))
+        if lock_timeout is None:
+            lock_timeout = float(os.getenv("SHARED_LOCK_TIMEOUT", "10"))
+        self.path = path
+        self.lease = lease
+        self.lock_timeout = lock_timeout
+        self._local = threading.local()
+        self._token = None
+        self._token_pid = None
+        self._lock = threading.Lock()
+
+        self.saves = 0
+        self.loads = 0
+        self.conflicts = 0
+        self.lease_waits = 0
+        self.lease_wait_seconds = 0.0
+
+        if path:
+            db = self._db()
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def _db(self):
+        """This thread's connection, reopened after a fork"""
+        db = getattr(self._local, 'db', None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=self.lock_timeout, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def _owner(self):
+        """Lease owner name for the calling thread, unique across processes"""
+        if self._token_pid != os.getpid():
+            self._token = uuid.uuid4().hex[:12]
+            self._token_pid = os.getpid()
+        return f"{self._token}:{threading.get_ident()}"
+
+    def version(self, game_id):
+        """A game's stored version, or None if it is not stored"""
+        row = self._db().execute("SELECT version FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        return row[0] if row else None
+
+    def load(self, game_id):
+        """A game's stored state as a fresh game dict, or None"""
+        row = self._db().execute("SELECT state FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        if row is None:
+            return None
+        with self._lock:
+            self.loads += 1
+        return game_from_snapshot(game_id, json.loads(row[0]))
+
+    def save(self, game_state, expected=None):
+        """Store a game if the stored version is still expected (or, without one, older); returns success"""
+        state = json.dumps(snapshot_game(game_state), separators=(',', ':'))
+        values = (game_state['version'], state, time.time(), game_state['game_id'])
+        if expected is None:
+            cursor = self._db().execute(
+                "INSERT INTO games (version, state, updated, game_id) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (game_id) DO UPDATE SET version = excluded.version, state = excluded.state, "
+                "updated = excluded.updated WHERE games.version < excluded.version", values)
+        else:
+            cursor = self._db().execute(
+                "UPDATE games SET version = ?, state = ?, updated = ? WHERE game_id = ? AND version = ?",
+                values + (expected,))
+        saved = cursor.rowcount == 1
+        with self._lock:
+            self.saves += saved
+            self.conflicts += not saved
+        return saved
+
+    def acquire(self, game_id):
+        """Take a game's lease, waiting while another worker holds it; raises GameBusy on timeout"""
+        owner = self._owner()
+        start = time.monotonic()
+        delay = 0.001
+        while True:
+            now = time.time()
+            cursor = self._db().execute(
+                "INSERT INTO leases (game_id, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (game_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.expires < ?", (game_id, owner, now + self.lease, now))
+            if cursor.rowcount == 1:
+                break
+            waited = time.monotonic() - start
+            if waited > self.lock_timeout:
+                raise GameBusy(f"Game {game_id} is busy in another worker")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        waited = time.monotonic() - start
+        if waited > 0.001:
+            with self._lock:
+                self.lease_waits += 1
+                self.lease_wait_seconds += waited
+
+    def release(self, game_id):
+        """Give up a game's lease if the calling thread holds it"""
+        self._db().execute("DELETE FROM leases WHERE game_id = ? AND owner = ?", (game_id, self._owner()))
+
+    def publish(self, game_id, event, data, backlog):
+        """Append an event to a game's backlog, dropping the oldest beyond backlog; returns its ID"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT MAX(event_id) FROM events WHERE game_id = ?", (game_id,)).fetchone()
+            event_id = (row[0] or 0) + 1
+            db.execute("INSERT INTO events (game_id, event_id, event, data) VALUES (?, ?, ?, ?)",
+                       (game_id, event_id, event, json.dumps(data, separators=(',', ':'))))
+            db.execute("DELETE FROM events WHERE game_id = ? AND event_id <= ?", (game_id, event_id - backlog))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return event_id
+
+    def events_since(self, game_id, last_id):
+        """A game's stored events newer than last_id, as (event ID, event, data)"""
+        rows = self._db().execute(
+            "SELECT event_id, event, data FROM events WHERE game_id = ? AND event_id > ? ORDER BY event_id",
+            (game_id, last_id)).fetchall()
+        return [(event_id, event, json.loads(data)) for event_id, event, data in rows]
+
+    def last_event_id(self, game_id):
+        row = self._db().execute("SELECT MAX(event_id) FROM events WHERE game_id = ?", (game_id,)).fetchone()
+        return row[0] or 0
+
+    def expire(self, idle_ttl):
+        """Delete games, leases and events untouched for longer than idle_ttl seconds"""
+        cutoff = time.time() - idle_ttl
+        db = self._db()
+        db.execute("DELETE FROM events WHERE game_id IN (SELECT game_id FROM games WHERE updated < ?)", (cutoff,))
+        db.execute("DELETE FROM games WHERE updated < ?", (cutoff,))
+        db.execute("DELETE FROM leases WHERE expires < ?", (time.time(),))
+
+    def stats(self):
+        """Return save, conflict and lease counters for this process"""
+        with self._lock:
+            return {
+                'path': self.path,
+                'saves': self.saves,
+                'loads': self.loads,
+                'conflicts': self.conflicts,
+                'lease_waits': self.lease_waits,
+                'lease_wait_seconds': self.lease_wait_seconds
+            }
+
+
+class SharedGameEvents(GameEvents):
+    """GameEvents kept in the shared store, so a stream on any worker sees every worker's events
+
+    Subscribers in the publishing process are woken at once; the others see
+    new events on their next poll, every SHARED_EVENT_POLL seconds.
+    """
+
+    def __init__(self, shared, backlog=64, poll=None):
+        super().__init__(backlog)
+        if poll is None:
+            poll = float(os.getenv("SHARED_EVENT_POLL", "0.1"))
+        self.shared = shared
+        self.poll = poll
+
+    def publish(self, game_id, event, data):
+        event_id = self.shared.publish(game_id, event, data, self.backlog)
+        with self._condition:
+            self._condition.notify_all()
+            waiters = self._async_waiters.pop(game_id, [])
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_resolve, future)
+        return event_id
+
+    def since(self, game_id, last_id=0):
+        return self.shared.events_since(game_id, last_id)
+
+    def last_id(self, game_id):
+        return self.shared.last_event_id(game_id)
+
+    def wait(self, game_id, last_id=0, timeout=15.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            found = self.since(game_id, last_id)
+            remaining = deadline - time.monotonic()
+            if found or remaining <= 0:
+                return found
+            with self._condition:
+                self._condition.wait(min(self.poll, remaining))
+
+    async def wait_async(self, game_id, last_id=0, timeout=15.0):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # The poll is a SQLite query, which must not hold up the event loop
+            found = await loop.run_in_executor(None, self.since, game_id, last_id)
+            remaining = deadline - loop.time()
+            if found or remaining <= 0:
+                return found
+            future = loop.create_future()
+            with self._condition:
+                self._async_waiters.setdefault(game_id, []).append((loop, future))
+            try:
+                await asyncio.wait_for(future, min(self.poll, remaining))
+            except asyncio.TimeoutError:
+                with self._condition:
+                    waiters = self._async_waiters.get(game_id, [])
+                    if (loop, future) in waiters:
+                        waiters.remove((loop, future))
+
+    def discard(self, game_id):
+        """Nothing to drop here: other workers may still be serving the game"""
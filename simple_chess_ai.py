@@ -3,143 +3,424 @@
 Simple Chess AI that ensures proper turn-based gameplay
 """
 
+import asyncio
+import logging
 import os
+import re
+import threading
+import time
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from batch_eval import shortlist
+from chess_board import WHITE
+from chess_engine import ChessEngine
+from metrics import INVALID_AI_MOVES, LLM_ANSWERS, LLM_RETRIES, stage
+from move_generator import legal_moves, move_to_san, parse_san
+from position_cache import PositionCache
+from request_coalescer import AsyncCoalescer, Coalescer
+from upstream_guard import CircuitBreaker, CircuitOpenError, DeadlineExceeded, UpstreamGuard
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a chess AI. Always respond with just the move notation. Only make valid moves with pieces that exist on the board."
+
+BATCH_SYSTEM_PROMPT = "You are a chess AI playing as Black in several independent games. Answer every game with one valid move."
+
+# Separators between ranked candidates; move numbers like "1." are dropped
+CANDIDATE_SPLIT = re.compile(r'[\s,;]+')
+MOVE_NUMBER = re.compile(r'^\d+[.)]*$')
+
+# Exchanges kept in a conversation history; it is a log for debugging, never sent to the model
+CONVERSATION_LIMIT = 64
+
+def remember(conversation_history, line):
+    """Append an exchange to a conversation history, dropping the oldest beyond CONVERSATION_LIMIT"""
+    conversation_history.append(line)
+    del conversation_history[:-CONVERSATION_LIMIT]
+
+def estimate_tokens(text):
+    """Rough token count for English/PGN text (about four characters per token)"""
+    return len(text) // 4 + 1
+
 class SimpleChessAI:
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        api_key = os.getenv("OPENAI_API_KEY")
+        self.timeout = float(os.getenv("LLM_TIMEOUT", "15"))
+        self.max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "100"))
+        self.move_window = int(os.getenv("PROMPT_MOVE_WINDOW", "16"))
+        self.token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "160"))
+        batch_window = float(os.getenv("LLM_BATCH_WINDOW", "0"))
+        batch_size = int(os.getenv("LLM_BATCH_SIZE", "8"))
+        self.move_deadline = float(os.getenv("LLM_MOVE_DEADLINE", "8"))
+        # With more than one candidate the prompt lists the batch evaluator's best
+        # LLM_SHORTLIST legal moves (0 lists them all) and asks for a ranked pick,
+        # so one illegal answer does not waste the call
+        self.candidates = int(os.getenv("LLM_CANDIDATES", "1"))
+        self.shortlist_size = int(os.getenv("LLM_SHORTLIST", "12"))
+        self.move_retries = int(os.getenv("LLM_MOVE_RETRIES", "0"))
+        # No single request may outlive the move's budget, so stalled calls free their thread
+        self.timeout = min(self.timeout, self.move_deadline)
+        self.client = OpenAI(api_key=api_key, timeout=self.timeout, max_retries=1)
+        # One shared async client keeps a pool of keep-alive connections for every game
+        self.async_client = AsyncOpenAI(api_key=api_key, timeout=self.timeout, max_retries=1)
+        self.guard = UpstreamGuard(
+            deadline=self.move_deadline,
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+            max_workers=self.max_concurrency,
+            breaker=CircuitBreaker(int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+                                   float(os.getenv("LLM_BREAKER_COOLDOWN", "30")))
+        )
+        self._limiter = None
+        self._limiter_loop = None
+        self._stats_lock = threading.Lock()
+        self.answers = 0
+        self.first_try_legal = 0
+        self.later_candidate_legal = 0
+        self.retry_legal = 0
+        self.retries = 0
         self.conversation_history = []
+        self.fallback_engine = ChessEngine()
+        self.cache = PositionCache()
+        # Games that reach the same position share one request; with a batch
+        # window, different positions arriving together share one completion
+        self.coalescer = Coalescer(self._complete, self._complete_batch, batch_window, batch_size)
+        self.async_coalescer = AsyncCoalescer(self._complete_async, self._complete_batch_async,
+                                              batch_window, batch_size)
         
-    def get_move(self, board, last_move, move_history):
-        """Get AI move based on current position"""
-        try:
-            # Build context for the AI
-            context = f"""
-            You are playing Black in a chess game against White.
-            
-            Current board position:
-            {board}
-            
-            White's last move: {last_move}
-            Move history: {move_history}
-            
-            It's your turn (Black). Analyze the position and respond with your next move in standard algebraic notation.
-            Examples: 'e5', 'Nf6', 'O-O', 'exd5', 'Qe7'
-            
-            IMPORTANT: Only make valid moves with Black pieces. Make sure the piece you want to move actually exists on the board.
-            
-            Respond with just the move notation, no explanations.
-            """
-            
-            # Add conversation history
-            if self.conversation_history:
-                context += "\n\nPrevious moves:\n"
-                for msg in self.conversation_history[-5:]:
-                    context += f"{msg}\n"
-            
-            # Get AI response
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a chess AI playing as Black. Always respond with just the move notation. Only make valid moves with pieces that exist on the board."},
-                    {"role": "user", "content": context}
-                ],
-                max_tokens=10,
-                temperature=0.1
-            )
-            
-            ai_move = response.choices[0].message.content.strip()
-            print(f"AI suggested move: {ai_move}")
-            
-            # Validate the move before returning
-            if self._is_valid_move(ai_move, board):
-                # Add to conversation history
-                self.conversation_history.append(f"Human: {last_move} -> AI: {ai_move}")
-                return ai_move
-            else:
-                print(f"AI suggested invalid move: {ai_move}, using fallback")
-                fallback_move = self._get_fallback_move(board)
-                self.conversation_history.append(f"Human: {last_move} -> AI: {fallback_move} (fallback)")
-                return fallback_move
-            
-        except Exception as e:
-            print(f"AI move generation failed: {e}")
-            fallback_move = self._get_fallback_move(board)
-            return fallback_move
-    
-    def _is_valid_move(self, move, board):
-        """Check if the AI move is valid"""
-        if not move or len(move) < 2:
-            return False
+    def get_move(self, board, last_move, move_history, conversation_history=None, on_fallback=None):
+        """Get AI move based on current position; on_fallback(reason) is called if the engine steps in"""
+        # Each game passes its own transcript; single-game callers share the instance's list
+        if conversation_history is None:
+            conversation_history = self.conversation_history
         
-        # Basic validation - check if the move format is reasonable
-        move = move.strip().lower()
+        cached_move = self._get_cached_move(board, last_move, conversation_history)
+        if cached_move:
+            return cached_move
         
-        # Handle castling
-        if move in ['o-o', '0-0', 'oo', 'o-o-o', '0-0-0', 'ooo']:
-            return True
+        start = time.monotonic()
+        try:
+            answer = self.coalescer.submit(board.hash, (board, last_move, move_history))
+            logger.debug("AI suggested move: %s", answer)
+        except Exception as e:
+            logger.warning("AI move generation failed: %r", e)
+            if on_fallback:
+                on_fallback(self._failure_reason(e))
+            return self._get_fallback_move(board)
         
-        # Check if it's a reasonable chess move format
-        files = 'abcdefgh'
-        ranks = '12345678'
+        ai_move = self._accept_move(answer, board, last_move, conversation_history)
+        rejected = [answer]
+        while ai_move is None and self._may_retry(start, len(rejected)):
+            try:
+                answer = self._complete((board, last_move, move_history), rejected)
+            except Exception as e:
+                logger.warning("AI move retry failed: %r", e)
+                break
+            ai_move = self._accept_move(answer, board, last_move, conversation_history, len(rejected))
+            rejected.append(answer)
+        if ai_move:
+            return ai_move
+        self._record_answer(None, len(rejected) - 1)
+        if on_fallback:
+            on_fallback('illegal_move')
+        fallback_move = self._get_fallback_move(board)
+        remember(conversation_history, f"Human: {last_move} -> AI: {fallback_move} (fallback)")
+        return fallback_move
+    
+    async def get_move_async(self, board, last_move, move_history, conversation_history=None, on_fallback=None):
+        """Async version of get_move for the ASGI server, bounded by the concurrency limiter"""
+        if conversation_history is None:
+            conversation_history = self.conversation_history
         
-        # For pawn moves (e.g., 'e5')
-        if len(move) == 2 and move[0] in files and move[1] in ranks:
-            return True
+        cached_move = self._get_cached_move(board, last_move, conversation_history)
+        if cached_move:
+            return cached_move
         
-        # For piece moves (e.g., 'Nf6', 'Bxe5')
-        if len(move) >= 3:
-            if move[0] in 'nbrqk' and move[1] in files and move[2] in ranks:
-                return True
-            if len(move) >= 4 and move[1] == 'x' and move[2] in files and move[3] in ranks:
-                return True
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        try:
+            answer = await self.async_coalescer.submit(board.hash, (board, last_move, move_history))
+            logger.debug("AI suggested move: %s", answer)
+        except Exception as e:
+            logger.warning("AI move generation failed: %r", e)
+            if on_fallback:
+                on_fallback(self._failure_reason(e))
+            # The engine search is CPU-bound, so keep it off the event loop
+            return await loop.run_in_executor(None, self._get_fallback_move, board.copy())
         
-        return False
+        ai_move = self._accept_move(answer, board, last_move, conversation_history)
+        rejected = [answer]
+        while ai_move is None and self._may_retry(start, len(rejected)):
+            try:
+                answer = await self._complete_async((board, last_move, move_history), rejected)
+            except Exception as e:
+                logger.warning("AI move retry failed: %r", e)
+                break
+            ai_move = self._accept_move(answer, board, last_move, conversation_history, len(rejected))
+            rejected.append(answer)
+        if ai_move:
+            return ai_move
+        self._record_answer(None, len(rejected) - 1)
+        if on_fallback:
+            on_fallback('illegal_move')
+        fallback_move = await loop.run_in_executor(None, self._get_fallback_move, board.copy())
+        remember(conversation_history, f"Human: {last_move} -> AI: {fallback_move} (fallback)")
+        return fallback_move
     
-    def _get_fallback_move(self, board):
-        """Get a fallback move when AI fails"""
-        # Find any black pawn that can move
-        for row in range(1, 7):  # Check pawn rows
-            for col in range(8):
-                piece = board[row][col]
-                if piece == '♟':  # Black pawn
-                    if row < 7 and board[row + 1][col] is None:
-                        # Convert to algebraic notation
-                        files = 'abcdefgh'
-                        ranks = '87654321'
-                        to_square = f"{files[col]}{ranks[row + 1]}"
-                        return to_square
+    def _get_limiter(self):
+        """Return the semaphore capping in-flight LLM requests on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._limiter is None or self._limiter_loop is not loop:
+            self._limiter = asyncio.Semaphore(self.max_concurrency)
+            self._limiter_loop = loop
+        return self._limiter
+    
+    def _get_cached_move(self, board, last_move, conversation_history):
+        """Serve positions the model has already answered from the cache"""
+        cached_move = self.cache.get(board.hash)
+        if cached_move and self._is_valid_move(cached_move, board):
+            remember(conversation_history, f"Human: {last_move} -> AI: {cached_move}")
+            return cached_move
+        return None
+    
+    def _failure_reason(self, error):
+        """Name the reason an LLM answer was not available, for fallback notifications"""
+        if isinstance(error, CircuitOpenError):
+            return 'circuit_open'
+        if isinstance(error, DeadlineExceeded):
+            return 'deadline'
+        return 'llm_error'
+    
+    def _create(self, request):
+        """Send one completion request through the deadline, hedging and circuit breaker guard"""
+        with stage('llm_round_trip'):
+            return self.guard.call(lambda: self.client.chat.completions.create(**request))
+    
+    async def _create_async(self, request):
+        """Async version of _create; each attempt holds a limiter slot and its own timeout"""
+        async def attempt():
+            async with self._get_limiter():
+                return await asyncio.wait_for(self.async_client.chat.completions.create(**request),
+                                              self.timeout)
+        with stage('llm_round_trip'):
+            return await self.guard.call_async(attempt)
+    
+    def _complete(self, item, rejected=()):
+        """Make one completion call for a (board, last move, move history) item"""
+        with stage('build_prompt'):
+            request = self._completion_request(*item, rejected=rejected)
+        response = self._create(request)
+        return response.choices[0].message.content.strip()
+    
+    async def _complete_async(self, item, rejected=()):
+        """Async version of _complete"""
+        with stage('build_prompt'):
+            request = self._completion_request(*item, rejected=rejected)
+        response = await self._create_async(request)
+        return response.choices[0].message.content.strip()
+    
+    def _complete_batch(self, items):
+        """Ask for moves in several positions with one completion call"""
+        with stage('build_prompt'):
+            request = self._batch_completion_request(items)
+        response = self._create(request)
+        return self._parse_batch(response.choices[0].message.content, len(items))
+    
+    async def _complete_batch_async(self, items):
+        """Async version of _complete_batch"""
+        with stage('build_prompt'):
+            request = self._batch_completion_request(items)
+        response = await self._create_async(request)
+        return self._parse_batch(response.choices[0].message.content, len(items))
+    
+    def _completion_request(self, board, last_move, move_history, rejected=()):
+        """Build the chat completion arguments for the current position"""
+        # The position goes in as FEN and only a bounded window of recent moves is
+        # included, so the prompt stays the same size however long the game runs
+        side, other = ('White', 'Black') if board.side == WHITE else ('Black', 'White')
+        header = (
+            f"You are playing {side}. Position (FEN): {board.to_fen()}\n"
+            f"{other}'s last move: {last_move}\n"
+        )
+        if self.candidates > 1:
+            footer = (
+                f"Candidate moves: {' '.join(self._candidate_sans(board))}\n"
+                f"Reply with your {self.candidates} best moves for {side} from that list, best first, "
+                "separated by commas. Moves only, no explanation."
+            )
+        else:
+            footer = (
+                f"Reply with {side}'s next legal move in standard algebraic notation "
+                "(e.g. e5, Nf6, O-O, exd5, Qe7). Move only, no explanation."
+            )
+        if rejected:
+            footer = f"Not legal in this position: {', '.join(rejected)}.\n" + footer
+        # The move list is needed whatever its length; only the history window is trimmed for it
+        budget = self.token_budget + estimate_tokens(footer) - 40
         
-        # If no pawn moves, try any black piece
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece and self._get_piece_color(piece) == 'black':
-                    # Try to move to an empty square
-                    for new_row in range(8):
-                        for new_col in range(8):
-                            if board[new_row][new_col] is None:
-                                files = 'abcdefgh'
-                                ranks = '87654321'
-                                to_square = f"{files[new_col]}{ranks[new_row]}"
-                                return to_square
+        window = move_history[-self.move_window:] if self.move_window else []
+        first_ply = len(move_history) - len(window)
+        context = header + self._format_moves(window, first_ply) + footer
+        while window and estimate_tokens(context) > budget:
+            # Drop a full move (two plies) from the oldest end until the prompt fits
+            window = window[2:]
+            first_ply += 2
+            context = header + self._format_moves(window, first_ply) + footer
         
-        return "e5"  # Ultimate fallback
+        return {
+            'model': "gpt-4o",
+            'messages': [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": context}
+            ],
+            'max_tokens': 6 * self.candidates + 4,
+            'temperature': 0.1
+        }
+    
+    def _batch_completion_request(self, items):
+        """Build one chat completion listing several positions by FEN"""
+        if self.candidates > 1:
+            games = "\n".join(
+                f"{number}: {board.to_fen()} (White's last move: {last_move}; candidates: {' '.join(self._candidate_sans(board))})"
+                for number, (board, last_move, _) in enumerate(items, 1)
+            )
+            reply = (
+                f"Reply with one line per game in the form '<number>: <move>, <move>, ...', giving Black's "
+                f"{self.candidates} best moves from that game's candidates, best first. No explanation."
+            )
+        else:
+            games = "\n".join(
+                f"{number}: {board.to_fen()} (White's last move: {last_move})"
+                for number, (board, last_move, _) in enumerate(items, 1)
+            )
+            reply = (
+                "Reply with one line per game in the form '<number>: <move>', giving Black's next legal "
+                "move in standard algebraic notation. No explanation."
+            )
+        context = f"Each numbered line is a separate game, given as FEN with Black to move.\n{games}\n{reply}"
+        return {
+            'model': "gpt-4o",
+            'messages': [
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": context}
+            ],
+            'max_tokens': (6 * self.candidates + 4) * len(items),
+            'temperature': 0.1
+        }
+    
+    def _parse_batch(self, text, count):
+        """Split a batched answer into one move per game; missing answers come back empty"""
+        moves = [""] * count
+        for line in text.splitlines():
+            number, _, move = line.partition(":")
+            number = number.strip().rstrip(".")
+            if number.isdigit() and 1 <= int(number) <= count:
+                moves[int(number) - 1] = move.strip()
+        return moves
+    
+    def coalescing_stats(self):
+        """Return single-flight and batching counters for the blocking and async paths"""
+        return {
+            'sync': self.coalescer.stats(),
+            'async': self.async_coalescer.stats()
+        }
+    
+    def upstream_stats(self):
+        """Return deadline, hedging and circuit breaker counters for LLM calls"""
+        return dict(self.guard.stats(), legality=self.legality_stats())
     
-    def _get_piece_color(self, piece):
-        """Get the color of a chess piece"""
-        if not piece:
+    def legality_stats(self):
+        """Return how often model answers held a legal move, and how many retries that took"""
+        with self._stats_lock:
+            answers = self.answers
+            return {
+                'answers': answers,
+                'first_try_legal': self.first_try_legal,
+                'later_candidate_legal': self.later_candidate_legal,
+                'retry_legal': self.retry_legal,
+                'retries': self.retries,
+                'first_try_legality_rate': self.first_try_legal / answers if answers else 0.0,
+                'legality_rate': (self.first_try_legal + self.later_candidate_legal + self.retry_legal) / answers
+                                 if answers else 0.0,
+                'retries_per_move': self.retries / answers if answers else 0.0
+            }
+    
+    def _format_moves(self, window, first_ply):
+        """Render a slice of the SAN history as numbered PGN-style movetext"""
+        if not window:
+            return ""
+        parts = []
+        for ply, san in enumerate(window, first_ply):
+            if ply % 2 == 0:
+                parts.append(f"{ply // 2 + 1}. {san}")
+            elif not parts:
+                parts.append(f"{ply // 2 + 1}... {san}")
+            else:
+                parts.append(san)
+        return f"Recent moves: {' '.join(parts)}\n"
+    
+    def _accept_move(self, answer, board, last_move, conversation_history, retry=0):
+        """Return the first legal candidate in a model answer, cached and recorded, or None"""
+        with stage('validate'):
+            moves = legal_moves(board)
+            candidates = self._candidates(answer)
+            index = next((index for index, candidate in enumerate(candidates)
+                          if self._is_valid_move(candidate, board, moves)), None)
+        if index is None:
+            logger.info("AI suggested no legal move in %r", answer)
+            INVALID_AI_MOVES.inc('llm')
             return None
-        white_pieces = '♔♕♖♗♘♙'
-        return 'white' if piece in white_pieces else 'black'
+        ai_move = candidates[index]
+        self._record_answer('retry' if retry else 'first_candidate' if index == 0 else 'later_candidate', retry)
+        self.cache.put(board.hash, ai_move)
+        remember(conversation_history, f"Human: {last_move} -> AI: {ai_move}")
+        return ai_move
+    
+    def _candidates(self, answer):
+        """Split an answer into its ranked candidate moves; a single-move answer is taken whole"""
+        if self.candidates <= 1:
+            return [answer]
+        tokens = [token.strip('"\'`()[]') for token in CANDIDATE_SPLIT.split(answer)]
+        return [token for token in tokens if token and not MOVE_NUMBER.match(token)][:self.candidates]
+    
+    def _may_retry(self, start, attempts):
+        """Whether another call fits: retries left and under half the move deadline spent"""
+        return attempts <= self.move_retries and time.monotonic() - start < self.move_deadline / 2
+    
+    def _record_answer(self, outcome, retries=0):
+        """Count one answered move by which attempt and candidate was legal (None: none was)"""
+        LLM_ANSWERS.inc(outcome or 'illegal')
+        if retries:
+            LLM_RETRIES.inc(amount=retries)
+        with self._stats_lock:
+            self.answers += 1
+            self.retries += retries
+            if outcome == 'first_candidate':
+                self.first_try_legal += 1
+            elif outcome == 'later_candidate':
+                self.later_candidate_legal += 1
+            elif outcome == 'retry':
+                self.retry_legal += 1
+    
+    def _candidate_sans(self, board):
+        """The batch evaluator's shortlist of legal moves in SAN, best first, for the prompt"""
+        # One move generation serves the scoring and every SAN disambiguation
+        moves = legal_moves(board)
+        count = max(self.shortlist_size, self.candidates) if self.shortlist_size else None
+        return [move_to_san(board, move, moves) for move, _ in shortlist(board, count, moves)]
+    
+    def _is_valid_move(self, move, board, moves=None):
+        """Check if the AI move is legal in the current position"""
+        if not move or len(move) < 2:
+            return False
+        return parse_san(board, move, moves) is not None
+    
+    def _get_fallback_move(self, board):
+        """Get a fallback move from the local search engine when AI fails"""
+        with stage('fallback'):
+            return self.fallback_engine.get_move(board)
     
     def reset_conversation(self):
         """Reset conversation history for new game"""
         self.conversation_history = []
-
-# Global AI instance
-chess_ai = SimpleChessAI()
@@ -3,30 +3,33 @@
 Startup script for the Human vs AI Chess Game
 """
 
+import argparse
 import os
 import sys
 import subprocess
-from dotenv import load_dotenv
+from importlib.util import find_spec
+
+# Module name -> pip package; found with find_spec so nothing is imported just to check it
+REQUIRED_PACKAGES = {'flask': 'flask', 'flask_cors': 'flask-cors', 'dotenv': 'python-dotenv', 'numpy': 'numpy'}
+OPTIONAL_PACKAGES = {'openai': ('openai', 'the LLM backend'), 'quart': ('quart', 'the ASGI server'),
+                     'hypercorn': ('hypercorn', 'the ASGI server'),
+                     'gunicorn': ('gunicorn', 'production mode with --server flask')}
 
 def check_environment():
     """Check if the environment is properly set up"""
     print("🔍 Checking environment...")
     
-    # Check if .env file exists
-    if not os.path.exists('.env'):
-        print("❌ .env file not found!")
-        print("📝 Please create a .env file with your OpenAI API key:")
-        print("   OPENAI_API_KEY=your_api_key_here")
-        return False
-    
     # Load environment variables
-    load_dotenv()
+    if os.path.exists('.env') and find_spec('dotenv') is not None:
+        from dotenv import load_dotenv
+        load_dotenv()
     
-    # Check API key
+    # Without a key the server still starts; only the LLM backend is unavailable
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
-        print("❌ OPENAI_API_KEY not found in .env file!")
-        return False
+        print("⚠️  OPENAI_API_KEY not set: the LLM backend is disabled and games use the local engine")
+        print("📝 To play the LLM, add it to a .env file:")
+        print("   OPENAI_API_KEY=your_api_key_here")
     
     print("✅ Environment check passed")
     return True
@@ -35,31 +38,58 @@ def check_dependencies():
     """Check if required packages are installed"""
     print("📦 Checking dependencies...")
     
-    required_packages = ['flask', 'flask-cors', 'autogen-agentchat', 'autogen-core', 'autogen_ext']
-    
-    for package in required_packages:
-        try:
-            __import__(package.replace('-', '_'))
-            print(f"✅ {package}")
-        except ImportError:
+    for module, package in REQUIRED_PACKAGES.items():
+        if find_spec(module) is None:
             print(f"❌ {package} not found")
             print(f"   Install with: pip install {package}")
             return False
+        print(f"✅ {package}")
+    
+    for module, (package, needed_by) in OPTIONAL_PACKAGES.items():
+        if find_spec(module) is None:
+            print(f"⚠️  {package} not found (needed for {needed_by})")
+        else:
+            print(f"✅ {package}")
     
     print("✅ All dependencies found")
     return True
 
-def start_server():
-    """Start the Flask server"""
+def production_command(server='asgi', workers=None, bind='0.0.0.0:5000'):
+    """Command line serving the app from several worker processes started up front"""
+    workers = str(workers or os.cpu_count() or 1)
+    if server == 'flask':
+        # Threaded workers, since every open event stream holds a thread
+        return [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', bind, '--workers', workers,
+                '--worker-class', 'gthread', '--threads', os.getenv("WORKER_THREADS", "32")]
+    return [sys.executable, '-m', 'hypercorn', 'asgi:app', '--bind', bind, '--workers', workers]
+
+def production_env(shared_path=None):
+    """Environment for production workers: every worker reads and writes games in one shared store"""
+    env = dict(os.environ)
+    if shared_path:
+        env['SHARED_GAMES_PATH'] = shared_path
+    else:
+        env.setdefault('SHARED_GAMES_PATH', 'games.db')
+    return env
+
+def start_server(args):
+    """Start the Flask debug server, or the multi-process production server"""
     print("🚀 Starting Chess Game Server...")
-    print("🌐 Server will be available at: http://localhost:5000")
+    if args.production:
+        command = production_command(args.server, args.workers, args.bind)
+        env = production_env()
+        print(f"🏭 Production mode: {command[-1]} {args.server} workers sharing games in {env['SHARED_GAMES_PATH']}")
+        print(f"🌐 Server will be available at: http://{args.bind}")
+    else:
+        command = [sys.executable, "app.py"]
+        env = None
+        print("🌐 Server will be available at: http://localhost:5000")
     print("🎮 Open your browser and start playing!")
     print("⏹️  Press Ctrl+C to stop the server")
     print("-" * 50)
     
     try:
-        # Start the Flask app
-        subprocess.run([sys.executable, "app.py"])
+        subprocess.run(command, env=env)
     except KeyboardInterrupt:
         print("\n👋 Server stopped. Thanks for playing!")
     except Exception as e:
@@ -67,6 +97,14 @@ def start_server():
 
 def main():
     """Main startup function"""
+    parser = argparse.ArgumentParser(description="Check the setup and start the chess server")
+    parser.add_argument('--production', action='store_true',
+                        help="serve from several worker processes with games in a shared SQLite store")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--server', choices=('asgi', 'flask'), default='asgi', help="app served in production mode")
+    parser.add_argument('--bind', default='0.0.0.0:5000', help="address to serve on in production mode")
+    args = parser.parse_args()
+    
     print("♟️  Human vs AI Chess Game")
     print("=" * 40)
     
@@ -89,7 +127,7 @@ def main():
     print()
     
     # Start the server
-    start_server()
+    start_server(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,41 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app is imported with no book, no game log, no shared store and no API key,
+# so the tests only touch what they set up themselves
+os.environ.update(OPENING_BOOK_PATH='', GAME_LOG_DIR='', SHARED_GAMES_PATH='', ENDGAME_TABLES_PATH='',
+                  AI_BACKEND='engine', CHESS_ENGINE_TIME_LIMIT='0.02', PONDER_CANDIDATES='0')
+os.environ.pop('OPENAI_API_KEY', None)
+
+import pytest
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
+
+
+@pytest.fixture
+def start_game(client):
+    """Start an engine game, optionally from a FEN, and return its ID"""
+    def start(fen=None):
+        from app import games
+        from chess_board import Board
+        game_id = client.post('/api/initialize', json={'backend': 'engine'}).get_json()['game_id']
+        if fen:
+            games.get(game_id)['board'] = Board.from_fen(fen)
+        return game_id
+    return start
+
+
+@pytest.fixture
+def play(client):
+    """Play a human move, given as from and to {'row', 'col'} squares, and wait for the AI reply"""
+    def move(game_id, from_square, to_square):
+        return client.post('/api/move', json={'game_id': game_id, 'from': from_square, 'to': to_square,
+                                              'wait': True})
+    return move
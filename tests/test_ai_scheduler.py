@@ -0,0 +1,108 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ai_scheduler import AIScheduler, AITurn, new_clock, press_clock, time_left
+
+
+def turn(game_id, budget, backend='engine', queued_ago=0.0):
+    queued = AITurn(game_id, backend, 'rapid', budget)
+    queued.queued -= queued_ago
+    queued.deadline -= queued_ago
+    return queued
+
+
+def grant_order(scheduler, turns):
+    """Queue turns behind one holding the only slot, release it and return the order they ran in"""
+    order = []
+    done = threading.Event()
+
+    def run(granted):
+        order.append(granted.game_id)
+        if len(order) == len(turns):
+            done.set()
+
+    with ThreadPoolExecutor(max_workers=scheduler.slots) as executor:
+        with scheduler.slot(turn('holder', 100)):
+            for queued in turns:
+                scheduler.submit(queued, executor, run)
+        # Each turn is handed to the executor only when the one before it finishes
+        assert done.wait(5)
+    return order
+
+
+def test_earliest_deadline_first():
+    scheduler = AIScheduler(slots=1, max_wait=100, degrade_depth=100)
+    assert grant_order(scheduler, [turn('slow', 30), turn('quick', 1), turn('medium', 5)]) == \
+        ['quick', 'medium', 'slow']
+
+
+def test_aging_stops_starvation():
+    scheduler = AIScheduler(slots=1, max_wait=2, degrade_depth=100)
+    # Queued 10 seconds ago with a distant deadline, so it ranks as if due 8 seconds ago
+    assert grant_order(scheduler, [turn('quick', 1), turn('old', 300, queued_ago=10)]) == ['old', 'quick']
+
+
+def test_long_turns_hold_at_most_their_share():
+    scheduler = AIScheduler(slots=2, long_budget=10, long_share=0.5, degrade_depth=100)
+    ran = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with scheduler.slot(turn('long', 60)):
+            waiting = turn('second-long', 60)
+            scheduler.submit(waiting, executor, lambda granted: None)
+            assert scheduler.depth() == 1 and waiting.started is None
+            scheduler.submit(turn('short', 1), executor, lambda granted: ran.set())
+            assert ran.wait(5)
+    assert waiting.started is not None
+
+
+def test_short_clock_degrades_to_a_cheaper_backend():
+    scheduler = AIScheduler(slots=1, degrade_depth=100)
+    with scheduler.slot(turn('bullet', 0.05, backend='llm')) as granted:
+        # Neither the LLM (1s) nor the engine (0.1s) fits in 50ms
+        assert granted.backend == 'book'
+        assert granted.degraded == 'clock'
+    with scheduler.slot(turn('rapid', 20, backend='llm')) as granted:
+        assert granted.backend == 'llm' and granted.degraded is None
+    assert scheduler.stats()['degraded'] == {'clock': 1, 'queue': 0}
+
+
+def test_deep_queue_degrades_to_a_cheaper_backend():
+    scheduler = AIScheduler(slots=1, degrade_depth=1, max_wait=100)
+    queued = [turn('first', 20, backend='llm'), turn('second', 30, backend='llm')]
+    grant_order(scheduler, queued)
+    # The first ran with another turn still waiting behind it, the second with none
+    assert [(granted.backend, granted.degraded) for granted in queued] == [('engine', 'queue'), ('llm', None)]
+
+
+def test_observed_durations_move_the_estimate():
+    scheduler = AIScheduler(slots=1)
+    for _ in range(30):
+        scheduler.observe('llm', 0.01)
+    with scheduler.slot(turn('bullet', 0.05, backend='llm')) as granted:
+        assert granted.backend == 'llm'
+
+
+def test_speculation_waits_for_idle_slots():
+    scheduler = AIScheduler(slots=1, speculative_slots=1)
+    with scheduler.speculative_slot() as granted:
+        assert granted
+        with scheduler.speculative_slot() as second:
+            assert not second
+    holder = turn('holder', 100)
+    with scheduler.slot(holder):
+        with scheduler.speculative_slot() as granted:
+            assert not granted
+    assert scheduler.stats()['speculations'] == 1 and scheduler.stats()['speculations_skipped'] == 2
+
+
+def test_clock_budgets():
+    scheduler = AIScheduler(slots=1)
+    clock = new_clock('blitz')
+    assert time_left(clock, 'black') == pytest.approx(180, abs=1)
+    budget = scheduler.turn('game', 'llm', clock).budget
+    assert budget == pytest.approx(180 / 30 + 2 * 0.8, abs=0.1)
+    press_clock(clock, 'white')
+    assert clock['white'] == pytest.approx(182, abs=1)
+    assert scheduler.turn('game', 'llm', None).time_control == 'untimed'
@@ -0,0 +1,42 @@
+import asyncio
+
+import asgi
+from app import create_game
+
+E2_E4 = {'from': {'row': 6, 'col': 4}, 'to': {'row': 4, 'col': 4}}
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def post(client, path, body):
+    response = await client.post(path, json=body)
+    return response.status_code, await response.get_json()
+
+
+def test_wait_returns_the_ai_reply():
+    async def scenario():
+        client = asgi.app.test_client()
+        _, game = await post(client, '/api/initialize', {'backend': 'engine'})
+        status, reply = await post(client, '/api/move', dict(E2_E4, game_id=game['game_id'], wait=True))
+        assert status == 200
+        assert reply['ai_move'] and len(reply['game_history']) == 2
+    run(scenario())
+
+
+def test_wait_rejects_a_reply_for_a_restarted_game(monkeypatch):
+    async def restart_while_thinking(game_state, game_context, on_fallback=None):
+        create_game({'game_id': game_state['game_id'], 'backend': 'engine'})
+        return 'e5'
+    monkeypatch.setattr(asgi, 'await_ai_move', restart_while_thinking)
+
+    async def scenario():
+        client = asgi.app.test_client()
+        _, game = await post(client, '/api/initialize', {'backend': 'engine'})
+        status, reply = await post(client, '/api/move', dict(E2_E4, game_id=game['game_id'], wait=True))
+        assert status == 409
+        state = await (await client.get(f"/api/game-state?game_id={game['game_id']}")).get_json()
+        assert state['game_history'] == []
+        assert state['current_player'] == 'white'
+    run(scenario())
@@ -0,0 +1,25 @@
+from chess_board import Board
+from chess_engine import MATE_SCORE, ChessEngine
+
+BACK_RANK_MATE = '6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'
+
+
+def test_finds_mate_in_one_at_low_depth():
+    engine = ChessEngine(time_limit=10, max_depth=2)
+    board = Board.from_fen(BACK_RANK_MATE)
+    assert engine.get_move(board) == 'Ra8#'
+    _, score, _ = engine.search(board)
+    assert score >= MATE_SCORE - 10
+
+
+def test_search_leaves_the_board_untouched():
+    engine = ChessEngine(time_limit=10, max_depth=2)
+    board = Board.starting_position()
+    engine.search(board)
+    assert board.to_fen() == Board.starting_position().to_fen()
+
+
+def test_no_move_when_mated():
+    board = Board.from_fen('R5k1/5ppp/8/8/8/8/8/6K1 b - - 1 1')
+    move, score, _ = ChessEngine(max_depth=2).search(board)
+    assert move is None and score == -MATE_SCORE
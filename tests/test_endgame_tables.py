@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from chess_board import Board
+from endgame_tables import DRAW, UNREACHABLE, EndgameTables, TableGenerator
+
+
+@pytest.fixture(scope='session')
+def krk(request):
+    """KRK tables, generated once (about half a minute) and kept in the pytest cache"""
+    directory = str(request.config.cache.mkdir('tablebases'))
+    path = os.path.join(directory, 'KRK.bin')
+    if not os.path.exists(path):
+        table = TableGenerator('KRK', EndgameTables('')).generate()
+        with open(path + '.tmp', 'wb') as table_file:
+            table_file.write(table)
+        os.replace(path + '.tmp', path)
+    tables = EndgameTables(directory)
+    yield tables
+    tables.close()
+
+
+def test_krk_longest_mate(krk):
+    with open(os.path.join(krk.path, 'KRK.bin'), 'rb') as table_file:
+        table = table_file.read()
+    half = len(table) // 2
+    # Mate in 16 moves with White to move, one more ply with Black to move
+    assert max(value - 1 for value in table[:half] if 0 < value < UNREACHABLE) == 31
+    assert max(value - 1 for value in table[half:] if 0 < value < UNREACHABLE) == 32
+
+
+def test_krk_mate_distances(krk):
+    assert krk.best_move(Board.from_fen('k7/8/1K6/8/8/8/8/7R w - - 0 1')) == ('Rh8#', 1)
+    assert krk.probe(Board.from_fen('k6R/8/1K6/8/8/8/8/8 b - - 0 1')) == 0
+    # The rook side wins whoever is to move
+    result = krk.probe(Board.from_fen('8/8/8/3k4/8/8/8/R3K3 w - - 0 1'))
+    assert result % 2 == 1 and result <= 31
+    assert krk.probe(Board.from_fen('8/8/8/3k4/8/8/8/R3K3 b - - 0 1')) % 2 == 0
+
+
+def kpkp():
+    """A stand-in KPKP table that scores every position a draw"""
+    tables = EndgameTables('')
+    tables.add('KPKP', bytes(2 * 64 ** 4))
+    return tables
+
+
+def test_double_push_into_en_passant_is_not_probed():
+    # After e2-e4 Black can take en passant with the d4 pawn, which no table covers
+    board = Board.from_fen('7k/8/8/8/3p4/8/4P3/K7 w - - 0 1')
+    assert kpkp().best_move(board) is None
+
+
+def test_double_push_without_en_passant_is_probed():
+    board = Board.from_fen('7k/8/8/8/p7/8/4P3/K7 w - - 0 1')
+    assert kpkp().best_move(board)[1] == DRAW
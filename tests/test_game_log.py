@@ -0,0 +1,71 @@
+import pytest
+
+import app
+from game_log import GameLog
+
+E2_E4 = ({'row': 6, 'col': 4}, {'row': 4, 'col': 4})
+D2_D4 = ({'row': 6, 'col': 3}, {'row': 4, 'col': 3})
+G1_F3 = ({'row': 7, 'col': 6}, {'row': 5, 'col': 5})
+
+
+@pytest.fixture(params=[0, 3], ids=['log-only', 'snapshots'])
+def game_log(request, tmp_path, monkeypatch):
+    log = GameLog(str(tmp_path), snapshot_every=request.param, fsync=False)
+    monkeypatch.setattr(app, 'game_log', log)
+    yield log
+    log.close()
+
+
+def restored(game_id):
+    """Drop a game from memory and bring it back from the log"""
+    before = app.games.get(game_id)
+    snapshot = (before['board'].to_fen(), list(before['game_history']), before['version'],
+                before['current_player'], len(before['redo_stack']))
+    app.games.delete(game_id)
+    after = app.games.get(game_id)
+    assert after is not before
+    return snapshot, (after['board'].to_fen(), list(after['game_history']), after['version'],
+                      after['current_player'], len(after['redo_stack']))
+
+
+def test_restores_moves(client, start_game, play, game_log):
+    game_id = start_game()
+    for from_square, to_square in (E2_E4, D2_D4, G1_F3):
+        assert play(game_id, from_square, to_square).status_code == 200
+    before, after = restored(game_id)
+    assert after == before
+    assert len(after[1]) == 6
+
+
+def test_restores_undo_and_redo(client, start_game, play, game_log):
+    game_id = start_game()
+    play(game_id, *E2_E4)
+    play(game_id, *D2_D4)
+    client.post('/api/undo', json={'game_id': game_id})
+    client.post('/api/undo', json={'game_id': game_id})
+    client.post('/api/redo', json={'game_id': game_id})
+    before, after = restored(game_id)
+    assert after == before
+    assert len(after[1]) == 2 and after[4] == 2
+
+
+def test_unknown_game_is_not_restored(client, game_log):
+    assert app.games.get('never-logged') is None
+
+
+def test_torn_final_write_is_ignored(client, start_game, play, game_log, tmp_path):
+    game_id = start_game()
+    play(game_id, *E2_E4)
+    game_log.flush()
+    with open(tmp_path / f'{game_id}.jsonl', 'ab') as log:
+        log.write(b'{"type":"move","vers')
+    before, after = restored(game_id)
+    assert after == before
+
+
+def test_disabled_log_ignores_its_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv('GAME_LOG_DIR', str(tmp_path / 'from-env'))
+    for log in (GameLog(str(tmp_path / 'given'), enabled=False), GameLog(enabled=False)):
+        assert not log.enabled
+        assert log.load('game') is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,24 @@
+import time
+
+from game_store import GameStore
+
+
+def test_sweeper_drops_idle_games_without_new_ones():
+    removed = []
+    store = GameStore(max_games=100, idle_ttl=0.05, on_remove=removed.append)
+    game = store.create('engine')
+    store.start_sweeper(0.02)
+    deadline = time.monotonic() + 2
+    while len(store) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(store) == 0
+    assert removed == [game['game_id']]
+
+
+def test_games_in_use_are_kept():
+    store = GameStore(max_games=100, idle_ttl=0.2)
+    game = store.create('engine')
+    store.start_sweeper(0.02)
+    for _ in range(10):
+        time.sleep(0.05)
+        assert store.get(game['game_id']) is game
@@ -0,0 +1,50 @@
+import pytest
+
+from chess_board import Board, Move, START_FEN
+from move_generator import is_legal, legal_moves, move_to_san, parse_san, perft, pseudo_legal_moves
+
+# Standard perft positions with their node counts per depth
+PERFT_POSITIONS = [
+    (START_FEN, [20, 400, 8902]),
+    ('r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', [48, 2039, 97862]),
+    ('8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', [14, 191, 2812, 43238]),
+    ('r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1', [6, 264, 9467]),
+    ('rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8', [44, 1486, 62379]),
+]
+
+
+@pytest.mark.parametrize('fen, expected', PERFT_POSITIONS)
+def test_perft(fen, expected):
+    board = Board.from_fen(fen)
+    assert [perft(board, depth) for depth in range(1, len(expected) + 1)] == expected
+    assert board.to_fen() == fen
+
+
+def positions():
+    """Every perft position and each position one move into it"""
+    for fen, _ in PERFT_POSITIONS:
+        board = Board.from_fen(fen)
+        yield board.copy()
+        for move in legal_moves(board):
+            undo = board.make_move(move)
+            yield board.copy()
+            board.unmake_move(move, undo)
+
+
+def test_san_round_trip():
+    for board in positions():
+        moves = legal_moves(board)
+        for move in moves:
+            san = move_to_san(board, move, moves)
+            assert parse_san(board, san) == move, (board.to_fen(), san)
+            assert move_to_san(board, move) == san
+
+
+def test_is_legal_matches_move_generation():
+    squares = [row * 16 + col for row in range(8) for col in range(8)]
+    for board in positions():
+        legal = set(legal_moves(board))
+        candidates = set(pseudo_legal_moves(board))
+        candidates.update(Move(from_sq, to_sq) for from_sq in squares if board.squares[from_sq] for to_sq in squares)
+        for move in candidates:
+            assert is_legal(board, move) == (move in legal), (board.to_fen(), move)
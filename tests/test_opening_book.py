@@ -0,0 +1,41 @@
+import os
+
+from chess_board import Board
+from move_generator import parse_san
+from opening_book import OpeningBook, build_book
+
+# conftest turns the book off for the app, so point at the shipped one explicitly
+SHIPPED_BOOK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'opening_book.bin')
+
+
+def position(*sans):
+    board = Board.starting_position()
+    for san in sans:
+        board.make_move(parse_san(board, san))
+    return board
+
+
+def test_book_answers_e4():
+    book = OpeningBook(SHIPPED_BOOK, seed=1)
+    board = position('e4')
+    move = book.get_move(board)
+    assert move is not None and parse_san(board, move) is not None
+    assert book.stats()['hits'] == 1
+    book.close()
+
+
+def test_position_missing_from_the_book():
+    book = OpeningBook(SHIPPED_BOOK, seed=1)
+    assert book.get_move(position('a4', 'h5', 'Ra3')) is None
+    assert book.stats()['misses'] == 1
+    book.close()
+
+
+def test_built_book_replays_its_lines(tmp_path):
+    path = str(tmp_path / 'book.bin')
+    build_book(['e4 c5 Nf3', 'd4 d5'], path)
+    book = OpeningBook(path, seed=1)
+    assert book.get_move(position('e4')) == 'c5'
+    assert book.get_move(position('d4')) == 'd5'
+    assert book.get_move(position('e4', 'c5', 'Nf3')) is None
+    book.close()
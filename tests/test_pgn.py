@@ -0,0 +1,43 @@
+from pgn import check_chunk, parse_game, read_games, replay_game, write_game
+
+SCHOLARS_MATE = ['e4', 'e5', 'Bc4', 'Nc6', 'Qh5', 'Nf6', 'Qxf7#']
+BACK_RANK_MATE = '6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'
+
+
+def test_write_and_read_back():
+    text = write_game({'Event': 'Test', 'White': 'A', 'Black': 'B'}, SCHOLARS_MATE, '1-0')
+    game = parse_game(text)
+    assert game['moves'] == SCHOLARS_MATE
+    assert game['result'] == '1-0'
+    replay = replay_game(game)
+    assert replay['error'] is None
+    assert replay['moves'] == SCHOLARS_MATE
+
+
+def test_setup_tags_follow_the_roster():
+    text = write_game({'Annotator': 'Someone', 'Event': 'Test'}, ['Ra8#'], '1-0', BACK_RANK_MATE)
+    tags = [line.split()[0][1:] for line in text.splitlines() if line.startswith('[')]
+    assert tags == ['Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result', 'SetUp', 'FEN', 'Annotator']
+    assert replay_game(parse_game(text))['error'] is None
+
+
+def test_replay_reports_the_first_illegal_move():
+    text = write_game({}, ['e4', 'e5', 'Ke3'], '*')
+    replay = replay_game(parse_game(text))
+    assert replay['moves'] == ['e4', 'e5']
+    assert 'Ke3' in replay['error']
+
+
+def test_read_games_splits_a_stream():
+    text = write_game({}, SCHOLARS_MATE, '1-0') + '\n' + write_game({}, ['d4', 'd5'], '*')
+    games = list(read_games(text.splitlines(keepends=True)))
+    assert [game['moves'] for game in games] == [SCHOLARS_MATE, ['d4', 'd5']]
+
+
+def test_fen_without_move_counters():
+    text = '[FEN "4k3/8/8/8/8/8/4P3/4K3 w - -"]\n[SetUp "1"]\n\n1. e4 Kd7 *\n'
+    plies, errors, valid = check_chunk([text], export=True)
+    assert plies == 2 and errors == []
+    game = parse_game(valid[0])
+    assert game['moves'] == ['e4', 'Kd7']
+    assert '1. e4 Kd7 *' in valid[0]
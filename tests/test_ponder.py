@@ -0,0 +1,34 @@
+from chess_board import Board
+from move_generator import legal_moves
+from ponder import Ponderer, predict_replies
+
+
+class CountingBackend:
+    def __init__(self):
+        self.calls = 0
+
+    def get_move(self, board, last_move, move_history, conversation_history=None, on_fallback=None):
+        self.calls += 1
+        return 'e5'
+
+
+def ponder(backend_name, ponder_paid=False):
+    ponderer = Ponderer(candidates=2, max_workers=1, ponder_paid=ponder_paid)
+    backend = CountingBackend()
+    board = Board.starting_position()
+    ponderer.start('game', backend, board, [], backend_name=backend_name)
+    ponderer._pool.shutdown(wait=True)
+    return ponderer, backend, board
+
+
+def test_local_backends_are_pondered():
+    ponderer, backend, board = ponder('engine')
+    assert backend.calls == 2
+    predicted = predict_replies(board, 1, legal_moves(board))[0]
+    board.make_move(predicted)
+    assert ponderer.take('game', board.hash).result() == ('e5', None)
+
+
+def test_paid_backends_are_not_pondered_by_default():
+    assert ponder('llm')[1].calls == 0
+    assert ponder('llm', ponder_paid=True)[1].calls == 2
@@ -0,0 +1,87 @@
+import asyncio
+import threading
+from concurrent.futures import CancelledError
+
+import pytest
+
+from request_coalescer import AsyncCoalescer, Coalescer
+
+
+class Interrupted(BaseException):
+    """Stands in for KeyboardInterrupt or SystemExit in the leader's call"""
+
+
+def leader_and_follower(call):
+    """Submit one key twice, the second while the first is inside call; returns both outcomes"""
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking(item):
+        started.set()
+        release.wait(5)
+        return call(item)
+    coalescer = Coalescer(blocking)
+
+    outcomes = {}
+
+    def outcome(item):
+        try:
+            outcomes[item] = coalescer.submit('position', item)
+        except BaseException as e:
+            outcomes[item] = type(e)
+
+    # Daemon threads, so a follower left waiting fails the test instead of hanging it
+    leader = threading.Thread(target=outcome, args=('first',), daemon=True)
+    leader.start()
+    assert started.wait(5)
+    follower = threading.Thread(target=outcome, args=('second',), daemon=True)
+    follower.start()
+    while coalescer.stats()['coalesced'] == 0:
+        pass
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    return outcomes.get('first'), outcomes.get('second'), coalescer
+
+
+def test_followers_share_the_leaders_result():
+    leader, follower, coalescer = leader_and_follower(lambda item: item.upper())
+    assert leader == follower == 'FIRST'
+    assert coalescer.stats()['upstream_calls'] == 1
+
+
+def test_followers_get_the_leaders_error():
+    def failing(item):
+        raise ConnectionError(item)
+    assert leader_and_follower(failing)[:2] == (ConnectionError, ConnectionError)
+
+
+def test_followers_are_released_when_the_leader_is_interrupted():
+    def interrupted(item):
+        raise Interrupted()
+    leader, follower, coalescer = leader_and_follower(interrupted)
+    assert leader is Interrupted
+    assert follower is CancelledError
+    assert coalescer._inflight == {}
+
+
+def test_async_followers_are_released_when_the_call_is_cancelled():
+    async def scenario():
+        started = asyncio.Event()
+
+        async def call(item):
+            started.set()
+            await asyncio.sleep(5)
+        coalescer = AsyncCoalescer(call)
+        first = asyncio.ensure_future(coalescer.submit('position', 'first'))
+        await started.wait()
+        second = asyncio.ensure_future(coalescer.submit('position', 'second'))
+        await asyncio.sleep(0)
+        for task in coalescer._tasks:
+            task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(second, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(first, 1)
+        assert coalescer._inflight == {}
+    asyncio.run(scenario())
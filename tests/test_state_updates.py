@@ -0,0 +1,55 @@
+E2_E4 = ({'row': 6, 'col': 4}, {'row': 4, 'col': 4})
+D2_D4 = ({'row': 6, 'col': 3}, {'row': 4, 'col': 3})
+
+
+def state(client, game_id, since=None, etag=None):
+    query = f'/api/game-state?game_id={game_id}' + (f'&since={since}' if since is not None else '')
+    return client.get(query, headers={'If-None-Match': etag} if etag else {})
+
+
+def test_since_returns_only_the_new_moves(client, start_game, play):
+    game_id = start_game()
+    base = state(client, game_id).get_json()['version']
+    play(game_id, *E2_E4)
+
+    delta = state(client, game_id, since=base).get_json()
+    assert delta['since'] == base and delta['version'] == base + 2
+    assert len(delta['moves']) == 2
+    assert 'board' not in delta
+
+    current = state(client, game_id, since=delta['version']).get_json()
+    assert current['moves'] == []
+
+
+def test_move_reply_is_a_delta_from_the_clients_version(client, start_game, play):
+    game_id = start_game()
+    base = state(client, game_id).get_json()['version']
+    reply = client.post('/api/move', json={'game_id': game_id, 'from': E2_E4[0], 'to': E2_E4[1],
+                                          'since': base, 'wait': True}).get_json()
+    assert reply['since'] == base
+    assert len(reply['moves']) == 2
+
+
+def test_unknown_or_rewound_versions_get_the_full_state(client, start_game, play):
+    game_id = start_game()
+    play(game_id, *E2_E4)
+    played = state(client, game_id).get_json()['version']
+    assert 'board' in state(client, game_id, since=played + 5).get_json()
+    assert 'board' in state(client, game_id, since='junk').get_json()
+
+    client.post('/api/undo', json={'game_id': game_id})
+    rewound = state(client, game_id, since=played).get_json()
+    assert 'board' in rewound and rewound['game_history'] == []
+
+
+def test_etag_answers_304_until_the_game_changes(client, start_game, play):
+    game_id = start_game()
+    first = state(client, game_id)
+    etag = first.headers['ETag']
+    assert state(client, game_id, etag=etag).status_code == 304
+
+    play(game_id, *D2_D4)
+    changed = state(client, game_id, etag=etag)
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert state(client, game_id, etag=changed.headers['ETag']).status_code == 304
@@ -0,0 +1,54 @@
+BACK_RANK_MATE = '6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1'
+
+
+def test_undo_takes_back_the_move_pair(client, start_game, play):
+    game_id = start_game()
+    reply = play(game_id, {'row': 6, 'col': 4}, {'row': 4, 'col': 4}).get_json()
+    assert reply['ai_move']
+
+    undone = client.post('/api/undo', json={'game_id': game_id}).get_json()
+    assert undone['plies'] == 2
+    assert undone['current_player'] == 'white'
+    assert undone['can_redo'] and not undone['can_undo']
+
+    redone = client.post('/api/redo', json={'game_id': game_id}).get_json()
+    assert redone['plies'] == 2
+    assert redone['current_player'] == 'white'
+    assert len(redone['game_history']) == 2
+
+
+def test_new_move_clears_redo(client, start_game, play):
+    game_id = start_game()
+    play(game_id, {'row': 6, 'col': 4}, {'row': 4, 'col': 4})
+    client.post('/api/undo', json={'game_id': game_id})
+    play(game_id, {'row': 6, 'col': 3}, {'row': 4, 'col': 3})
+    assert client.post('/api/redo', json={'game_id': game_id}).status_code == 400
+
+
+def test_mate_undo_redo_undo(client, start_game, play):
+    from app import games
+    game_id = start_game(BACK_RANK_MATE)
+    mated = play(game_id, {'row': 7, 'col': 0}, {'row': 0, 'col': 0}).get_json()
+    assert mated['ai_move'] is None
+    assert mated['ai_response'].startswith('Checkmate')
+
+    undone = client.post('/api/undo', json={'game_id': game_id}).get_json()
+    assert undone['plies'] == 1
+
+    redone = client.post('/api/redo', json={'game_id': game_id})
+    assert redone.status_code == 200
+    assert redone.get_json()['current_player'] == 'white'
+    assert games.get(game_id)['current_player'] == 'white'
+
+    undone = client.post('/api/undo', json={'game_id': game_id})
+    assert undone.status_code == 200
+    assert undone.get_json()['plies'] == 1
+
+
+def test_finished_game_left_on_black_can_still_be_undone(client, start_game, play):
+    from app import games
+    game_id = start_game(BACK_RANK_MATE)
+    play(game_id, {'row': 7, 'col': 0}, {'row': 0, 'col': 0})
+    # As stored by earlier versions, which left a redone mate with Black to move
+    games.get(game_id)['current_player'] = 'black'
+    assert client.post('/api/undo', json={'game_id': game_id}).status_code == 200
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from upstream_guard import CircuitBreaker, CircuitOpenError, DeadlineExceeded, LatencyTracker, UpstreamGuard
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+
+def warmed_latency(seconds=0.01, samples=20):
+    """A latency tracker that has already seen enough quick calls to hedge after about seconds"""
+    latency = LatencyTracker(min_samples=samples)
+    for _ in range(samples):
+        latency.record(seconds)
+    return latency
+
+
+def first_call_slow(delay):
+    """An upstream whose first request takes delay seconds and every later one answers at once"""
+    calls = []
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            calls.append(None)
+            number = len(calls)
+        if number == 1:
+            time.sleep(delay)
+            return 'slow'
+        return 'fast'
+    return call, calls
+
+
+def failing():
+    raise ConnectionError("upstream down")
+
+
+def test_slow_primary_is_hedged():
+    guard = UpstreamGuard(deadline=2, latency=warmed_latency())
+    call, calls = first_call_slow(0.5)
+    assert guard.call(call) == 'fast'
+    assert len(calls) == 2
+    assert guard.stats()['hedges'] == 1 and guard.stats()['hedge_wins'] == 1
+
+
+def test_slow_primary_is_hedged_async():
+    guard = UpstreamGuard(deadline=2, latency=warmed_latency())
+    calls = []
+
+    async def call():
+        calls.append(None)
+        await asyncio.sleep(0.5 if len(calls) == 1 else 0)
+        return len(calls)
+    assert asyncio.run(guard.call_async(call)) == 2
+    assert guard.stats()['hedge_wins'] == 1
+
+
+def test_no_hedge_before_enough_samples():
+    guard = UpstreamGuard(deadline=2)
+    call, calls = first_call_slow(0.05)
+    assert guard.call(call) == 'slow'
+    assert len(calls) == 1
+
+
+def test_deadline():
+    guard = UpstreamGuard(deadline=0.1, hedge_percentile=0)
+    with pytest.raises(DeadlineExceeded):
+        guard.call(lambda: time.sleep(0.5))
+    assert guard.stats()['deadline_misses'] == 1
+
+
+def test_breaker_opens_then_recovers_through_a_probe():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.1)
+    guard = UpstreamGuard(deadline=1, hedge_percentile=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            guard.call(failing)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        guard.call(lambda: 'never called')
+
+    time.sleep(0.15)
+    # A failed probe re-opens the breaker for another cooldown
+    with pytest.raises(ConnectionError):
+        guard.call(failing)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.15)
+    assert guard.call(lambda: 'ok') == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['opens'] == 2 and breaker.stats()['probes'] == 2
+
+
+def test_half_open_admits_a_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0)
+    breaker.record_failure()
+    assert breaker.before_call() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.abandon_probe()
+    assert breaker.before_call() is True
+
+
+@pytest.fixture
+def stub_ai(monkeypatch):
+    """Build a SimpleChessAI talking to the local OpenAI stub with the given guard settings"""
+    pytest.importorskip('openai')
+    from openai_stub import start_stub
+    servers = []
+
+    def build(stub_settings, **environment):
+        server, settings, base_url = start_stub(**stub_settings)
+        servers.append(server)
+        monkeypatch.setenv('OPENAI_API_KEY', 'stub')
+        monkeypatch.setenv('OPENAI_BASE_URL', base_url)
+        monkeypatch.setenv('LLM_HEDGE_PERCENTILE', '0')
+        for name, value in environment.items():
+            monkeypatch.setenv(name, value)
+        from simple_chess_ai import SimpleChessAI
+        return SimpleChessAI(), settings
+    yield build
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def ask(ai, board):
+    reasons = []
+    move = ai.get_move(board, None, [], [], on_fallback=reasons.append)
+    return move, reasons
+
+
+def test_stalled_upstream_falls_back_to_a_local_move(stub_ai):
+    from chess_board import Board
+    from move_generator import parse_san
+    ai, _ = stub_ai({'latency': 0, 'stall_rate': 1.0, 'stall': 3}, LLM_MOVE_DEADLINE='0.3')
+    board = Board.starting_position()
+    start = time.monotonic()
+    move, reasons = ask(ai, board)
+    assert time.monotonic() - start < 2
+    assert reasons == ['deadline']
+    assert parse_san(board, move) is not None
+
+
+def test_breaker_trips_on_upstream_errors_and_recovers(stub_ai):
+    from chess_board import Board
+    ai, settings = stub_ai({'latency': 0, 'error_rate': 1.0}, LLM_BREAKER_FAILURES='2',
+                           LLM_BREAKER_COOLDOWN='0.2')
+    board = Board.starting_position()
+    assert ask(ai, board)[1] == ['llm_error']
+    assert ask(ai, board)[1] == ['llm_error']
+    requests = settings.requests
+    assert ask(ai, board)[1] == ['circuit_open']
+    assert settings.requests == requests
+
+    settings.update({'error_rate': 0})
+    time.sleep(0.25)
+    move, reasons = ask(ai, board)
+    assert reasons == [] and move
+    assert ai.guard.breaker.state == CircuitBreaker.CLOSED
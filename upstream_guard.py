@@ -0,0 +1,240 @@
+"""
+Deadlines, hedged requests and a circuit breaker for calls to the LLM upstream
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when no upstream answer arrived within the per-move budget"""
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations, used to pick the hedging delay"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """Add the duration of a successful call"""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percent):
+        """Return the given percentile of recent durations, or None with too few samples"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over consecutive upstream failures
+
+    After failure_threshold failures in a row the breaker opens and every call
+    is refused for cooldown seconds. Then a single probe call is let through
+    (half-open); its success closes the breaker, its failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+        self.opens = 0
+        self.probes = 0
+        self.rejected = 0
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError; returns True if the call is the recovery probe"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                self.probes += 1
+                return True
+            self.rejected += 1
+            raise CircuitOpenError("LLM upstream circuit is open")
+
+    def record_success(self):
+        """Close the breaker and reset the failure count"""
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        """Count a failure, opening the breaker at the threshold or when a probe fails"""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opens += 1
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def abandon_probe(self):
+        """Let another call probe if the current probe was cancelled before it finished"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def stats(self):
+        """Return the breaker state and counters"""
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self._failures,
+                'opens': self.opens,
+                'probes': self.probes,
+                'rejected': self.rejected
+            }
+
+
+class UpstreamGuard:
+    """Runs upstream calls under a per-move deadline, hedging slow ones, behind a circuit breaker
+
+    A call that is still running after the hedge_percentile of recent
+    latencies gets one duplicate request; whichever answers first wins.
+    """
+
+    def __init__(self, deadline=8.0, hedge_percentile=95.0, max_workers=32,
+                 breaker=None, latency=None):
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-call')
+        self._lock = threading.Lock()
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.deadline_misses = 0
+        self.failures = 0
+
+    def _hedge_delay(self):
+        """Seconds to wait before sending a duplicate request, or None to never hedge"""
+        if not self.hedge_percentile:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def call(self, function):
+        """Run a blocking upstream call under the guard and return its result"""
+        self.breaker.before_call()
+        self._count('calls')
+        start = time.monotonic()
+        deadline = start + self.deadline
+        pending = {self._pool.submit(function): False}
+        hedge_delay = self._hedge_delay()
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            hedge_due = hedge_delay is not None and len(pending) == 1 and not error
+            timeout = min(remaining, max(0.0, start + hedge_delay - time.monotonic())) if hedge_due else remaining
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                is_hedge = pending.pop(future)
+                if future.exception() is None:
+                    return self._succeeded(start, is_hedge, future.result())
+                error = future.exception()
+            if not done and hedge_due:
+                self._count('hedges')
+                pending[self._pool.submit(function)] = True
+                hedge_delay = None
+        return self._failed(error)
+
+    async def call_async(self, function):
+        """Await an upstream coroutine function under the guard and return its result"""
+        probe = self.breaker.before_call()
+        self._count('calls')
+        start = time.monotonic()
+        deadline = start + self.deadline
+        pending = {asyncio.ensure_future(function()): False}
+        hedge_delay = self._hedge_delay()
+        error = None
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                hedge_due = hedge_delay is not None and len(pending) == 1 and not error
+                timeout = min(remaining, max(0.0, start + hedge_delay - time.monotonic())) if hedge_due else remaining
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    is_hedge = pending.pop(task)
+                    if task.exception() is None:
+                        return self._succeeded(start, is_hedge, task.result())
+                    error = task.exception()
+                if not done and hedge_due:
+                    self._count('hedges')
+                    pending[asyncio.ensure_future(function())] = True
+                    hedge_delay = None
+            return self._failed(error)
+        finally:
+            # The losing or overdue requests are no longer wanted
+            for task in pending:
+                task.cancel()
+            if probe:
+                self.breaker.abandon_probe()
+
+    def _succeeded(self, start, is_hedge, result):
+        """Record a successful call and pass its result through"""
+        self.latency.record(time.monotonic() - start)
+        self.breaker.record_success()
+        if is_hedge:
+            self._count('hedge_wins')
+        return result
+
+    def _failed(self, error):
+        """Record a failed or overdue call and raise the matching exception"""
+        self.breaker.record_failure()
+        if error is None:
+            self._count('deadline_misses')
+            raise DeadlineExceeded(f"No LLM answer within {self.deadline:.1f}s")
+        self._count('failures')
+        raise error
+
+    def stats(self):
+        """Return call, hedging, deadline and circuit breaker counters"""
+        with self._lock:
+            stats = {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'deadline_misses': self.deadline_misses,
+                'failures': self.failures,
+                'deadline': self.deadline,
+                'hedge_after': self._hedge_delay()
+            }
+        stats['breaker'] = self.breaker.stats()
+        return stats